@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized signal backtester against a per-signal, per-bar Python loop.
+
+Usage:
+    python benchmarks/backtest_benchmark.py [--years 3] [--signals 5000] [--max-bars 720]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from trading_bot.services.chart_service.backtester import (  # noqa: E402
+    simulate, BAR_SECONDS, NO_DATA, STOP_LOSS, OPEN, TAKE_PROFIT,
+)
+
+
+def loop_simulate(ts, high, low, close, signal_times, is_buy, entry, sl, tp, max_bars):
+    """Reference: walk the bars of every signal one by one"""
+    outcome, r = np.full(len(signal_times), NO_DATA), np.full(len(signal_times), np.nan)
+    for i in range(len(signal_times)):
+        begin = int(np.searchsorted(ts, signal_times[i]))
+        if begin >= len(ts) or signal_times[i] < ts[0]:
+            continue
+        risk = abs(entry[i] - sl[i])
+        code, exit_price = OPEN, None
+        end = min(begin + max_bars, len(ts))
+        for bar in range(begin, end):
+            if (low[bar] <= sl[i]) if is_buy[i] else (high[bar] >= sl[i]):
+                code, exit_price = STOP_LOSS, sl[i]
+                break
+            if (high[bar] >= tp[i]) if is_buy[i] else (low[bar] <= tp[i]):
+                code, exit_price = TAKE_PROFIT, tp[i]
+                break
+        if exit_price is None:
+            exit_price = close[end - 1]
+        outcome[i] = code
+        r[i] = (exit_price - entry[i] if is_buy[i] else entry[i] - exit_price) / risk
+    return {"outcome": outcome, "r": r}
+
+
+def make_candles(bars: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.001, bars))
+    spread = np.abs(rng.normal(0, 0.0008, bars))
+    ts = 1_600_000_000 // BAR_SECONDS * BAR_SECONDS + np.arange(bars) * BAR_SECONDS
+    return ts, close + spread, close - spread, close
+
+
+def make_signals(ts, close, count: int, seed: int = 2):
+    """Random BUY/SELL signals at 1:2 risk/reward with a 20-60 pip stop"""
+    rng = np.random.default_rng(seed)
+    bar = rng.integers(0, len(ts), count)
+    signal_times = ts[bar] + rng.integers(0, BAR_SECONDS, count)
+    # A few signals older than the stored history
+    signal_times[:count // 50] -= ts[-1] - ts[0]
+    is_buy = rng.random(count) < 0.5
+    entry = close[bar]
+    risk = rng.uniform(0.002, 0.006, count)
+    sl = np.where(is_buy, entry - risk, entry + risk)
+    tp = np.where(is_buy, entry + 2 * risk, entry - 2 * risk)
+    return signal_times, is_buy, entry, sl, tp
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--years", type=float, default=3, help="Years of H1 candles")
+    parser.add_argument("--signals", type=int, default=5000, help="Signals per run")
+    parser.add_argument("--max-bars", type=int, default=720, help="Longest time in trade (bars)")
+    args = parser.parse_args()
+
+    candles = make_candles(int(args.years * 365 * 24))
+    signals = make_signals(candles[0], candles[3], args.signals)
+
+    start = time.perf_counter()
+    vectorized = simulate(*candles, *signals, args.max_bars)
+    vectorized_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    expected = loop_simulate(*candles, *signals, args.max_bars)
+    loop_ms = (time.perf_counter() - start) * 1000
+
+    # Same outcomes and results as the loop
+    mismatches = int((vectorized["outcome"] != expected["outcome"]).sum())
+    max_diff = float(np.nanmax(np.abs(vectorized["r"] - expected["r"])))
+    print(f"outcome mismatches vs loop: {mismatches}")
+    print(f"max abs R difference:       {max_diff:.3e}")
+
+    outcome = vectorized["outcome"]
+    print(f"candles:                    {len(candles[0])}")
+    print(f"signals:                    {args.signals} "
+          f"(tp {(outcome == TAKE_PROFIT).sum()}, sl {(outcome == STOP_LOSS).sum()}, "
+          f"open {(outcome == OPEN).sum()}, no data {(outcome == NO_DATA).sum()})")
+    print(f"python loop:                {loop_ms:10.1f} ms")
+    print(f"vectorized:                 {vectorized_ms:10.1f} ms")
+    print(f"speed-up:                   {loop_ms / vectorized_ms:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark the shared IndicatorEngine against the per-call pandas calculation the providers used.
+
+Usage:
+    python benchmarks/indicator_benchmark.py [--bars 300] [--repeat 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from trading_bot.services.chart_service.indicators import IndicatorEngine, INDICATOR_COLUMNS  # noqa: E402
+
+
+def pandas_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    """The calculation YahooFinanceProvider.get_market_data did on every call"""
+    df = df.copy()
+    close = df['Close']
+    df['EMA_20'] = close.ewm(span=20, adjust=False).mean()
+    df['EMA_50'] = close.ewm(span=50, adjust=False).mean()
+    df['EMA_200'] = close.ewm(span=200, adjust=False).mean()
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    df['RSI_14'] = 100 - (100 / (1 + gain / loss))
+    ema_12 = close.ewm(span=12, adjust=False).mean()
+    ema_26 = close.ewm(span=26, adjust=False).mean()
+    df['MACD_12_26_9'] = ema_12 - ema_26
+    df['MACDs_12_26_9'] = df['MACD_12_26_9'].ewm(span=9, adjust=False).mean()
+    df['MACDh_12_26_9'] = df['MACD_12_26_9'] - df['MACDs_12_26_9']
+    return df
+
+
+def make_candles(bars: int, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.001, bars))
+    index = pd.date_range("2024-01-01", periods=bars, freq=pd.Timedelta(hours=1), tz="UTC")
+    return pd.DataFrame({"Open": close, "High": close + 0.0005, "Low": close - 0.0005, "Close": close}, index=index)
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bars", type=int, default=300, help="Window size per call")
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per measurement")
+    args = parser.parse_args()
+
+    history = make_candles(args.bars + args.repeat + 1)
+    window = history.iloc[:args.bars]
+
+    # Same results as the pandas path (cold start)
+    expected = pandas_indicators(window)
+    actual = IndicatorEngine().compute(window)
+    max_diff = max(float(np.nanmax(np.abs(expected[c].to_numpy() - actual[c].to_numpy()))) for c in INDICATOR_COLUMNS)
+    print(f"max abs difference vs pandas: {max_diff:.3e}")
+
+    pandas_ms = timed(lambda: pandas_indicators(window), args.repeat)
+    cold_engine = IndicatorEngine()
+    cold_ms = timed(lambda: cold_engine.compute(window), args.repeat)
+
+    # Incremental: a sliding window that gains one new bar per call, as on a refresh
+    engine = IndicatorEngine()
+    engine.compute(window, key="bench")
+    windows = [history.iloc[i + 1:args.bars + i + 1] for i in range(args.repeat)]
+    start = time.perf_counter()
+    for w in windows:
+        engine.compute(w, key="bench")
+    incremental_ms = (time.perf_counter() - start) / args.repeat * 1000
+
+    print(f"bars per call:          {args.bars}")
+    print(f"pandas (per call):      {pandas_ms:8.3f} ms")
+    print(f"engine cold start:      {cold_ms:8.3f} ms")
+    print(f"engine incremental:     {incremental_ms:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -31,6 +31,10 @@ from .services.payment_service.stripe_config import STRIPE_WEBHOOK_SECRET
 from .services.telegram_service.bot import TelegramService
 from .services.payment_service.stripe_service import StripeService
 from .services.sentiment_service.sentiment import MarketSentimentService
+from .services.chart_service.metrics import chart_metrics
+from .services.chart_service.market_scanner import market_scanner
+from .services.chart_service.correlation import correlation_matrix
+from .services.chart_service.backtester import backtester
 
 # Initialize global services outside of FastAPI context
 db = Database()
@@ -119,6 +123,8 @@ async def lifespan(app: FastAPI):
         telegram_service.application.add_handler(CommandHandler("help", telegram_service.help_command))
         telegram_service.application.add_handler(CommandHandler("set_subscription", telegram_service.set_subscription_command))
         telegram_service.application.add_handler(CommandHandler("set_payment_failed", telegram_service.set_payment_failed_command))
+        telegram_service.application.add_handler(CommandHandler("scan", telegram_service.scan_command))
+        telegram_service.application.add_handler(CommandHandler("correlation", telegram_service.correlation_command))
         telegram_service.application.add_handler(CallbackQueryHandler(telegram_service.button_callback))
         
         # Load signals - use await with the async method
@@ -128,7 +134,9 @@ async def lifespan(app: FastAPI):
         commands = [
             BotCommand("start", "Start the bot and get the welcome message"),
             BotCommand("menu", "Show the main menu"),
-            BotCommand("help", "Show available commands and how to use the bot")
+            BotCommand("help", "Show available commands and how to use the bot"),
+            BotCommand("scan", "Scan all instruments for RSI, EMA, MACD and breakout setups"),
+            BotCommand("correlation", "Show which instruments move together")
         ]
         
         # Initialize the application and start in polling mode
@@ -338,6 +346,9 @@ async def process_tradingview_signal(request: Request):
         logger.info(f"Added sentiment verdict: {verdict_string}")
         # >>> END: Sentiment analysis and verdict <<<
 
+        # Markeer signalen met dezelfde blootstelling als een recent signaal op een gecorreleerd instrument
+        await correlation_matrix.flag_signal(signal_data)
+
         # Process the signal through the Telegram service
         success = await telegram_service.process_signal(signal_data)
         
@@ -442,6 +453,9 @@ async def tradingview_signal(request: Request):
         data['sentiment_verdict'] = verdict_string
         logger.info(f"Added sentiment verdict: {verdict_string}")
         # >>> END: Sentiment analysis and verdict <<<
+
+        # Markeer signalen met dezelfde blootstelling als een recent signaal op een gecorreleerd instrument
+        await correlation_matrix.flag_signal(data)
         
         # Process the signal
         success = await telegram_service.process_signal(data)
@@ -509,6 +523,9 @@ async def receive_signal(request: Request):
         logger.info(f"Added sentiment verdict: {verdict_string}")
         # >>> END: Sentiment analysis and verdict <<<
 
+        # Markeer signalen met dezelfde blootstelling als een recent signaal op een gecorreleerd instrument
+        await correlation_matrix.flag_signal(signal_data)
+
         # Process the signal
         success = await telegram_service.process_signal(signal_data)
 
@@ -584,6 +601,48 @@ async def create_subscription_link(user_id: int, plan_type: str = 'basic'):
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics/chart")
+async def chart_metrics_endpoint():
+    """Expose chart pipeline timings, sizes and counters"""
+    return chart_metrics.get_metrics()
+
+@app.get("/scan")
+async def scan_endpoint(timeframe: str = "H1", conditions: str = "", market: str = None):
+    """Scan all instruments; `conditions` is a comma separated list (default: all)"""
+    try:
+        selected = [c.strip() for c in conditions.split(",") if c.strip()] or None
+        return await market_scanner.scan(timeframe, selected, market)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/backtest")
+async def backtest_endpoint(request: Request):
+    """
+    Play out past signals on the stored H1 candles: {"signals": [...], "max_bars": 720}
+
+    Only the candles already in the candle store are used (about the last three weeks);
+    older signals come back as no_data, and `history` in the response shows the stored range.
+    """
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    signals = data.get("signals") if isinstance(data, dict) else data
+    if not isinstance(signals, list) or not all(isinstance(s, dict) for s in signals):
+        raise HTTPException(status_code=400, detail="Expected a list of signals")
+    max_bars = data.get("max_bars") if isinstance(data, dict) else None
+    try:
+        max_bars = backtester.check_max_bars(max_bars)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await backtester.run(signals, max_bars)
+
+@app.get("/health/browser")
+async def browser_health_endpoint():
+    """Expose the health state of the chart browsers (healthy, degraded, recycling, down)"""
+    gauges = chart_metrics.get_metrics()['gauges']
+    return {name: value for name, value in gauges.items() if name.startswith("browser.")}
+
 @app.post("/test-webhook")
 async def test_webhook(request: Request):
     """Test endpoint for webhook processing"""
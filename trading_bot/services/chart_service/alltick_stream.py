@@ -0,0 +1,267 @@
+import os
+import json
+import asyncio
+import logging
+import random
+import time
+import uuid
+from collections import namedtuple
+from typing import Optional, Dict, List, Any, AsyncIterator
+
+import aiohttp
+import pandas as pd
+
+from trading_bot.services.chart_service.alltick_provider import AllTickProvider
+from trading_bot.services.chart_service.candle_store import candle_store
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# AllTick WebSocket commands
+CMD_HEARTBEAT = 22000
+CMD_SUBSCRIBE_TRADES = 22004
+CMD_TRADE_PUSH = 22998
+
+# Forex and index instruments Yahoo serves slowly (internal names)
+DEFAULT_STREAM_INSTRUMENTS = "EURUSD,GBPUSD,USDJPY,USDCHF,AUDUSD,USDCAD,NZDUSD,EURGBP,EURJPY,GBPJPY,XAUUSD,US30,US500,US100,UK100,DE40,JP225"
+
+Tick = namedtuple("Tick", ["instrument", "price", "volume", "ts"])
+
+
+class WebSocketTransport:
+    """AllTick WebSocket connection (aiohttp)"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self._session = None
+        self._ws = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession()
+        try:
+            self._ws = await self._session.ws_connect(self.url, heartbeat=30)
+        except Exception:
+            await self._session.close()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._ws is not None:
+            await self._ws.close()
+        await self._session.close()
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        await self._ws.send_str(json.dumps(message))
+
+    async def messages(self) -> AsyncIterator[Dict[str, Any]]:
+        async for msg in self._ws:
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                yield json.loads(msg.data)
+            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                break
+
+
+class ReplayTransport:
+    """
+    Local stand-in for the AllTick WebSocket: plays back recorded messages (a JSONL file as
+    written with ALLTICK_STREAM_RECORD, or a list of dicts) and accepts sends without a network.
+    Used for tests and offline development.
+    """
+
+    def __init__(self, source, speed: float = 0.0):
+        """
+        Args:
+            source: Path to a JSONL recording, or a list of message dicts
+            speed: Playback speed relative to the recorded tick times (0 = as fast as possible)
+        """
+        self.source = source
+        self.speed = speed
+        self.sent: List[Dict[str, Any]] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        self.sent.append(message)
+
+    def _load(self) -> List[Dict[str, Any]]:
+        if isinstance(self.source, (list, tuple)):
+            return list(self.source)
+        with open(self.source) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    async def messages(self) -> AsyncIterator[Dict[str, Any]]:
+        previous = None
+        for message in self._load():
+            tick_time = (message.get("data") or {}).get("tick_time")
+            if self.speed > 0 and tick_time is not None:
+                tick_time = int(tick_time) / 1000
+                if previous is not None and tick_time > previous:
+                    await asyncio.sleep((tick_time - previous) / self.speed)
+                previous = tick_time
+            yield message
+            await asyncio.sleep(0)
+
+
+class AllTickStream:
+    """
+    Streaming AllTick trade ticks for forex and index instruments.
+
+    Keeps the latest tick and the H1 candle being built per instrument in memory; completed
+    candles go to the candle store (source 'alltick'). Reconnects with exponential backoff and
+    jitter. Price and TA lookups read this state instead of polling REST.
+    """
+
+    def __init__(self, instruments: Optional[List[str]] = None, transport_factory=None):
+        """
+        Args:
+            instruments: Internal instrument names (default from ALLTICK_STREAM_INSTRUMENTS)
+            transport_factory: Callable returning a transport (WebSocketTransport or ReplayTransport)
+        """
+        instruments = instruments or [i for i in os.getenv("ALLTICK_STREAM_INSTRUMENTS", DEFAULT_STREAM_INSTRUMENTS).split(",") if i.strip()]
+        self.instruments = [i.strip().upper() for i in instruments]
+        # AllTick codes without the REST category prefix (forex.EURUSD -> EURUSD)
+        self._codes = {AllTickProvider._format_symbol(i).split(".", 1)[-1]: i for i in self.instruments}
+        self.url = os.getenv("ALLTICK_WS_URL", "wss://quote.alltick.io/quote-b-ws-api")
+        self.candle_seconds = 3600
+        # A tick older than this is not used for prices (markets closed, stream stalled)
+        self.max_tick_age = float(os.getenv("ALLTICK_MAX_TICK_AGE", "300"))
+        self.record_path = os.getenv("ALLTICK_STREAM_RECORD")
+        replay = os.getenv("ALLTICK_STREAM_REPLAY")
+        if transport_factory is None and replay:
+            # Offline: play a recording instead of connecting
+            transport_factory = lambda: ReplayTransport(replay, speed=float(os.getenv("ALLTICK_STREAM_REPLAY_SPEED", "0")))
+        self._transport_factory = transport_factory or (
+            lambda: WebSocketTransport(f"{self.url}?token={AllTickProvider.API_TOKEN}"))
+
+        self._ticks: Dict[str, Tick] = {}
+        self._candles: Dict[str, Dict[str, float]] = {}
+        self._task = None
+        self._running = False
+        self.connected = False
+
+    def start(self) -> None:
+        """Start the consumer in the background (idempotent)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._running = True
+        self._task = asyncio.ensure_future(self._run())
+        logger.info(f"AllTick stream starting for {len(self.instruments)} instruments")
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def _message(self, cmd_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {"cmd_id": cmd_id, "seq_id": random.randint(1, 2**31), "trace": uuid.uuid4().hex, "data": data}
+
+    async def _heartbeat(self, transport) -> None:
+        while True:
+            await asyncio.sleep(10)
+            await transport.send(self._message(CMD_HEARTBEAT, {}))
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while self._running:
+            heartbeat = None
+            try:
+                async with self._transport_factory() as transport:
+                    await transport.send(self._message(CMD_SUBSCRIBE_TRADES, {
+                        "symbol_list": [{"code": code} for code in self._codes]
+                    }))
+                    self.connected = True
+                    chart_metrics.set_gauge("alltick_stream.connected", True)
+                    logger.info("AllTick stream connected")
+                    backoff = 1.0
+                    heartbeat = asyncio.ensure_future(self._heartbeat(transport))
+                    async for message in transport.messages():
+                        self.handle_message(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"AllTick stream error: {str(e)}")
+            finally:
+                if heartbeat is not None:
+                    heartbeat.cancel()
+                self.connected = False
+                chart_metrics.set_gauge("alltick_stream.connected", False)
+
+            if self._running:
+                chart_metrics.increment("alltick_stream.reconnects")
+                delay = backoff * (1 + random.random() * 0.5)
+                logger.warning(f"AllTick stream disconnected, reconnecting in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, 120.0)
+
+    def handle_message(self, message: Dict[str, Any]) -> None:
+        """Apply one pushed message (public so replays and tests can feed messages directly)"""
+        if self.record_path:
+            with open(self.record_path, "a") as f:
+                f.write(json.dumps(message) + "\n")
+        if message.get("cmd_id") != CMD_TRADE_PUSH:
+            return
+        data = message.get("data") or {}
+        instrument = self._codes.get(data.get("code"))
+        if instrument is None:
+            return
+        try:
+            price = float(data["price"])
+            volume = float(data.get("volume") or 0)
+            ts = int(data["tick_time"]) / 1000
+        except (KeyError, TypeError, ValueError):
+            return
+        self._ticks[instrument] = Tick(instrument, price, volume, ts)
+        chart_metrics.increment("alltick_stream.ticks")
+        self._update_candle(instrument, price, volume, ts)
+
+    def _update_candle(self, instrument: str, price: float, volume: float, ts: float) -> None:
+        start = int(ts // self.candle_seconds * self.candle_seconds)
+        candle = self._candles.get(instrument)
+        if candle is not None and start < candle["ts"]:
+            return  # Late tick for an already completed candle
+        if candle is None or start > candle["ts"]:
+            if candle is not None:
+                self._complete_candle(instrument, candle)
+            self._candles[instrument] = {"ts": start, "open": price, "high": price, "low": price, "close": price, "volume": volume}
+            return
+        candle["high"] = max(candle["high"], price)
+        candle["low"] = min(candle["low"], price)
+        candle["close"] = price
+        candle["volume"] += volume
+
+    def _complete_candle(self, instrument: str, candle: Dict[str, float]) -> None:
+        try:
+            df = pd.DataFrame([candle]).set_index(pd.to_datetime([candle["ts"]], unit="s", utc=True)).drop(columns="ts")
+            candle_store.write("alltick", instrument, "1h", df)
+            chart_metrics.increment("alltick_stream.closed_candles")
+        except Exception as e:
+            logger.error(f"Error storing AllTick candle for {instrument}: {str(e)}")
+
+    def get_tick(self, instrument: str) -> Optional[Tick]:
+        """Latest tick of an instrument, or None when there is none or it is too old"""
+        tick = self._ticks.get(instrument.upper().replace("/", ""))
+        if tick is None or time.time() - tick.ts > self.max_tick_age:
+            return None
+        return tick
+
+    def get_price(self, instrument: str) -> Optional[float]:
+        tick = self.get_tick(instrument)
+        return tick.price if tick is not None else None
+
+    def get_candle(self, instrument: str) -> Optional[Dict[str, float]]:
+        """The H1 candle being built (ts = open time in seconds, open/high/low/close/volume)"""
+        candle = self._candles.get(instrument.upper().replace("/", ""))
+        return dict(candle) if candle is not None else None
+
+
+# Shared consumer; started by ChartService.initialize when ALLTICK_STREAM_ENABLED is set
+alltick_stream = AllTickStream()
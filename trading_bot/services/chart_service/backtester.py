@@ -0,0 +1,333 @@
+import os
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+import numpy as np
+import pandas as pd
+
+from trading_bot.services.chart_service.candle_store import candle_store
+from trading_bot.services.chart_service.concurrency import market_data_executor
+from trading_bot.services.chart_service.correlation import signal_direction
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service.ta_snapshots import store_key
+from trading_bot.services.instrument_registry import instrument_registry
+
+logger = logging.getLogger(__name__)
+
+BAR_SECONDS = 3600
+
+# Outcome codes of simulate()
+NO_DATA, STOP_LOSS, OPEN, TAKE_PROFIT = -2, -1, 0, 1
+OUTCOME_NAMES = {NO_DATA: "no_data", STOP_LOSS: "sl", OPEN: "open", TAKE_PROFIT: "tp"}
+
+# Upper bound of max_bars per request (one year of H1 bars)
+MAX_BARS_LIMIT = int(os.getenv("BACKTEST_MAX_BARS_LIMIT", str(365 * 24)))
+
+# First window of bars scanned per signal; doubled for the signals still open after it
+FIRST_WINDOW = 16
+
+
+def simulate(ts: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+             signal_times: np.ndarray, is_buy: np.ndarray, entry: np.ndarray, sl: np.ndarray,
+             tp: np.ndarray, max_bars: int) -> Dict[str, np.ndarray]:
+    """
+    Play out a batch of signals on one instrument's candles, all at once.
+
+    Each signal starts at the first bar that opens at or after its time (np.searchsorted);
+    signals before the first or after the last candle have no data. The
+    following bars of all still-open signals are gathered into (signals x bars) arrays in
+    doubling windows, and the first bar touching the take profit and the stop loss are found
+    with argmax along the rows; most trades close in the first window, so only the long ones
+    are scanned further. When both levels are touched in the same bar the stop loss counts
+    (the order inside a bar is unknown).
+
+    Args:
+        ts, high, low, close: Candles, oldest first (ts = bar open, epoch seconds)
+        signal_times: Epoch seconds per signal
+        is_buy: True for long, False for short signals
+        entry, sl, tp: Prices per signal
+        max_bars: Longest time in trade before the signal counts as still open
+
+    Returns:
+        Dict of per-signal arrays: outcome (see OUTCOME_NAMES), exit_price, bars (in trade,
+        whole bars), exit_time (close of the exit bar), r (result in multiples of the risk),
+        mae and mfe (adverse and favourable excursion in price). Open trades are valued at the
+        close of their last bar.
+    """
+    count, bars = len(signal_times), len(ts)
+    begin = np.searchsorted(ts, signal_times, side="left")
+    outcome = np.full(count, NO_DATA, dtype=np.int8)
+    if bars == 0:
+        ts, high, low, close = (np.zeros(1, dtype=array.dtype) for array in (ts, high, low, close))
+    exit_offset = np.zeros(count, dtype=np.int64)
+    # Running extremes of the bars scanned so far
+    highest = np.full(count, -np.inf)
+    lowest = np.full(count, np.inf)
+
+    # Signals outside the stored history have no data (searchsorted would start one that is
+    # older than the first candle at that candle); the others are open until a level is touched
+    active = np.flatnonzero((begin < bars) & (signal_times >= ts[0]))
+    outcome[active] = OPEN
+    start, width = 0, FIRST_WINDOW
+    while len(active) and start < max_bars:
+        width = min(width, max_bars - start)
+        offsets = np.arange(start, start + width)
+        index = begin[active, None] + offsets
+        valid = index < bars
+        index = np.minimum(index, bars - 1)
+        bar_high = np.where(valid, high[index], -np.inf)
+        bar_low = np.where(valid, low[index], np.inf)
+        buy = is_buy[active, None]
+        s, t = sl[active, None], tp[active, None]
+        tp_hit = np.where(buy, bar_high >= t, bar_low <= t)
+        sl_hit = np.where(buy, bar_low <= s, bar_high >= s)
+
+        # First touching bar in the window; width when never touched
+        first_tp = np.where(tp_hit.any(axis=1), tp_hit.argmax(axis=1), width)
+        first_sl = np.where(sl_hit.any(axis=1), sl_hit.argmax(axis=1), width)
+        touched = np.minimum(first_tp, first_sl)
+        closed = touched < width
+        # Still open at the end of the data: the last available bar
+        last = valid.sum(axis=1) - 1
+        exhausted = ~closed & (~valid[:, -1] | (start + width >= max_bars))
+        end = np.where(closed, touched, np.where(exhausted, last, width - 1))
+
+        in_window = np.arange(width) <= end[:, None]
+        highest[active] = np.maximum(highest[active], np.where(in_window, bar_high, -np.inf).max(axis=1))
+        lowest[active] = np.minimum(lowest[active], np.where(in_window, bar_low, np.inf).min(axis=1))
+
+        done = closed | exhausted
+        rows = active[done]
+        outcome[rows] = np.where(~closed[done], OPEN, np.where(first_sl[done] <= first_tp[done], STOP_LOSS, TAKE_PROFIT))
+        exit_offset[rows] = start + np.maximum(end[done], 0)
+        active = active[~done]
+        start += width
+        width *= 2
+
+    has_data = outcome != NO_DATA
+    exit_index = np.minimum(begin + exit_offset, max(bars - 1, 0))
+    exit_price = np.where(outcome == STOP_LOSS, sl, np.where(outcome == TAKE_PROFIT, tp, close[exit_index]))
+    risk = np.abs(entry - sl)
+    mfe = np.where(is_buy, highest - entry, entry - lowest)
+    mae = np.where(is_buy, entry - lowest, highest - entry)
+    # The trade is closed at the level, so the exit bar's move beyond it does not count
+    mae = np.where(outcome == STOP_LOSS, risk, mae)
+    mfe = np.where(outcome == TAKE_PROFIT, np.abs(tp - entry), mfe)
+    pnl = np.where(is_buy, exit_price - entry, entry - exit_price)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = np.where(has_data & (risk > 0), pnl / risk, np.nan)
+    return {
+        "outcome": outcome,
+        "exit_price": np.where(has_data, exit_price, np.nan),
+        "bars": np.where(has_data, exit_offset + 1, 0),
+        "exit_time": np.where(has_data, ts[exit_index] + BAR_SECONDS, 0),
+        "r": r,
+        "mae": np.where(has_data, np.maximum(mae, 0.0), np.nan),
+        "mfe": np.where(has_data, np.maximum(mfe, 0.0), np.nan),
+    }
+
+
+def _signal_time(signal: Dict[str, Any]) -> Optional[int]:
+    """Epoch seconds of a signal: 'timestamp', 'time' or 'created_at' (epoch s/ms or ISO string)"""
+    value = signal.get("timestamp") or signal.get("time") or signal.get("created_at")
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+        return int(number / 1000 if number > 1e11 else number)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.tz_localize("UTC")
+    return int(parsed.timestamp())
+
+
+def _price(signal: Dict[str, Any], *fields: str) -> float:
+    for field in fields:
+        try:
+            value = float(signal.get(field))
+        except (TypeError, ValueError):
+            continue
+        if np.isfinite(value) and value > 0:
+            return value
+    return np.nan
+
+
+class Backtester:
+    """
+    Evaluates batches of past signals against the stored H1 candles.
+
+    Signals use the webhook payload fields: instrument, price (or entry), sl, tp (or tp1 /
+    take_profit), the direction ('direction', 'signal' or the side of the stop loss) and the
+    signal time ('timestamp', 'time' or 'created_at'). Without a take profit only the stop loss
+    can close the trade.
+
+    Only the H1 candles already in the candle store are used, nothing is backfilled: the
+    providers keep about the last 500 bars (roughly three weeks). Signals older than the first
+    stored bar come back as no_data; the stored range per instrument is part of the result.
+    """
+
+    def __init__(self, max_bars: Optional[int] = None):
+        """
+        Args:
+            max_bars: Longest time in trade in H1 bars (default BACKTEST_MAX_BARS, 30 days)
+        """
+        self.max_bars = max_bars or int(os.getenv("BACKTEST_MAX_BARS", str(30 * 24)))
+
+    def _parse(self, signal: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalized signal, with 'error' set when it cannot be tested"""
+        entry = instrument_registry.get(str(signal.get("instrument", "")))
+        direction = signal_direction(signal)
+        price = _price(signal, "entry", "price")
+        sl = _price(signal, "sl", "stop_loss")
+        tp = _price(signal, "tp", "tp1", "take_profit")
+        parsed = {
+            "instrument": entry.symbol if entry is not None else str(signal.get("instrument", "")).upper(),
+            "direction": direction, "entry": price, "sl": sl, "tp": tp, "time": _signal_time(signal),
+        }
+        if entry is None:
+            parsed["error"] = "unknown instrument"
+        elif parsed["time"] is None:
+            parsed["error"] = "missing signal time"
+        elif not direction or np.isnan(price) or np.isnan(sl):
+            parsed["error"] = "missing direction, entry or stop loss"
+        elif (sl >= price) if direction == "BUY" else (sl <= price):
+            parsed["error"] = "stop loss on the wrong side of the entry"
+        elif not np.isnan(tp) and ((tp <= price) if direction == "BUY" else (tp >= price)):
+            parsed["error"] = "take profit on the wrong side of the entry"
+        return parsed
+
+    def run_sync(self, signals: List[Dict[str, Any]], max_bars: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Play out `signals` (any mix of instruments); one simulate() call per instrument.
+
+        Returns:
+            Dict with results (one per signal, in input order), summary (see summarize) and
+            history (first and last stored bar and the bar count per instrument)
+        """
+        start = time.perf_counter()
+        max_bars = max_bars or self.max_bars
+        parsed = [self._parse(signal) for signal in signals]
+        results: List[Dict[str, Any]] = [dict(p) for p in parsed]
+        history: Dict[str, Dict[str, Any]] = {}
+
+        by_instrument: Dict[str, List[int]] = {}
+        for i, p in enumerate(parsed):
+            if "error" not in p:
+                by_instrument.setdefault(p["instrument"], []).append(i)
+
+        for instrument, rows in by_instrument.items():
+            df = candle_store.read(*store_key(instrument, "1h"))
+            if df is None or df.empty:
+                for i in rows:
+                    results[i]["error"] = "no stored H1 candles"
+                continue
+            ts = df.index.asi8 // 10**9
+            history[instrument] = {
+                "first": datetime.utcfromtimestamp(int(ts[0])).isoformat() + "Z",
+                "last": datetime.utcfromtimestamp(int(ts[-1])).isoformat() + "Z",
+                "bars": len(ts),
+            }
+            items = [parsed[i] for i in rows]
+            is_buy = np.array([p["direction"] == "BUY" for p in items])
+            tp = np.array([p["tp"] for p in items])
+            # No take profit: a level that is never reached
+            tp = np.where(np.isnan(tp), np.where(is_buy, np.inf, -np.inf), tp)
+            outcome = simulate(
+                ts, df["High"].to_numpy(dtype=float), df["Low"].to_numpy(dtype=float),
+                df["Close"].to_numpy(dtype=float), np.array([p["time"] for p in items], dtype=np.int64), is_buy,
+                np.array([p["entry"] for p in items]), np.array([p["sl"] for p in items]), tp, max_bars)
+
+            precision = instrument_registry.precision(instrument)
+            for j, i in enumerate(rows):
+                code = int(outcome["outcome"][j])
+                result = results[i]
+                result["outcome"] = OUTCOME_NAMES[code]
+                if code == NO_DATA:
+                    result["error"] = (f"signal before the first stored candle ({history[instrument]['first']})"
+                                       if result["time"] < ts[0] else
+                                       f"signal after the last stored candle ({history[instrument]['last']})")
+                    continue
+                risk = abs(result["entry"] - result["sl"])
+                result.update({
+                    "exit_price": round(float(outcome["exit_price"][j]), precision),
+                    "exit_time": datetime.utcfromtimestamp(int(outcome["exit_time"][j])).isoformat() + "Z",
+                    "hours_in_trade": int(outcome["bars"][j]),
+                    "r": round(float(outcome["r"][j]), 2),
+                    "mae": round(float(outcome["mae"][j]), precision),
+                    "mfe": round(float(outcome["mfe"][j]), precision),
+                    "mae_r": round(float(outcome["mae"][j]) / risk, 2),
+                    "mfe_r": round(float(outcome["mfe"][j]) / risk, 2),
+                })
+
+        # NaN as None, so the result is valid JSON
+        for result in results:
+            for key in ("entry", "sl", "tp"):
+                if isinstance(result.get(key), float) and np.isnan(result[key]):
+                    result[key] = None
+            if result["time"] is not None:
+                result["time"] = datetime.utcfromtimestamp(result["time"]).isoformat() + "Z"
+
+        elapsed = time.perf_counter() - start
+        chart_metrics.record("backtest.run_time", elapsed)
+        chart_metrics.increment("backtest.signals", len(signals))
+        return {"results": results, "summary": self.summarize(results), "history": history,
+                "max_bars": max_bars, "elapsed_ms": round(elapsed * 1000, 2)}
+
+    @staticmethod
+    def check_max_bars(max_bars: Any) -> Optional[int]:
+        """
+        Validated max_bars from a request (an int or a string of digits, None for the default).
+
+        Raises:
+            ValueError: When it is not a whole number between 1 and MAX_BARS_LIMIT
+        """
+        if max_bars is None:
+            return None
+        if isinstance(max_bars, str) and max_bars.strip().isdigit():
+            max_bars = int(max_bars)
+        if isinstance(max_bars, bool) or not isinstance(max_bars, int):
+            raise ValueError("max_bars must be a whole number of H1 bars")
+        if not 1 <= max_bars <= MAX_BARS_LIMIT:
+            raise ValueError(f"max_bars must be between 1 and {MAX_BARS_LIMIT}")
+        return max_bars
+
+    async def run(self, signals: List[Dict[str, Any]], max_bars: Optional[int] = None) -> Dict[str, Any]:
+        """run_sync on the market data executor (the candle files are read from disk)"""
+        max_bars = self.check_max_bars(max_bars)
+        return await market_data_executor.run(self.run_sync, signals, max_bars)
+
+    @staticmethod
+    def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Counts per outcome, win rate over the closed trades and averages of R, MAE/MFE and time"""
+        tested = [r for r in results if "error" not in r]
+        counts = {name: sum(1 for r in tested if r["outcome"] == name) for name in ("tp", "sl", "open")}
+        closed = counts["tp"] + counts["sl"]
+
+        def average(key: str) -> Optional[float]:
+            values = [r[key] for r in tested if np.isfinite(r.get(key, np.nan))]
+            return round(float(np.mean(values)), 2) if values else None
+
+        return {
+            "signals": len(results),
+            "tested": len(tested),
+            "skipped": len(results) - len(tested),
+            **counts,
+            "win_rate": round(counts["tp"] / closed, 3) if closed else None,
+            "avg_r": average("r"),
+            "total_r": round(float(sum(r["r"] for r in tested if np.isfinite(r["r"]))), 2) if tested else 0.0,
+            "avg_mae_r": average("mae_r"),
+            "avg_mfe_r": average("mfe_r"),
+            "avg_hours_in_trade": average("hours_in_trade"),
+        }
+
+
+# Shared backtester used by the API
+backtester = Backtester()
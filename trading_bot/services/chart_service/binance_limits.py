@@ -0,0 +1,200 @@
+import os
+import asyncio
+import logging
+import random
+import time
+from typing import Optional, Dict, List, Iterable, Any, Tuple
+from urllib.parse import urlparse
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Request weight per REST endpoint (Binance spot API documentation)
+ENDPOINT_WEIGHTS = {
+    "/api/v3/ticker/price": 2,
+    "/api/v3/account": 20,
+    "/api/v3/order": 1,
+}
+
+
+def request_weight(endpoint: str, params: Optional[Dict[str, Any]] = None) -> int:
+    """Weight a request counts against the 1 minute IP limit"""
+    if endpoint == "/api/v3/klines":
+        # Klines are priced by the number of candles requested
+        limit = int((params or {}).get("limit", 500))
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
+    if endpoint == "/api/v3/ticker/price" and not (params or {}).get("symbol"):
+        return 4
+    return ENDPOINT_WEIGHTS.get(endpoint, 1)
+
+
+class WeightLimiter:
+    """
+    Tracks the request weight used in the current minute, as reported by Binance in the
+    X-MBX-USED-WEIGHT-1M header, and holds requests back before the cap is reached.
+
+    Below `soft_ratio` of the limit requests go straight through; above it each request waits a
+    growing share of the rest of the minute, and a request that would exceed the limit waits for
+    the next minute. A 429/418 response blocks all requests for its Retry-After.
+    """
+
+    def __init__(self, limit: int, soft_ratio: float = 0.8):
+        """
+        Args:
+            limit: Weight allowed per minute (REQUEST_WEIGHT limit of the account/IP)
+            soft_ratio: Share of the limit after which requests are slowed down
+        """
+        self.limit = limit
+        self.soft_ratio = soft_ratio
+        self.used = 0
+        self._minute = self._current_minute()
+        self._blocked_until = 0.0
+
+    @staticmethod
+    def _current_minute() -> int:
+        # Binance resets the weight per calendar minute
+        return int(time.time() // 60)
+
+    def _roll(self) -> None:
+        minute = self._current_minute()
+        if minute != self._minute:
+            self._minute = minute
+            self.used = 0
+
+    def _delay(self, weight: int) -> Tuple[float, bool]:
+        """Seconds to wait before a request of `weight`, and whether it is a hard wait"""
+        now = time.time()
+        if now < self._blocked_until:
+            return self._blocked_until - now, True
+        self._roll()
+        until_reset = 60 - now % 60
+        projected = self.used + weight
+        if projected > self.limit:
+            return until_reset + 0.5, True
+        soft_cap = self.limit * self.soft_ratio
+        if projected > soft_cap:
+            # Spread the remaining headroom over the rest of the minute
+            pressure = (projected - soft_cap) / max(self.limit - soft_cap, 1)
+            return until_reset * pressure * 0.5, False
+        return 0.0, False
+
+    async def acquire(self, weight: int) -> None:
+        """Wait until a request of `weight` fits, then reserve it"""
+        while True:
+            delay, hard = self._delay(weight)
+            if delay <= 0:
+                break
+            chart_metrics.increment("binance.weight_waits")
+            logger.warning(f"Binance weight {self.used}/{self.limit} used this minute, delaying request {delay:.1f}s")
+            await asyncio.sleep(delay)
+            # A soft delay is waited once; the cap and rate-limit blocks are waited out completely
+            if not hard:
+                break
+        self._roll()
+        self.used += weight
+        chart_metrics.set_gauge("binance.used_weight", self.used)
+
+    def update(self, status: int, headers) -> None:
+        """Take the server-reported weight (and rate-limit blocks) from a response"""
+        self._roll()
+        used = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("x-mbx-used-weight-1m")
+        if used is not None:
+            try:
+                # The server count includes other clients on the same IP; local reservations for
+                # requests still in flight are kept when they are higher
+                self.used = max(self.used, int(used))
+            except ValueError:
+                pass
+        if status in (418, 429):
+            retry_after = headers.get("Retry-After")
+            seconds = float(retry_after) if retry_after and retry_after.isdigit() else 60.0
+            self._blocked_until = time.time() + seconds
+            chart_metrics.increment("binance.rate_limited")
+            logger.error(f"Binance rate limit hit (HTTP {status}), pausing requests for {seconds:.0f}s")
+        chart_metrics.set_gauge("binance.used_weight", self.used)
+
+
+class EndpointSelector:
+    """
+    Chooses the REST host with the best recent latency and error rate instead of rotating.
+
+    Per host an EWMA of the response time and of the failure rate is kept; the score is
+    latency * (1 + error_penalty * error_rate). Hosts that just failed sit out a cooldown,
+    hosts without measurements are tried first, and a small share of requests goes to a random
+    host so the statistics of the others stay current.
+    """
+
+    def __init__(self, hosts: Iterable[str], alpha: float = 0.2, error_penalty: float = 4.0,
+                 cooldown: float = 30.0, explore: float = 0.05):
+        self.hosts: List[str] = list(hosts)
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self.cooldown = cooldown
+        self.explore = explore
+        self._stats: Dict[str, Dict[str, float]] = {
+            host: {"latency": None, "error_rate": 0.0, "failed_at": 0.0} for host in self.hosts
+        }
+
+    @staticmethod
+    def _host(url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}" if parsed.netloc else url
+
+    def score(self, host: str) -> float:
+        stats = self._stats[host]
+        if stats["latency"] is None:
+            return 0.0
+        return stats["latency"] * (1.0 + self.error_penalty * stats["error_rate"])
+
+    def best(self) -> str:
+        now = time.time()
+        available = [h for h in self.hosts if now - self._stats[h]["failed_at"] >= self.cooldown]
+        if not available:
+            # Everything failed recently: take the one that failed longest ago
+            return min(self.hosts, key=lambda h: self._stats[h]["failed_at"])
+        if len(available) > 1 and random.random() < self.explore:
+            return random.choice(available)
+        return min(available, key=self.score)
+
+    def record_success(self, url: str, latency: float) -> None:
+        stats = self._stats.get(self._host(url))
+        if stats is None:
+            return
+        stats["latency"] = latency if stats["latency"] is None else (
+            self.alpha * latency + (1 - self.alpha) * stats["latency"])
+        stats["error_rate"] *= (1 - self.alpha)
+        self._publish()
+
+    def record_failure(self, url: str) -> None:
+        stats = self._stats.get(self._host(url))
+        if stats is None:
+            return
+        stats["error_rate"] = self.alpha + (1 - self.alpha) * stats["error_rate"]
+        stats["failed_at"] = time.time()
+        chart_metrics.increment("binance.endpoint_failures")
+        self._publish()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            host: {
+                "latency_ms": round(stats["latency"] * 1000, 1) if stats["latency"] is not None else None,
+                "error_rate": round(stats["error_rate"], 3),
+            }
+            for host, stats in self._stats.items()
+        }
+
+    def _publish(self) -> None:
+        chart_metrics.set_gauge("binance.endpoints", self.snapshot())
+
+
+weight_limiter = WeightLimiter(
+    limit=int(os.getenv("BINANCE_WEIGHT_LIMIT", "6000")),
+    soft_ratio=float(os.getenv("BINANCE_WEIGHT_SOFT_RATIO", "0.8")),
+)
@@ -6,7 +6,6 @@ import aiohttp
 import hmac
 import hashlib
 import time
-import random
 from typing import Optional, Dict, Any, List
 from collections import namedtuple
 import pandas as pd
@@ -14,8 +13,18 @@ import numpy as np
 from datetime import datetime, timedelta
 from urllib.parse import urlencode
 
+from trading_bot.services.chart_service.binance_limits import EndpointSelector, request_weight, weight_limiter
+from trading_bot.services.chart_service.candle_store import candle_store
+from trading_bot.services.chart_service.indicators import indicator_engine
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service import timeframes
+from trading_bot.services.instrument_registry import instrument_registry
+
 logger = logging.getLogger(__name__)
 
+# Binance intervals that are built from the 1h series instead of fetched separately
+DERIVED_TIMEFRAMES = {"4h": "H4", "1d": "D1"}
+
 class BinanceProvider:
     """Provider class for Binance API integration for cryptocurrency data"""
     
@@ -32,88 +41,110 @@ class BinanceProvider:
     # Data API endpoint for market data only
     DATA_API_ENDPOINT = "https://data-api.binance.vision"
     
-    # Current active endpoint (start with the primary one)
-    _active_endpoint_index = 0
-    
-    # Track API usage
-    _last_api_call = 0
-    _api_call_count = 0
-    _max_calls_per_minute = 20  # Binance rate limits
+    # Endpoint choice by measured latency/error rate; weight tracked from X-MBX-USED-WEIGHT-1M
+    _endpoints = EndpointSelector(BASE_ENDPOINTS)
+    _last_endpoint = BASE_ENDPOINTS[0]
     
     # API credentials (loaded from environment variables)
     API_KEY = os.environ.get("BINANCE_API_KEY", "")
     API_SECRET = os.environ.get("BINANCE_API_SECRET", "")
     
+    # Live kline stream (BinanceKlineStream) serving candles from memory while it is healthy
+    _stream = None
+    
+    @classmethod
+    def attach_stream(cls, stream) -> None:
+        """Register (or with None: remove) the live kline stream used by get_candles"""
+        cls._stream = stream
+    
     @classmethod
     def get_base_url(cls):
-        """Get current active base URL with optional failover"""
-        return cls.BASE_ENDPOINTS[cls._active_endpoint_index]
+        """Get the base URL with the best recent latency and error rate"""
+        cls._last_endpoint = cls._endpoints.best()
+        return cls._last_endpoint
     
     @classmethod
     def switch_endpoint(cls):
-        """Switch to next endpoint for failover"""
-        cls._active_endpoint_index = (cls._active_endpoint_index + 1) % len(cls.BASE_ENDPOINTS)
+        """Record a failure of the last used endpoint and fail over to the best other one"""
+        cls._endpoints.record_failure(cls._last_endpoint)
         new_endpoint = cls.get_base_url()
         logger.info(f"Switching to Binance endpoint: {new_endpoint}")
         return new_endpoint
     
+    @classmethod
+    def _observe(cls, url: str, response, started: float) -> None:
+        """Feed a response into the weight limiter and the endpoint latency statistics"""
+        weight_limiter.update(response.status, response.headers)
+        if response.status == 200:
+            cls._endpoints.record_success(url, time.perf_counter() - started)
+    
     @staticmethod
-    async def get_market_data(instrument: str, timeframe: str = "1h") -> Optional[Dict[str, Any]]:
+    def _map_interval(timeframe: str) -> str:
+        """Map timeframe to Binance interval"""
+        return {
+            "1m": "1m", 
+            "5m": "5m", 
+            "15m": "15m", 
+            "30m": "30m",
+            "1h": "1h", 
+            "2h": "2h", 
+            "4h": "4h", 
+            "1d": "1d",
+            "1w": "1w",
+            "1M": "1M"
+        }.get(timeframe, "1h")
+    
+    @staticmethod
+    async def get_candles(instrument: str, timeframe: str = "1h", limit: Optional[int] = None,
+                          use_stream: bool = True) -> Optional[pd.DataFrame]:
         """
-        Get market data from Binance API for technical analysis.
+        Get OHLCV candles with technical indicators from the Binance API.
         
         Args:
             instrument: Trading instrument (e.g., BTCUSD, ETHUSDT)
-            timeframe: Timeframe for analysis (1h, 4h, 1d)
+            timeframe: Timeframe (1h, 4h, 1d)
+            limit: Number of candles (default depends on timeframe)
+            use_stream: Serve from the live kline stream when it has this series and is healthy
             
         Returns:
-            Optional[Dict]: Technical analysis data or None if failed
+            Optional[pd.DataFrame]: Candles with indicator columns or None if failed
         """
+        if use_stream and BinanceProvider._stream is not None:
+            streamed = BinanceProvider._stream.get_candles(instrument, timeframe, limit)
+            if streamed is not None:
+                chart_metrics.increment("binance.stream_hits")
+                return streamed
+        
+        # H4/D1 are aggregated from the 1h series when it covers them (local CPU instead of a request per timeframe)
+        derived = DERIVED_TIMEFRAMES.get(BinanceProvider._map_interval(timeframe))
+        if derived is not None:
+            candles = limit or 120
+            base_rows = timeframes.base_limit(derived, candles)
+            if base_rows <= 1000:
+                base = await BinanceProvider.get_candles(instrument, "1h", limit=base_rows, use_stream=use_stream)
+                if base is None or base.empty:
+                    return None
+                base_key = ("binance", BinanceProvider._format_symbol(instrument), "1h")
+                ohlcv = base[["open", "high", "low", "close", "volume"]]
+                df = timeframes.resample_cached(ohlcv, derived, "crypto", base_key)
+                return BinanceProvider._calculate_indicators(df, key=base_key + (derived,)).tail(candles)
+        
         retries = 0
         max_retries = 3
         
         while retries < max_retries:
             try:
-                # Implement basic rate limiting
-                current_time = time.time()
-                minute_passed = current_time - BinanceProvider._last_api_call >= 60
-                
-                if minute_passed:
-                    # Reset counter if a minute has passed
-                    BinanceProvider._api_call_count = 0
-                    BinanceProvider._last_api_call = current_time
-                elif BinanceProvider._api_call_count >= BinanceProvider._max_calls_per_minute:
-                    # If we hit the rate limit, wait until the minute is up
-                    logger.warning(f"Binance API rate limit reached ({BinanceProvider._api_call_count} calls). Waiting before retry.")
-                    await asyncio.sleep(5 + random.random() * 2)  # Add jitter to prevent thundering herd
-                
-                # Increment the API call counter
-                BinanceProvider._api_call_count += 1
-                
                 # Format symbol for Binance API
                 formatted_symbol = BinanceProvider._format_symbol(instrument)
                 
-                base_url = BinanceProvider.get_base_url()
-                logger.info(f"Fetching {formatted_symbol} data from Binance using {base_url}. API call #{BinanceProvider._api_call_count} this minute.")
-                
                 # Map timeframe to Binance interval
-                binance_interval = {
-                    "1m": "1m", 
-                    "5m": "5m", 
-                    "15m": "15m", 
-                    "30m": "30m",
-                    "1h": "1h", 
-                    "2h": "2h", 
-                    "4h": "4h", 
-                    "1d": "1d",
-                    "1w": "1w",
-                    "1M": "1M"
-                }.get(timeframe, "1h")
+                binance_interval = BinanceProvider._map_interval(timeframe)
                 
                 # Determine the number of candles to fetch based on timeframe
-                limit = 100
-                if binance_interval in ["1h", "2h", "4h"]:
-                    limit = 120  # Get more data for better indicator calculation
+                if limit is None:
+                    limit = 100
+                    if binance_interval in ["1h", "2h", "4h"]:
+                        limit = 120  # Get more data for better indicator calculation
                     
                 # Fetch klines (candlestick data)
                 endpoint = "/api/v3/klines"
@@ -123,13 +154,29 @@ class BinanceProvider:
                     "limit": limit
                 }
                 
+                # With enough stored history only fetch from the last stored candle onwards
+                store_key = ("binance", formatted_symbol, binance_interval)
+                missing_bars = candle_store.missing_bars(*store_key)
+                incremental = (missing_bars is not None and missing_bars < 1000
+                               and candle_store.row_count(*store_key) >= limit)
+                if incremental:
+                    params["startTime"] = candle_store.last_timestamp(*store_key) * 1000
+                    params["limit"] = min(1000, missing_bars + 2)
+                
+                # Wait for weight headroom (klines cost more the more candles are requested)
+                await weight_limiter.acquire(request_weight(endpoint, params))
+                base_url = BinanceProvider.get_base_url()
+                logger.info(f"Fetching {formatted_symbol} data from Binance using {base_url}. Weight used this minute: {weight_limiter.used}/{weight_limiter.limit}")
+                
                 # Get candlestick data
                 async with aiohttp.ClientSession() as session:
                     headers = {}
                     if BinanceProvider.API_KEY:
                         headers["X-MBX-APIKEY"] = BinanceProvider.API_KEY
                     
+                    started = time.perf_counter()
                     async with session.get(f"{base_url}{endpoint}", params=params, headers=headers) as response:
+                        BinanceProvider._observe(base_url, response, started)
                         if response.status != 200:
                             error_text = await response.text()
                             logger.error(f"Binance API error: {response.status}, Response: {error_text}")
@@ -149,48 +196,20 @@ class BinanceProvider:
                 # Convert klines to dataframe
                 df = BinanceProvider._klines_to_dataframe(klines)
                 
-                # Calculate technical indicators
-                df = BinanceProvider._calculate_indicators(df)
-                
-                # Get the latest data point
-                latest = df.iloc[-1]
-                
-                # Create analysis result object
-                MarketData = namedtuple('MarketData', ['instrument', 'indicators'])
+                # Merge into the candle store and read the requested window back
+                candle_store.write(*store_key, df, replace=not incremental)
+                chart_metrics.increment("candle_store.binance." + ("incremental" if incremental else "full"))
+                stored = candle_store.read(*store_key, limit=limit)
+                if stored is not None and not stored.empty:
+                    stored.columns = [col.lower() for col in stored.columns]
+                    stored.index = stored.index.tz_localize(None).rename("timestamp")
+                    df = stored
                 
-                # Extract indicators for return
-                indicators = {
-                    "close": float(latest["close"]),
-                    "open": float(latest["open"]),
-                    "high": float(latest["high"]),
-                    "low": float(latest["low"]),
-                    "volume": float(latest["volume"]),
-                    "EMA20": float(latest["EMA20"]),
-                    "EMA50": float(latest["EMA50"]),
-                    "EMA200": float(latest["EMA200"]),
-                    "RSI": float(latest["RSI"]),
-                    "MACD.macd": float(latest["MACD"]),
-                    "MACD.signal": float(latest["MACD_signal"]),
-                    "MACD.hist": float(latest["MACD_hist"]),
-                }
-                
-                # Add weekly high/low if available
-                if "weekly_high" in latest and "weekly_low" in latest:
-                    indicators["weekly_high"] = float(latest["weekly_high"])
-                    indicators["weekly_low"] = float(latest["weekly_low"])
-                else:
-                    # Calculate approximate weekly high/low from available data
-                    week_data = df.tail(168 if binance_interval == "1h" else 
-                                      42 if binance_interval == "4h" else 
-                                      7 if binance_interval == "1d" else df.shape[0])
-                    indicators["weekly_high"] = float(week_data["high"].max())
-                    indicators["weekly_low"] = float(week_data["low"].min())
-                    
-                result = MarketData(instrument=instrument, indicators=indicators)
-                return result
+                # Calculate technical indicators
+                return BinanceProvider._calculate_indicators(df, key=store_key)
                 
             except Exception as e:
-                logger.error(f"Error getting market data from Binance: {str(e)}")
+                logger.error(f"Error getting candles from Binance: {str(e)}")
                 logger.error(traceback.format_exc())
                 
                 # Try another endpoint if available
@@ -201,6 +220,67 @@ class BinanceProvider:
                 else:
                     return None
     
+    @staticmethod
+    async def get_market_data(instrument: str, timeframe: str = "1h") -> Optional[Dict[str, Any]]:
+        """
+        Get market data from Binance API for technical analysis.
+        
+        Args:
+            instrument: Trading instrument (e.g., BTCUSD, ETHUSDT)
+            timeframe: Timeframe for analysis (1h, 4h, 1d)
+            
+        Returns:
+            Optional[Dict]: Technical analysis data or None if failed
+        """
+        df = await BinanceProvider.get_candles(instrument, timeframe)
+        if df is None or df.empty:
+            return None
+        
+        try:
+            binance_interval = BinanceProvider._map_interval(timeframe)
+            
+            # Get the latest data point
+            latest = df.iloc[-1]
+            
+            # Create analysis result object
+            MarketData = namedtuple('MarketData', ['instrument', 'indicators'])
+            
+            # Extract indicators for return
+            indicators = {
+                "close": float(latest["close"]),
+                "open": float(latest["open"]),
+                "high": float(latest["high"]),
+                "low": float(latest["low"]),
+                "volume": float(latest["volume"]),
+                "EMA20": float(latest["EMA_20"]),
+                "EMA50": float(latest["EMA_50"]),
+                "EMA200": float(latest["EMA_200"]),
+                "RSI": float(latest["RSI_14"]),
+                "MACD.macd": float(latest["MACD_12_26_9"]),
+                "MACD.signal": float(latest["MACDs_12_26_9"]),
+                "MACD.hist": float(latest["MACDh_12_26_9"]),
+            }
+            
+            # Add weekly high/low if available
+            if "weekly_high" in latest and "weekly_low" in latest:
+                indicators["weekly_high"] = float(latest["weekly_high"])
+                indicators["weekly_low"] = float(latest["weekly_low"])
+            else:
+                # Calculate approximate weekly high/low from available data
+                week_data = df.tail(168 if binance_interval == "1h" else 
+                                  42 if binance_interval == "4h" else 
+                                  7 if binance_interval == "1d" else df.shape[0])
+                indicators["weekly_high"] = float(week_data["high"].max())
+                indicators["weekly_low"] = float(week_data["low"].min())
+                
+            result = MarketData(instrument=instrument, indicators=indicators)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error getting market data from Binance: {str(e)}")
+            logger.error(traceback.format_exc())
+            return None
+    
     @staticmethod
     async def get_ticker_price(symbol: str) -> Optional[float]:
         """Get current ticker price for a symbol"""
@@ -216,13 +296,16 @@ class BinanceProvider:
                 endpoint_url = BinanceProvider.DATA_API_ENDPOINT if retries == 0 else base_url
                 endpoint = "/api/v3/ticker/price"
                 params = {"symbol": formatted_symbol}
+                await weight_limiter.acquire(request_weight(endpoint, params))
                 
                 async with aiohttp.ClientSession() as session:
                     headers = {}
                     if BinanceProvider.API_KEY:
                         headers["X-MBX-APIKEY"] = BinanceProvider.API_KEY
                         
+                    started = time.perf_counter()
                     async with session.get(f"{endpoint_url}{endpoint}", params=params, headers=headers) as response:
+                        BinanceProvider._observe(endpoint_url, response, started)
                         if response.status != 200:
                             # Try another endpoint if data API fails
                             if retries < max_retries - 1:
@@ -253,6 +336,32 @@ class BinanceProvider:
                 else:
                     return None
     
+    @staticmethod
+    async def get_ticker_prices() -> Dict[str, float]:
+        """
+        Latest prices of all symbols with one request (/api/v3/ticker/price without a symbol).
+
+        Returns:
+            Dict Binance symbol (e.g. BTCUSDT) -> price; empty if the request failed
+        """
+        endpoint = "/api/v3/ticker/price"
+        # The data API first (market data only), then the best regular endpoint
+        for endpoint_url in (BinanceProvider.DATA_API_ENDPOINT, BinanceProvider.get_base_url()):
+            try:
+                await weight_limiter.acquire(request_weight(endpoint))
+                async with aiohttp.ClientSession() as session:
+                    started = time.perf_counter()
+                    async with session.get(f"{endpoint_url}{endpoint}", timeout=aiohttp.ClientTimeout(total=10)) as response:
+                        BinanceProvider._observe(endpoint_url, response, started)
+                        if response.status != 200:
+                            logger.error(f"Binance ticker prices error: {response.status}")
+                            continue
+                        data = await response.json()
+                        return {item["symbol"]: float(item["price"]) for item in data if "symbol" in item and "price" in item}
+            except Exception as e:
+                logger.error(f"Error getting ticker prices from Binance ({endpoint_url}): {str(e)}")
+        return {}
+    
     @staticmethod
     async def get_account_info() -> Optional[Dict]:
         """Get account information (requires API key and secret)"""
@@ -291,6 +400,7 @@ class BinanceProvider:
                 
                 # Log important details for debugging 
                 logger.info(f"Using base URL: {base_url}")
+                await weight_limiter.acquire(request_weight(endpoint))
                 
                 async with aiohttp.ClientSession() as session:
                     headers = {"X-MBX-APIKEY": api_key}
@@ -298,7 +408,9 @@ class BinanceProvider:
                     url = f"{base_url}{endpoint}?{query_string}&signature={signature}"
                     logger.info(f"Full URL (signature truncated): {url[:100]}...")
                     
+                    started = time.perf_counter()
                     async with session.get(url, headers=headers) as response:
+                        BinanceProvider._observe(base_url, response, started)
                         if response.status != 200:
                             error_text = await response.text()
                             logger.error(f"Binance API error: {response.status}, Response: {error_text}")
@@ -355,40 +467,17 @@ class BinanceProvider:
         return df
     
     @staticmethod
-    def _calculate_indicators(df: pd.DataFrame) -> pd.DataFrame:
-        """Calculate technical indicators"""
-        # Calculate EMAs
-        df['EMA20'] = df['close'].ewm(span=20, adjust=False).mean()  # Add EMA20
-        df['EMA50'] = df['close'].ewm(span=50, adjust=False).mean()
-        df['EMA200'] = df['close'].ewm(span=200, adjust=False).mean()
-        
-        # Calculate RSI
-        delta = df['close'].diff()
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        
-        avg_gain = gain.rolling(window=14).mean()
-        avg_loss = loss.rolling(window=14).mean()
-        
-        rs = avg_gain / avg_loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-        
-        # Calculate MACD
-        df['EMA12'] = df['close'].ewm(span=12, adjust=False).mean()
-        df['EMA26'] = df['close'].ewm(span=26, adjust=False).mean()
-        df['MACD'] = df['EMA12'] - df['EMA26']
-        df['MACD_signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-        df['MACD_hist'] = df['MACD'] - df['MACD_signal']
-        
-        # Clean NaN values
-        df.fillna(0, inplace=True)
-        
-        return df
+    def _calculate_indicators(df: pd.DataFrame, key=None) -> pd.DataFrame:
+        """Calculate technical indicators (canonical EMA_20/RSI_14/MACD_12_26_9 columns, NaN during warm-up)"""
+        return indicator_engine.compute(df, key=key)
     
     @staticmethod
     def _format_symbol(instrument: str) -> str:
         """Format instrument symbol for Binance API"""
         instrument = instrument.upper().replace("/", "")
+        entry = instrument_registry.get(instrument)
+        if entry is not None and entry.binance_symbol:
+            return entry.binance_symbol
         
         # Ensure proper format for Binance (BTCUSD -> BTCUSDT)
         if instrument.endswith("USD") and not instrument.endswith("USDT"):
@@ -457,6 +546,7 @@ class BinanceProvider:
                 base_url = BinanceProvider.get_base_url()
                 
                 logger.info(f"Creating {side.upper()} {order_type.upper()} order for {formatted_symbol}")
+                await weight_limiter.acquire(request_weight(endpoint))
                 
                 # Execute order
                 async with aiohttp.ClientSession() as session:
@@ -467,7 +557,9 @@ class BinanceProvider:
                     
                     logger.info(f"Sending order to {url} (params truncated): {full_params[:50]}...")
                     
+                    started = time.perf_counter()
                     async with session.post(url, data=full_params, headers=headers) as response:
+                        BinanceProvider._observe(base_url, response, started)
                         if response.status != 200:
                             error_text = await response.text()
                             logger.error(f"Binance API error: {response.status}, Response: {error_text}")
@@ -0,0 +1,210 @@
+import os
+import json
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple
+
+import aiohttp
+import pandas as pd
+
+from trading_bot.services.chart_service.binance_provider import BinanceProvider
+from trading_bot.services.chart_service.candle_store import candle_store
+from trading_bot.services.chart_service.indicators import indicator_engine
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Crypto instruments the bot serves (internal names; formatted to Binance symbols)
+DEFAULT_STREAM_SYMBOLS = "BTCUSD,ETHUSD,XRPUSD,SOLUSD,BNBUSD,ADAUSD,LTCUSD,DOGEUSD,DOTUSD,LINKUSD,XLMUSD,AVAXUSD"
+
+
+class BinanceKlineStream:
+    """
+    Live candles from one combined Binance kline WebSocket subscription.
+
+    Keeps a rolling candle buffer per (symbol, interval) in memory, backfilled over REST on every
+    (re)connect. BinanceProvider.get_candles reads from here while the stream is healthy, so TA
+    requests for streamed instruments need no network round trip. Closed candles are written to
+    the candle store and advance the shared indicator state.
+    """
+
+    def __init__(self, symbols: Optional[List[str]] = None, intervals: Optional[List[str]] = None):
+        """Load the stream configuration from the environment"""
+        self.base_url = os.getenv("BINANCE_STREAM_URL", "wss://stream.binance.com:9443")
+        symbols = symbols or [s for s in os.getenv("BINANCE_STREAM_SYMBOLS", DEFAULT_STREAM_SYMBOLS).split(",") if s.strip()]
+        intervals = intervals or [i for i in os.getenv("BINANCE_STREAM_INTERVALS", "1h").split(",") if i.strip()]
+        self.symbols = [BinanceProvider._format_symbol(s.strip()) for s in symbols]
+        self.intervals = [BinanceProvider._map_interval(i.strip()) for i in intervals]
+        self.buffer_size = int(os.getenv("BINANCE_STREAM_BUFFER", "500"))
+        # Without a message for this long the buffers are not trusted (REST is used instead)
+        self.max_staleness = float(os.getenv("BINANCE_STREAM_MAX_STALENESS", "90"))
+
+        # (symbol, interval) -> open time (s) -> [open, high, low, close, volume]
+        self._buffers: Dict[Tuple[str, str], "OrderedDict[int, List[float]]"] = {}
+        self._ready = set()
+        self._task = None
+        self._running = False
+        self.connected = False
+        self.last_message = 0.0
+
+    @property
+    def stream_url(self) -> str:
+        streams = "/".join(f"{symbol.lower()}@kline_{interval}" for symbol in self.symbols for interval in self.intervals)
+        return f"{self.base_url}/stream?streams={streams}"
+
+    def start(self) -> None:
+        """Start the subscription in the background (idempotent)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._running = True
+        self._task = asyncio.ensure_future(self._run())
+        BinanceProvider.attach_stream(self)
+        logger.info(f"Binance kline stream starting for {len(self.symbols)} symbols x {self.intervals}")
+
+    async def stop(self) -> None:
+        """Stop the subscription"""
+        self._running = False
+        BinanceProvider.attach_stream(None)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def is_healthy(self) -> bool:
+        return self.connected and time.time() - self.last_message < self.max_staleness
+
+    async def _run(self) -> None:
+        backoff = 1
+        while self._running:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.stream_url, heartbeat=60, max_msg_size=0) as ws:
+                        logger.info("Binance kline stream connected")
+                        self.connected = True
+                        self.last_message = time.time()
+                        chart_metrics.set_gauge("binance_stream.connected", True)
+                        backoff = 1
+                        # Candles missed while disconnected come from REST; stream updates queue up meanwhile
+                        await self._backfill()
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                self._handle(json.loads(msg.data))
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Binance kline stream error: {str(e)}")
+            finally:
+                self.connected = False
+                self._ready.clear()
+                chart_metrics.set_gauge("binance_stream.connected", False)
+
+            if self._running:
+                chart_metrics.increment("binance_stream.reconnects")
+                logger.warning(f"Binance kline stream disconnected, reconnecting in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    async def _backfill(self) -> None:
+        """Seed the buffers from REST (candle store + incremental klines)"""
+        for symbol in self.symbols:
+            for interval in self.intervals:
+                df = await BinanceProvider.get_candles(symbol, interval, limit=self.buffer_size, use_stream=False)
+                if df is None or df.empty:
+                    logger.warning(f"Binance stream backfill for {symbol} {interval} returned no data")
+                    continue
+                buffer = self._buffers.setdefault((symbol, interval), OrderedDict())
+                index = pd.DatetimeIndex(df.index)
+                for ts, row in zip(index.asi8 // 10**9, df[["open", "high", "low", "close", "volume"]].to_numpy(dtype=float)):
+                    buffer[int(ts)] = row.tolist()
+                self._trim(buffer)
+                self._ready.add((symbol, interval))
+        chart_metrics.increment("binance_stream.backfills")
+
+    def _trim(self, buffer: "OrderedDict[int, List[float]]") -> None:
+        # Keys arrive in time order except during backfill; keep them sorted and bounded
+        if len(buffer) > 1 and next(reversed(buffer)) < max(buffer):
+            items = sorted(buffer.items())
+            buffer.clear()
+            buffer.update(items)
+        while len(buffer) > self.buffer_size:
+            buffer.popitem(last=False)
+
+    def _handle(self, message: Dict) -> None:
+        data = message.get("data") or {}
+        kline = data.get("k")
+        if not kline:
+            return
+        self.last_message = time.time()
+        key = (kline["s"], kline["i"])
+        buffer = self._buffers.setdefault(key, OrderedDict())
+        ts = int(kline["t"]) // 1000
+        buffer[ts] = [float(kline["o"]), float(kline["h"]), float(kline["l"]), float(kline["c"]), float(kline["v"])]
+        self._trim(buffer)
+        chart_metrics.increment("binance_stream.messages")
+
+        if kline.get("x"):
+            self._on_candle_closed(key, ts)
+
+    def _frame(self, key: Tuple[str, str]) -> Optional[pd.DataFrame]:
+        buffer = self._buffers.get(key)
+        if not buffer:
+            return None
+        index = pd.to_datetime(list(buffer.keys()), unit="s").rename("timestamp")
+        return pd.DataFrame(list(buffer.values()), index=index, columns=["open", "high", "low", "close", "volume"])
+
+    def _on_candle_closed(self, key: Tuple[str, str], ts: int) -> None:
+        """Persist the closed candle and advance the indicators"""
+        symbol, interval = key
+        df = self._frame(key)
+        if df is None:
+            return
+        try:
+            candle_store.write("binance", symbol, interval, df.loc[[pd.Timestamp(ts, unit="s")]])
+            indicator_engine.compute(df, key=("binance", symbol, interval))
+            chart_metrics.increment("binance_stream.closed_candles")
+        except Exception as e:
+            logger.error(f"Error processing closed {symbol} {interval} candle: {str(e)}")
+
+    def get_candles(self, instrument: str, timeframe: str = "1h", limit: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """
+        Candles with indicators from the live buffer, or None when the instrument is not streamed
+        or the stream is not healthy.
+        """
+        key = (BinanceProvider._format_symbol(instrument), BinanceProvider._map_interval(timeframe))
+        if key not in self._ready or not self.is_healthy():
+            return None
+        df = self._frame(key)
+        if df is None or df.empty:
+            return None
+        # Indicators over the whole buffer (incremental per series), then the requested window
+        df = indicator_engine.compute(df, key=("binance",) + key)
+        return df.tail(limit) if limit else df
+
+    def get_price(self, instrument: str) -> Optional[float]:
+        """Close of the forming 1h candle (the last traded price) while the stream is healthy"""
+        key = (BinanceProvider._format_symbol(instrument), "1h")
+        buffer = self._buffers.get(key)
+        if key not in self._ready or not buffer or not self.is_healthy():
+            return None
+        return buffer[next(reversed(buffer))][3]
+
+    def get_health(self) -> Dict:
+        """Stream state for monitoring"""
+        return {
+            "connected": self.connected,
+            "healthy": self.is_healthy(),
+            "seconds_since_message": time.time() - self.last_message if self.last_message else None,
+            "series_ready": len(self._ready),
+            "series_total": len(self.symbols) * len(self.intervals),
+        }
+
+
+# Shared stream; started by ChartService.initialize
+kline_stream = BinanceKlineStream()
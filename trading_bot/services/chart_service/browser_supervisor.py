@@ -0,0 +1,236 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Health states exported as the 'browser.health' gauge
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+RECYCLING = "recycling"
+DOWN = "down"
+
+# Process names of the Playwright Chromium build (full browser and headless shell)
+CHROMIUM_PROCESS_NAMES = ("chrome", "chromium", "headless_shell")
+
+
+def _process_table() -> Dict[int, Dict[str, Any]]:
+    """Read pid -> {ppid, name, rss} for all processes from /proc (Linux only)"""
+    table = {}
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                stat = f.read()
+            with open(f"/proc/{pid}/statm", "r") as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            # Process exited while scanning
+            continue
+        # The name is between the first '(' and the last ')' and may contain spaces
+        name = stat[stat.find("(") + 1:stat.rfind(")")]
+        fields = stat[stat.rfind(")") + 2:].split()
+        table[pid] = {"ppid": int(fields[1]), "name": name, "rss": resident_pages * page_size}
+    return table
+
+
+def playwright_driver_pid(playwright) -> Optional[int]:
+    """
+    PID of the driver process of a Playwright instance. The browsers it launches run below it,
+    apart from the Chromiums of the Node screenshot workers and the capture farm. Playwright
+    does not expose it publicly; None when its internals differ.
+    """
+    try:
+        return int(playwright._impl_obj._connection._transport._proc.pid)
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def browser_rss_bytes(root_pid: Optional[int] = None) -> Optional[int]:
+    """
+    Sum the resident memory of all Chromium processes below `root_pid` (default: this process).
+
+    Playwright runs Chromium as a grandchild (python -> driver -> chromium), so the whole
+    descendant tree is walked. Returns None where /proc is not available.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    root_pid = root_pid or os.getpid()
+    try:
+        table = _process_table()
+    except OSError:
+        return None
+
+    children: Dict[int, List[int]] = {}
+    for pid, info in table.items():
+        children.setdefault(info["ppid"], []).append(pid)
+
+    total = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        info = table.get(pid)
+        if info is None:
+            continue
+        if any(name in info["name"].lower() for name in CHROMIUM_PROCESS_NAMES):
+            total += info["rss"]
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class BrowserSupervisor:
+    """Tracks browser memory and capture counts and decides when to recycle or restart the browser"""
+
+    def __init__(self, name: str = "tradingview"):
+        """Load the recycling thresholds from the environment (0 disables a threshold)"""
+        self.name = name
+        self.max_captures_per_context = int(os.getenv("BROWSER_MAX_CAPTURES_PER_CONTEXT", "50"))
+        self.max_captures_per_browser = int(os.getenv("BROWSER_MAX_CAPTURES_PER_BROWSER", "500"))
+        self.max_rss_mb = float(os.getenv("BROWSER_MAX_RSS_MB", "1024"))
+        self.degraded_after_failures = int(os.getenv("BROWSER_DEGRADED_AFTER_FAILURES", "3"))
+        # Scanning /proc takes a while on a busy host: at most once per interval, off the event loop
+        self.memory_interval = float(os.getenv("BROWSER_RSS_SAMPLE_SECONDS", "30"))
+        # Playwright driver of the supervised browser (see attach)
+        self.root_pid: Optional[int] = None
+        self._sampled_at = 0.0
+
+        self.captures_in_context = 0
+        self.captures_in_browser = 0
+        self.consecutive_failures = 0
+        self.rss_mb: Optional[float] = None
+        self.browser_started_at: Optional[float] = None
+        self.last_recycle: Optional[Dict[str, Any]] = None
+        self.state = DOWN
+        self.lock = threading.Lock()
+        self._publish()
+
+    def _publish(self) -> None:
+        chart_metrics.set_gauge(f"browser.{self.name}.health", self.state)
+        chart_metrics.set_gauge(f"browser.{self.name}.rss_mb", self.rss_mb)
+        chart_metrics.set_gauge(f"browser.{self.name}.captures_in_context", self.captures_in_context)
+        chart_metrics.set_gauge(f"browser.{self.name}.captures_in_browser", self.captures_in_browser)
+
+    def set_state(self, state: str, reason: str = "") -> None:
+        """Change the health state and export it"""
+        with self.lock:
+            previous, self.state = self.state, state
+        if previous != state:
+            logger.info(f"Browser '{self.name}' health: {previous} -> {state}" + (f" ({reason})" if reason else ""))
+        self._publish()
+
+    def browser_started(self) -> None:
+        """A new browser (with a fresh context) is live"""
+        with self.lock:
+            self.captures_in_browser = 0
+            self.captures_in_context = 0
+            self.consecutive_failures = 0
+            self.browser_started_at = time.time()
+        self.set_state(HEALTHY)
+
+    def context_started(self) -> None:
+        """A fresh context replaced the previous one on the same browser"""
+        with self.lock:
+            self.captures_in_context = 0
+        self.set_state(HEALTHY)
+
+    def browser_lost(self, reason: str) -> None:
+        """The browser crashed, disconnected or could not be launched"""
+        chart_metrics.increment(f"browser.{self.name}.crashes")
+        self.set_state(DOWN, reason)
+
+    def attach(self, root_pid: Optional[int]) -> None:
+        """
+        Measure the Chromium processes below `root_pid` only (the Playwright driver, see
+        playwright_driver_pid). Without it no memory is measured: the other Chromiums below this
+        process (Node workers, capture farm) must not trigger a recycle of this browser.
+        """
+        with self.lock:
+            self.root_pid = root_pid
+            self.rss_mb = None
+            self._sampled_at = 0.0
+        if root_pid is None:
+            logger.warning(f"Browser '{self.name}': Playwright driver pid unknown, memory threshold disabled")
+
+    def sample_memory(self) -> Optional[float]:
+        """Measure the Chromium RSS in MB (blocking; see refresh_memory)"""
+        rss = browser_rss_bytes(self.root_pid) if self.root_pid else None
+        with self.lock:
+            self.rss_mb = rss / (1024 * 1024) if rss is not None else None
+            self._sampled_at = time.time()
+        return self.rss_mb
+
+    async def refresh_memory(self) -> Optional[float]:
+        """sample_memory in a thread, at most once per BROWSER_RSS_SAMPLE_SECONDS"""
+        if self.root_pid and time.time() - self._sampled_at >= self.memory_interval:
+            await asyncio.get_running_loop().run_in_executor(None, self.sample_memory)
+            self._update_health()
+        return self.rss_mb
+
+    def record_capture(self, success: bool) -> None:
+        """Count a capture and refresh the health"""
+        with self.lock:
+            self.captures_in_context += 1
+            self.captures_in_browser += 1
+            self.consecutive_failures = 0 if success else self.consecutive_failures + 1
+        self._update_health()
+
+    def _update_health(self) -> None:
+        """Healthy or degraded from the failure count and the last memory sample"""
+        failures = self.consecutive_failures
+        if self.state in (HEALTHY, DEGRADED):
+            near_memory_limit = self.max_rss_mb and self.rss_mb is not None and self.rss_mb > self.max_rss_mb * 0.8
+            if failures >= self.degraded_after_failures or near_memory_limit:
+                self.set_state(DEGRADED, f"{failures} consecutive failures, rss={self.rss_mb}")
+            else:
+                self.set_state(HEALTHY)
+        else:
+            self._publish()
+
+    def recycle_reason(self) -> Optional[str]:
+        """
+        Decide whether the browser or only the context should be replaced.
+
+        Returns:
+            'browser', 'context' or None
+        """
+        if self.max_rss_mb and self.rss_mb is not None and self.rss_mb > self.max_rss_mb:
+            return "browser"
+        if self.max_captures_per_browser and self.captures_in_browser >= self.max_captures_per_browser:
+            return "browser"
+        if self.consecutive_failures >= self.degraded_after_failures:
+            # Repeated failures on a live browser: start over with a clean process
+            return "browser"
+        if self.max_captures_per_context and self.captures_in_context >= self.max_captures_per_context:
+            return "context"
+        return None
+
+    def recycled(self, kind: str, duration: float) -> None:
+        """Record a finished recycle"""
+        chart_metrics.increment(f"browser.{self.name}.recycles.{kind}")
+        chart_metrics.record(f"browser.{self.name}.recycle_time", duration)
+        self.last_recycle = {"kind": kind, "at": time.time(), "duration": duration}
+        if kind == "browser":
+            self.browser_started()
+        else:
+            self.context_started()
+
+    def get_health(self) -> Dict[str, Any]:
+        """Current health snapshot"""
+        with self.lock:
+            return {
+                "state": self.state,
+                "rss_mb": self.rss_mb,
+                "captures_in_context": self.captures_in_context,
+                "captures_in_browser": self.captures_in_browser,
+                "consecutive_failures": self.consecutive_failures,
+                "browser_uptime": time.time() - self.browser_started_at if self.browser_started_at else None,
+                "last_recycle": self.last_recycle,
+            }
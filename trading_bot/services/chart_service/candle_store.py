@@ -0,0 +1,168 @@
+import os
+import re
+import logging
+import threading
+import time
+from typing import Optional, Dict
+
+import numpy as np
+import pandas as pd
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# One record per bar; timestamps are bar open times in seconds since the epoch (UTC)
+CANDLE_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+PRICE_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def interval_seconds(interval: str) -> int:
+    """Length of a Yahoo/Binance interval string ('15m', '1h', '1d', '1wk', '1mo', '1M') in seconds"""
+    match = re.fullmatch(r"(\d+)(mo|wk|m|h|d|w|M)", interval.strip())
+    if not match:
+        raise ValueError(f"Unknown interval '{interval}'")
+    count, unit = int(match.group(1)), match.group(2)
+    # Binance uses '1M' for a month and '1m' for a minute
+    unit_seconds = {"m": 60, "h": 3600, "d": 86400, "w": 604800, "wk": 604800, "M": 2592000, "mo": 2592000}[unit]
+    return count * unit_seconds
+
+
+class CandleStore:
+    """
+    Persistent OHLCV history per (source, symbol, interval).
+
+    Every series is a NumPy structured array saved as a .npy file and read back memory-mapped,
+    so a refresh only has to download the bars after the last stored timestamp.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_rows: Optional[int] = None):
+        """Load the store location and size limit from the environment"""
+        self.root = root or os.getenv("CANDLE_STORE_DIR", os.path.join("data", "candles"))
+        self.max_rows = max_rows or int(os.getenv("CANDLE_STORE_MAX_ROWS", "5000"))
+        self.enabled = os.getenv("CANDLE_STORE_ENABLED", "true").lower() == "true"
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+        if self.enabled:
+            try:
+                os.makedirs(self.root, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Candle store directory {self.root} not available, store disabled: {e}")
+                self.enabled = False
+
+    def _path(self, source: str, symbol: str, interval: str) -> str:
+        safe_symbol = re.sub(r"[^A-Za-z0-9_.-]", "_", symbol)
+        return os.path.join(self.root, source, f"{safe_symbol}_{interval}.npy")
+
+    def _lock(self, path: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def _load(self, path: str) -> Optional[np.ndarray]:
+        """Memory-map a stored series (read-only)"""
+        if not self.enabled or not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            logger.error(f"Corrupt candle file {path}, ignoring it: {e}")
+            return None
+
+    def last_timestamp(self, source: str, symbol: str, interval: str) -> Optional[int]:
+        """Open time (epoch seconds) of the newest stored bar"""
+        data = self._load(self._path(source, symbol, interval))
+        if data is None or len(data) == 0:
+            return None
+        return int(data["ts"][-1])
+
+    def row_count(self, source: str, symbol: str, interval: str) -> int:
+        """Number of stored bars"""
+        data = self._load(self._path(source, symbol, interval))
+        return 0 if data is None else len(data)
+
+    def missing_bars(self, source: str, symbol: str, interval: str) -> Optional[int]:
+        """Approximate number of bars between the newest stored bar and now (None when nothing is stored)"""
+        last = self.last_timestamp(source, symbol, interval)
+        if last is None:
+            return None
+        return max(0, int((time.time() - last) // interval_seconds(interval)))
+
+    @staticmethod
+    def _to_records(df: pd.DataFrame) -> np.ndarray:
+        """Convert an OHLCV DataFrame (any column case, DatetimeIndex) to candle records"""
+        columns = {str(col).lower(): col for col in df.columns}
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+
+        records = np.empty(len(df), dtype=CANDLE_DTYPE)
+        records["ts"] = index.values.astype("datetime64[s]").astype("<i8")
+        for field in PRICE_FIELDS:
+            if field in columns:
+                records[field] = pd.to_numeric(df[columns[field]], errors="coerce").to_numpy(dtype=float)
+            else:
+                records[field] = 0.0 if field == "volume" else np.nan
+        # Bars without a price are not worth storing
+        return records[~np.isnan(records["close"])]
+
+    def write(self, source: str, symbol: str, interval: str, df: pd.DataFrame, replace: bool = False) -> int:
+        """
+        Merge new bars into a stored series.
+
+        Bars with a timestamp that is already stored overwrite it (the last bar of a previous
+        fetch is usually still forming). With replace=True the stored series is discarded first,
+        e.g. after a gap that the incremental fetch could not cover.
+
+        Returns:
+            Number of stored bars after the write
+        """
+        if not self.enabled or df is None or df.empty:
+            return 0
+
+        path = self._path(source, symbol, interval)
+        new = self._to_records(df)
+        with self._lock(path):
+            existing = None if replace else self._load(path)
+            if existing is not None and len(existing):
+                # Keep only stored bars that the new batch does not cover
+                keep = ~np.isin(existing["ts"], new["ts"])
+                merged = np.concatenate([existing[keep], new])
+            else:
+                merged = new
+            merged = merged[np.argsort(merged["ts"], kind="stable")]
+            if len(merged) > self.max_rows:
+                merged = merged[-self.max_rows:]
+
+            # Write next to the target and swap, so memory-mapped readers never see half a file
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(merged))
+            os.replace(tmp_path, path)
+
+        chart_metrics.increment(f"candle_store.{source}.bars_written", len(new))
+        return len(merged)
+
+    def read(self, source: str, symbol: str, interval: str, limit: Optional[int] = None) -> Optional[pd.DataFrame]:
+        """
+        Read the newest `limit` bars as a DataFrame with Open/High/Low/Close/Volume columns
+        and a UTC DatetimeIndex.
+        """
+        data = self._load(self._path(source, symbol, interval))
+        if data is None or len(data) == 0:
+            return None
+        tail = data[-limit:] if limit else data
+        index = pd.to_datetime(np.asarray(tail["ts"]), unit="s", utc=True)
+        return pd.DataFrame({field.capitalize(): np.array(tail[field]) for field in PRICE_FIELDS}, index=index)
+
+
+# Shared store used by the market data providers
+candle_store = CandleStore()
@@ -0,0 +1,286 @@
+import os
+import logging
+import asyncio
+import itertools
+import multiprocessing
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any, Tuple, List
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service.node_worker_pool import screenshot_dir
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_main(index: int, jobs, results) -> None:
+    """Entry point of a capture worker process: one browser, one event loop, jobs from its own queue"""
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"),
+                        format=f"%(asctime)s - capture-worker-{index} - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(_worker_loop(index, jobs, results))
+
+
+async def _worker_loop(index: int, jobs, results) -> None:
+    # Imported here so the bot process does not need Playwright loaded for the farm itself
+    from trading_bot.services.chart_service.tradingview_node import TradingViewNodeService
+
+    service = TradingViewNodeService()
+    ready = await service.initialize()
+    results.put(("ready", index, bool(ready)))
+
+    loop = asyncio.get_event_loop()
+    while True:
+        job = await loop.run_in_executor(None, jobs.get)
+        if job is None:
+            break
+        job_id, kind, params = job
+
+        start = time.perf_counter()
+        try:
+            if kind == "session":
+                # New session cookie, pushed into the live context of this worker's browser
+                await service.update_session(params["session_id"])
+                results.put(("done", job_id, {"ok": True, "health": service.get_health()}))
+                continue
+
+            boxes = None
+            if kind == "canonical":
+                captured = await service.capture_canonical(params["symbol"], params.get("timeframe"))
+                data, boxes = captured if captured else (None, None)
+            else:
+                data = await service.take_screenshot(params["symbol"], params.get("timeframe"), params.get("fullscreen", False))
+
+            if not data:
+                results.put(("done", job_id, {"ok": False, "error": "no screenshot"}))
+                continue
+
+            # Image bytes travel through a (tmpfs) file; only the path goes through the queue
+            path = os.path.join(screenshot_dir(), f"capture_{index}_{uuid.uuid4().hex}.png")
+            with open(path, "wb") as f:
+                f.write(data)
+            results.put(("done", job_id, {
+                "ok": True,
+                "path": path,
+                "boxes": boxes,
+                "timings": dict(service.last_capture_timings),
+                "health": service.get_health(),
+                "duration": time.perf_counter() - start,
+            }))
+        except Exception as e:
+            results.put(("done", job_id, {"ok": False, "error": str(e)}))
+
+    await service.cleanup()
+
+
+class _FarmWorker:
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.jobs = None
+        self.outstanding = set()
+        self.ready = False
+        self.health: Dict[str, Any] = {}
+
+
+class CaptureFarm:
+    """
+    Runs chart captures in separate worker processes, each owning its own browser.
+
+    Offers the same capture API as TradingViewNodeService (initialize, take_screenshot,
+    capture_canonical, cleanup) so ChartService can use either.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        """Load the farm configuration from the environment"""
+        self.size = workers or max(1, int(os.getenv("CHART_CAPTURE_WORKERS", "2")))
+        self.job_timeout = float(os.getenv("CHART_CAPTURE_TIMEOUT", "90"))
+        self.is_initialized = False
+        self._ctx = multiprocessing.get_context("spawn")
+        self._results = None
+        self._workers: List[_FarmWorker] = []
+        self._futures: Dict[int, asyncio.Future] = {}
+        self._job_workers: Dict[int, _FarmWorker] = {}
+        self._ids = itertools.count(1)
+        self._loop = None
+        self._dispatcher = None
+        self._monitor_task = None
+
+    def _start_worker(self, worker: _FarmWorker) -> None:
+        worker.jobs = self._ctx.Queue()
+        worker.ready = False
+        worker.process = self._ctx.Process(target=_worker_main, args=(worker.index, worker.jobs, self._results),
+                                           name=f"capture-worker-{worker.index}", daemon=True)
+        worker.process.start()
+        logger.info(f"Capture worker {worker.index} started (pid {worker.process.pid})")
+
+    async def initialize(self) -> bool:
+        """Start the worker processes and the result dispatcher"""
+        if self.is_initialized:
+            return True
+        self._loop = asyncio.get_event_loop()
+        self._results = self._ctx.Queue()
+        self._workers = [_FarmWorker(i) for i in range(self.size)]
+        for worker in self._workers:
+            self._start_worker(worker)
+
+        self._dispatcher = threading.Thread(target=self._dispatch_results, name="capture-farm-dispatcher", daemon=True)
+        self._dispatcher.start()
+        self._monitor_task = asyncio.ensure_future(self._monitor())
+        self.is_initialized = True
+        chart_metrics.set_gauge("capture_farm.workers", self.size)
+        return True
+
+    def _dispatch_results(self) -> None:
+        """Dispatcher thread: hand worker results to the event loop"""
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            self._loop.call_soon_threadsafe(self._handle_result, message)
+
+    def _handle_result(self, message: Tuple) -> None:
+        kind, key, payload = message
+        if kind == "ready":
+            worker = self._workers[key]
+            worker.ready = payload
+            logger.info(f"Capture worker {key} ready (browser: {payload})")
+            return
+
+        future = self._futures.pop(key, None)
+        worker = self._job_workers.pop(key, None)
+        if worker is not None:
+            worker.outstanding.discard(key)
+            if payload.get("health"):
+                worker.health = payload["health"]
+                # Worker metrics live in the worker process; export the browser state here
+                chart_metrics.set_gauge(f"browser.capture_worker_{worker.index}.health", worker.health.get("state"))
+                chart_metrics.set_gauge(f"browser.capture_worker_{worker.index}.rss_mb", worker.health.get("rss_mb"))
+        if future is None or future.done():
+            # Timed out already; do not leak the image file
+            if payload.get("path"):
+                try:
+                    os.unlink(payload["path"])
+                except OSError:
+                    pass
+            return
+        future.set_result(payload)
+
+    async def _monitor(self) -> None:
+        """Restart crashed workers and fail the jobs they were holding"""
+        while True:
+            await asyncio.sleep(5)
+            for worker in self._workers:
+                if worker.process is not None and not worker.process.is_alive():
+                    logger.error(f"Capture worker {worker.index} died (exit code {worker.process.exitcode}), restarting")
+                    chart_metrics.increment("capture_farm.restarts")
+                    for job_id in list(worker.outstanding):
+                        future = self._futures.pop(job_id, None)
+                        self._job_workers.pop(job_id, None)
+                        if future and not future.done():
+                            future.set_result({"ok": False, "error": "worker died"})
+                    worker.outstanding.clear()
+                    self._start_worker(worker)
+            chart_metrics.set_gauge("capture_farm.queue_depth", sum(len(w.outstanding) for w in self._workers))
+
+    def _pick_worker(self) -> _FarmWorker:
+        # Least outstanding jobs; workers whose browser is up first
+        return min(self._workers, key=lambda w: (not w.ready, len(w.outstanding)))
+
+    async def _submit(self, kind: str, params: Dict[str, Any],
+                      worker: Optional[_FarmWorker] = None) -> Optional[Dict[str, Any]]:
+        if not self.is_initialized:
+            await self.initialize()
+
+        job_id = next(self._ids)
+        worker = worker or self._pick_worker()
+        future = self._loop.create_future()
+        self._futures[job_id] = future
+        self._job_workers[job_id] = worker
+        worker.outstanding.add(job_id)
+        chart_metrics.set_gauge("capture_farm.queue_depth", sum(len(w.outstanding) for w in self._workers))
+
+        start = time.perf_counter()
+        worker.jobs.put((job_id, kind, params))
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=self.job_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Capture job {job_id} on worker {worker.index} timed out after {self.job_timeout}s")
+            chart_metrics.increment("capture_farm.timeouts")
+            return None
+        finally:
+            self._futures.pop(job_id, None)
+            self._job_workers.pop(job_id, None)
+            worker.outstanding.discard(job_id)
+
+        chart_metrics.record("capture_farm.job_time", time.perf_counter() - start)
+        if not result.get("ok"):
+            logger.error(f"Capture job {job_id} failed on worker {worker.index}: {result.get('error')}")
+            chart_metrics.increment("capture.errors")
+            return None
+        for stage, duration in result.get("timings", {}).items():
+            chart_metrics.record(f"capture.{stage}", duration)
+        return result
+
+    @staticmethod
+    def _read_image(path: str) -> bytes:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    async def take_screenshot(self, symbol, timeframe=None, fullscreen=False) -> Optional[bytes]:
+        """Take a screenshot of a chart in a worker process"""
+        result = await self._submit("screenshot", {"symbol": symbol, "timeframe": timeframe, "fullscreen": fullscreen})
+        return self._read_image(result["path"]) if result else None
+
+    async def capture_canonical(self, symbol, timeframe=None):
+        """Capture the canonical image (and crop boxes) in a worker process"""
+        result = await self._submit("canonical", {"symbol": symbol, "timeframe": timeframe})
+        if not result:
+            return None
+        return self._read_image(result["path"]), result.get("boxes")
+
+    async def update_session(self, session_id: str) -> None:
+        """Push a new session cookie to every worker browser (restarted workers read it from the environment)"""
+        if not self.is_initialized:
+            return
+        await asyncio.gather(*(self._submit("session", {"session_id": session_id}, worker)
+                               for worker in self._workers))
+
+    def get_health(self) -> Dict[str, Any]:
+        """Health of all worker browsers"""
+        return {
+            worker.index: {
+                "alive": bool(worker.process and worker.process.is_alive()),
+                "ready": worker.ready,
+                "outstanding": len(worker.outstanding),
+                "browser": worker.health,
+            }
+            for worker in self._workers
+        }
+
+    async def cleanup(self) -> None:
+        """Stop all worker processes"""
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        for worker in self._workers:
+            if worker.jobs is not None:
+                worker.jobs.put(None)
+        for worker in self._workers:
+            if worker.process is not None:
+                await self._loop.run_in_executor(None, worker.process.join, 10)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+        if self._results is not None:
+            self._results.put(None)
+        for future in self._futures.values():
+            if not future.done():
+                future.set_result({"ok": False, "error": "capture farm stopped"})
+        self._futures.clear()
+        self.is_initialized = False
+        logger.info("Capture farm stopped")
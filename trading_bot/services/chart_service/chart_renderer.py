@@ -0,0 +1,413 @@
+import os
+import logging
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from typing import Optional, Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Kleuren in dezelfde donkere stijl als de TradingView charts
+BACKGROUND_COLOR = "#131722"
+GRID_COLOR = "#2a2e39"
+TEXT_COLOR = "#d1d4dc"
+UP_COLOR = "#26a69a"
+DOWN_COLOR = "#ef5350"
+OVERLAY_COLORS = ("#2962ff", "#ff9800", "#e040fb")
+RSI_COLOR = "#7e57c2"
+
+# Candidate column names per field: Yahoo uses capitalised names, Binance lower-case names.
+# Indicators use the canonical IndicatorEngine names for both.
+OHLC_COLUMNS = {
+    "open": ("Open", "open"),
+    "high": ("High", "high"),
+    "low": ("Low", "low"),
+    "close": ("Close", "close"),
+}
+OVERLAY_COLUMNS = (
+    ("EMA 20", ("EMA_20",)),
+    ("EMA 50", ("EMA_50",)),
+    ("EMA 200", ("EMA_200",)),
+)
+RSI_COLUMNS = ("RSI_14",)
+
+# Per-process state of a render worker: reused figures keyed by (width, height, dpi)
+_worker_figures: Dict[Tuple[int, int, int], Any] = {}
+
+
+def _init_worker():
+    """Process pool initializer: select Agg and pay the import and first-draw cost up front"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    import mplfinance  # noqa: F401
+
+    try:
+        render_candles(_warmup_payload())
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Chart renderer warm-up failed: {e}")
+
+
+def _ping() -> bool:
+    return True
+
+
+def _warmup_payload() -> Dict[str, Any]:
+    periods = 60
+    close = 100 + np.cumsum(np.random.normal(0, 1, periods))
+    return {
+        "title": "warmup",
+        "index": pd.date_range(end=pd.Timestamp("2024-01-01"), periods=periods, freq=pd.Timedelta(hours=1)).asi8,
+        "open": close - 0.5,
+        "high": close + 1.0,
+        "low": close - 1.0,
+        "close": close,
+        "overlays": {"EMA 20": close},
+        "rsi": np.full(periods, 50.0),
+        "width": 1280,
+        "height": 720,
+        "dpi": 100,
+    }
+
+
+def _style_axes(ax):
+    """Re-apply the dark style after an axes has been cleared"""
+    ax.set_facecolor(BACKGROUND_COLOR)
+    ax.grid(True, color=GRID_COLOR, linewidth=0.6)
+    ax.tick_params(colors=TEXT_COLOR, labelsize=8)
+    for spine in ax.spines.values():
+        spine.set_color(GRID_COLOR)
+    ax.yaxis.tick_right()
+
+
+def _get_figure(width: int, height: int, dpi: int):
+    """Return the reusable (figure, price axes, rsi axes) for this size, created once per worker"""
+    key = (width, height, dpi)
+    cached = _worker_figures.get(key)
+    if cached is not None:
+        return cached
+
+    import mplfinance as mpf
+
+    market_colors = mpf.make_marketcolors(up=UP_COLOR, down=DOWN_COLOR, edge="inherit", wick="inherit")
+    style = mpf.make_mpf_style(base_mpf_style="nightclouds", marketcolors=market_colors,
+                               facecolor=BACKGROUND_COLOR, figcolor=BACKGROUND_COLOR,
+                               gridcolor=GRID_COLOR)
+    fig = mpf.figure(style=style, figsize=(width / dpi, height / dpi), dpi=dpi)
+    grid = fig.add_gridspec(2, 1, height_ratios=(3, 1), hspace=0.04,
+                            left=0.02, right=0.93, top=0.94, bottom=0.07)
+    ax_price = fig.add_subplot(grid[0])
+    ax_rsi = fig.add_subplot(grid[1], sharex=ax_price)
+    cached = (fig, ax_price, ax_rsi)
+    _worker_figures[key] = cached
+    return cached
+
+
+def render_candles(payload: Dict[str, Any]) -> bytes:
+    """
+    Draw candlesticks, EMA overlays and an RSI panel. Runs inside a worker process.
+
+    Args:
+        payload: Plain arrays produced by ChartRenderer.build_payload
+
+    Returns:
+        PNG bytes
+    """
+    import mplfinance as mpf
+    from matplotlib.lines import Line2D
+
+    index = pd.DatetimeIndex(np.asarray(payload["index"], dtype="datetime64[ns]"))
+    df = pd.DataFrame({
+        "Open": payload["open"],
+        "High": payload["high"],
+        "Low": payload["low"],
+        "Close": payload["close"],
+    }, index=index)
+
+    dpi = int(payload.get("dpi", 100))
+    fig, ax_price, ax_rsi = _get_figure(int(payload.get("width", 1280)), int(payload.get("height", 720)), dpi)
+    ax_price.clear()
+    ax_rsi.clear()
+
+    addplots = []
+    legend_handles = []
+    for color, (label, values) in zip(OVERLAY_COLORS, payload.get("overlays", {}).items()):
+        values = np.asarray(values, dtype=float)
+        if np.isfinite(values).any():
+            addplots.append(mpf.make_addplot(values, ax=ax_price, color=color, width=1.0))
+            legend_handles.append(Line2D([], [], color=color, linewidth=1.0, label=label))
+
+    rsi = payload.get("rsi")
+    has_rsi = rsi is not None and np.isfinite(np.asarray(rsi, dtype=float)).any()
+    if has_rsi:
+        addplots.append(mpf.make_addplot(np.asarray(rsi, dtype=float), ax=ax_rsi, color=RSI_COLOR, width=1.0, ylim=(0, 100)))
+
+    plot_kwargs = {"type": "candle", "ax": ax_price, "datetime_format": "%d %b %H:%M", "xrotation": 0}
+    if addplots:
+        plot_kwargs["addplot"] = addplots
+    mpf.plot(df, **plot_kwargs)
+
+    _style_axes(ax_price)
+    _style_axes(ax_rsi)
+    ax_price.tick_params(labelbottom=False)
+    ax_price.set_title(payload.get("title", ""), color=TEXT_COLOR, fontsize=12, loc="left")
+    if legend_handles:
+        legend = ax_price.legend(handles=legend_handles, loc="upper left", fontsize=8, frameon=False)
+        for text in legend.get_texts():
+            text.set_color(TEXT_COLOR)
+
+    if has_rsi:
+        ax_rsi.axhline(70, color=DOWN_COLOR, linewidth=0.6, linestyle="--")
+        ax_rsi.axhline(30, color=UP_COLOR, linewidth=0.6, linestyle="--")
+        ax_rsi.set_ylim(0, 100)
+        ax_rsi.set_ylabel("RSI 14", color=TEXT_COLOR, fontsize=8)
+    else:
+        ax_rsi.set_visible(False)
+
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, facecolor=BACKGROUND_COLOR)
+    ax_rsi.set_visible(True)
+    return buf.getvalue()
+
+
+def render_emergency(instrument: str, timeframe: str, generated_at: str) -> bytes:
+    """Draw the last-resort placeholder chart. Runs inside a worker process."""
+    from matplotlib.figure import Figure
+
+    # Figure instead of pyplot: no global figure state in the worker
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot(111)
+    ax.plot(np.random.randn(100).cumsum())
+    ax.set_title(f"{instrument} - {timeframe} (Emergency Chart)")
+    ax.grid(True)
+    fig.text(0.5, 0.01, f"Generated: {generated_at}", ha="center", fontsize=8)
+
+    buf = BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def render_heatmap(payload: Dict[str, Any]) -> bytes:
+    """Draw a correlation heatmap (-1..1, values annotated for small matrices). Runs inside a worker process."""
+    from matplotlib.figure import Figure
+
+    labels = payload["labels"]
+    matrix = np.asarray(payload["matrix"], dtype=float)
+    dpi = int(payload.get("dpi", 100))
+    size = max(6.0, 0.32 * len(labels) + 2)
+    fig = Figure(figsize=(size, size * 0.9), dpi=dpi, facecolor=BACKGROUND_COLOR)
+    ax = fig.add_subplot(111)
+    ax.set_facecolor(BACKGROUND_COLOR)
+    image = ax.imshow(np.ma.masked_invalid(matrix), cmap="RdYlGn", vmin=-1, vmax=1)
+    ax.set_xticks(range(len(labels)))
+    ax.set_yticks(range(len(labels)))
+    ax.set_xticklabels(labels, rotation=90, fontsize=7, color=TEXT_COLOR)
+    ax.set_yticklabels(labels, fontsize=7, color=TEXT_COLOR)
+    for spine in ax.spines.values():
+        spine.set_color(GRID_COLOR)
+    if len(labels) <= 20:
+        for i in range(len(labels)):
+            for j in range(len(labels)):
+                if np.isfinite(matrix[i, j]):
+                    ax.text(j, i, f"{matrix[i, j]:.2f}", ha="center", va="center", fontsize=6, color="black")
+    colorbar = fig.colorbar(image, ax=ax, fraction=0.046, pad=0.02)
+    colorbar.ax.tick_params(colors=TEXT_COLOR, labelsize=7)
+    ax.set_title(payload.get("title", ""), color=TEXT_COLOR, fontsize=11, loc="left")
+    fig.tight_layout()
+
+    buf = BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, facecolor=BACKGROUND_COLOR)
+    return buf.getvalue()
+
+
+def sample_payload(instrument: str, timeframe: str = "H1") -> Dict[str, Any]:
+    """Build a candle payload with generated (seeded) data for the fallback chart"""
+    # Bepaal het aantal candles op basis van timeframe
+    hours, periods = {"1h": (1, 168), "H1": (1, 168), "4h": (4, 180), "1d": (24, 180)}.get(timeframe, (1, 168))
+    freq = pd.Timedelta(hours=hours)
+
+    rng = np.random.default_rng(42)  # Voor consistente resultaten
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    high = close + rng.uniform(0, 3, periods)
+    low = close - rng.uniform(0, 3, periods)
+    open_price = close - rng.uniform(-2, 2, periods)
+    series = pd.Series(close)
+
+    return {
+        "title": f"{instrument} - {timeframe} Chart",
+        "index": pd.date_range(end=pd.Timestamp.now().floor(freq), periods=periods, freq=freq).asi8,
+        "open": open_price,
+        "high": np.maximum(high, open_price),
+        "low": np.minimum(low, open_price),
+        "close": close,
+        "overlays": {
+            "SMA 20": series.rolling(window=20).mean().to_numpy(),
+            "SMA 50": series.rolling(window=50).mean().to_numpy(),
+        },
+        "rsi": None,
+        "width": 1200,
+        "height": 800,
+        "dpi": 100,
+    }
+
+
+class ChartRenderer:
+    """Renders charts from provider data with matplotlib/mplfinance in a process pool"""
+
+    def __init__(self):
+        """Load the renderer configuration from the environment"""
+        self.workers = max(1, int(os.getenv("CHART_RENDER_WORKERS", "1")))
+        self.bars = int(os.getenv("CHART_RENDER_BARS", "120"))
+        self.width = int(os.getenv("CHART_RENDER_WIDTH", "1280"))
+        self.height = int(os.getenv("CHART_RENDER_HEIGHT", "720"))
+        self.dpi = int(os.getenv("CHART_RENDER_DPI", "100"))
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: the bot process runs threads that must not be forked
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker)
+        return self._executor
+
+    def start(self) -> None:
+        """Start and warm the worker processes so the first chart does not pay the import cost"""
+        try:
+            self._get_executor().submit(_ping)
+            logger.info(f"Chart renderer started with {self.workers} worker(s)")
+        except Exception as e:
+            logger.error(f"Error starting chart renderer: {e}")
+
+    @staticmethod
+    def _column(df: pd.DataFrame, candidates) -> Optional[np.ndarray]:
+        for name in candidates:
+            if name in df.columns:
+                # Copy: provider frames may be cached and must not be modified
+                return np.array(df[name], dtype=float)
+        return None
+
+    def build_payload(self, instrument: str, df: pd.DataFrame, timeframe: str = "H1") -> Optional[Dict[str, Any]]:
+        """
+        Convert a provider DataFrame into the plain arrays sent to a worker.
+
+        Accepts both the Yahoo (Open/High/...) and Binance (open/high/...) price column names.
+        """
+        if df is None or df.empty or not isinstance(df.index, pd.DatetimeIndex):
+            return None
+
+        df = df.tail(self.bars)
+        payload = {
+            "title": f"{instrument} · {timeframe}",
+            "index": (df.index.tz_convert(None) if df.index.tz is not None else df.index).asi8,
+            "overlays": {},
+            "rsi": None,
+            "width": self.width,
+            "height": self.height,
+            "dpi": self.dpi,
+        }
+        for field, candidates in OHLC_COLUMNS.items():
+            values = self._column(df, candidates)
+            if values is None:
+                logger.warning(f"Cannot render {instrument}: missing {field} column")
+                return None
+            payload[field] = values
+
+        for label, candidates in OVERLAY_COLUMNS:
+            values = self._column(df, candidates)
+            if values is not None:
+                payload["overlays"][label] = values
+
+        rsi = self._column(df, RSI_COLUMNS)
+        if rsi is not None:
+            payload["rsi"] = rsi
+        return payload
+
+    async def render_candles(self, instrument: str, df: pd.DataFrame, timeframe: str = "H1") -> Optional[bytes]:
+        """
+        Render a candlestick chart for provider data off the event loop.
+
+        Returns:
+            PNG bytes or None if the data cannot be rendered
+        """
+        payload = self.build_payload(instrument, df, timeframe)
+        if payload is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_event_loop()
+            image = await loop.run_in_executor(self._get_executor(), render_candles, payload)
+        except Exception as e:
+            logger.error(f"Error rendering native chart for {instrument}: {e}", exc_info=True)
+            chart_metrics.increment("render.errors")
+            return None
+
+        duration = time.perf_counter() - start
+        chart_metrics.record("render.candles", duration)
+        logger.info(f"Rendered native chart for {instrument} ({timeframe}) in {duration:.3f}s")
+        return image
+
+    async def render_heatmap(self, title: str, labels, matrix: np.ndarray) -> Optional[bytes]:
+        """Render a correlation heatmap off the event loop (PNG bytes, or None on failure)"""
+        payload = {"title": title, "labels": list(labels), "matrix": np.asarray(matrix, dtype=float), "dpi": self.dpi}
+        try:
+            with chart_metrics.timer("render.heatmap"):
+                return await self._run(render_heatmap, payload)
+        except Exception as e:
+            logger.error(f"Error rendering heatmap: {str(e)}", exc_info=True)
+            chart_metrics.increment("render.errors")
+            return None
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    async def render_emergency(self, instrument: str, timeframe: str = "H1") -> bytes:
+        """Render the placeholder chart used when no real chart can be made"""
+        try:
+            with chart_metrics.timer("render.emergency"):
+                return await self._run(render_emergency, instrument, timeframe,
+                                       datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        except Exception as e:
+            logger.error(f"Failed to create emergency chart: {str(e)}")
+            chart_metrics.increment("render.errors")
+            return b''
+
+    async def render_sample(self, instrument: str, timeframe: str = "H1") -> bytes:
+        """Render a candlestick chart with generated data as fallback"""
+        try:
+            with chart_metrics.timer("render.sample"):
+                return await self._run(render_candles, sample_payload(instrument, timeframe))
+        except Exception as e:
+            logger.error(f"Error generating chart: {str(e)}", exc_info=True)
+            chart_metrics.increment("render.errors")
+            return b''
+
+    def render_sample_sync(self, instrument: str, timeframe: str = "H1", timeout: float = 30) -> bytes:
+        """
+        Render the fallback chart for synchronous callers.
+
+        Waits on the worker future instead of starting an event loop; do not call this from a coroutine.
+        """
+        try:
+            future = self._get_executor().submit(render_candles, sample_payload(instrument, timeframe))
+            return future.result(timeout=timeout)
+        except Exception as e:
+            logger.error(f"Error generating chart: {str(e)}", exc_info=True)
+            chart_metrics.increment("render.errors")
+            return b''
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
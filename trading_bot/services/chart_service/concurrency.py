@@ -0,0 +1,124 @@
+import os
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls per key: the first caller runs the work, callers arriving while it
+    runs wait for the same result instead of starting their own.
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Metrics name, e.g. 'yahoo.download'
+        """
+        self.name = name
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        """Number of keys currently being worked on"""
+        return len(self._in_flight)
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `work()` for `key` unless it is already running, and return its result.
+
+        Exceptions of the work are raised to every waiting caller. A caller that is cancelled
+        does not cancel the shared work for the others.
+        """
+        future = self._in_flight.get(key)
+        if future is not None:
+            chart_metrics.increment(f"singleflight.{self.name}.coalesced")
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(work())
+        self._in_flight[key] = future
+        chart_metrics.increment(f"singleflight.{self.name}.leaders")
+
+        def _done(f, key=key):
+            if self._in_flight.get(key) is f:
+                del self._in_flight[key]
+            # Mark the exception as retrieved when every caller has gone away
+            if not f.cancelled():
+                f.exception()
+
+        future.add_done_callback(_done)
+        return await asyncio.shield(future)
+
+
+class MonitoredExecutor:
+    """
+    A bounded thread pool for one kind of blocking I/O, so slow calls of that kind cannot starve
+    the default executor. Exports queue depth, active threads and queue wait time.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        """
+        Args:
+            name: Metrics and thread name, e.g. 'market_data'
+            max_workers: Maximum number of threads
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def _publish(self) -> None:
+        chart_metrics.set_gauge(f"executor.{self.name}.queue_depth", self._queued)
+        chart_metrics.set_gauge(f"executor.{self.name}.active", self._active)
+
+    def _wrap(self, fn: Callable, args, submitted: float) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._publish()
+        chart_metrics.record(f"executor.{self.name}.queue_wait", time.perf_counter() - submitted)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._publish()
+
+    def _cancelled(self, future) -> None:
+        # Work cancelled before a thread picked it up never reaches _wrap
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+                self._publish()
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Run a blocking function on this pool and await its result"""
+        with self._lock:
+            self._queued += 1
+            self._publish()
+        future = self._get_executor().submit(self._wrap, fn, args, time.perf_counter())
+        future.add_done_callback(self._cancelled)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self) -> None:
+        """Stop the threads (queued work still finishes)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# Yahoo downloads and other market-data HTTP calls that only exist as blocking APIs
+market_data_executor = MonitoredExecutor("market_data", max(1, int(os.getenv("MARKET_DATA_WORKERS", "4"))))
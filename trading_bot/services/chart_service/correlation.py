@@ -0,0 +1,272 @@
+import os
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, List, Any, Tuple
+
+import numpy as np
+
+from trading_bot.services.chart_service.candle_store import candle_store
+from trading_bot.services.chart_service.concurrency import SingleFlight, market_data_executor
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service.ta_snapshots import store_key
+from trading_bot.services.instrument_registry import instrument_registry
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+
+
+def pairwise_correlation(returns: np.ndarray, valid: np.ndarray, min_overlap: int) -> np.ndarray:
+    """
+    Pearson correlation of every pair of rows over the columns where both rows have a value.
+
+    All pairs are computed at once from matrix products of the zero-filled returns and the
+    validity mask (counts, sums, sums of squares and cross products per pair), so instruments
+    with different trading hours (crypto at the weekend, index sessions) are compared on their
+    common hours only.
+
+    Args:
+        returns: n x T returns (any value where `valid` is False)
+        valid: n x T bool mask
+        min_overlap: Pairs with fewer common observations get NaN
+    """
+    m = valid.astype(float)
+    x = np.where(valid, returns, 0.0)
+    n = m @ m.T
+    sx = x @ m.T            # sx[i, j]: sum of row i over the columns where j is valid as well
+    sxx = (x * x) @ m.T
+    sxy = x @ x.T
+    cov = n * sxy - sx * sx.T
+    var = (n * sxx - sx * sx) * (n * sxx - sx * sx).T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = cov / np.sqrt(var)
+    corr[(n < min_overlap) | ~np.isfinite(corr)] = np.nan
+    np.fill_diagonal(corr, 1.0)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def signal_direction(signal: Dict[str, Any]) -> str:
+    """BUY/SELL of a webhook signal: 'direction', 'signal', or the side of the stop loss"""
+    direction = str(signal.get("direction") or signal.get("signal") or "").upper()
+    if direction in ("BUY", "SELL"):
+        return direction
+    try:
+        price, sl = float(signal.get("price", 0)), float(signal.get("sl", 0))
+    except (TypeError, ValueError):
+        return ""
+    return "BUY" if sl < price else "SELL" if price < sl else ""
+
+
+class CorrelationMatrix:
+    """
+    Rolling H1 return correlations across the signal instruments, from the candle store.
+
+    The hourly return rows are kept on an aligned time grid. At every candle close only the new
+    hours are read and the grid shifts; the matrix itself is recomputed from the grid with a few
+    matrix products. Recent signals are remembered so a signal whose exposure duplicates an
+    earlier signal on a strongly correlated instrument can be flagged.
+    """
+
+    def __init__(self, instruments: Optional[List[str]] = None):
+        """
+        Args:
+            instruments: Universe (default CORRELATION_INSTRUMENTS, or every instrument with signals)
+        """
+        configured = [i.strip().upper() for i in os.getenv("CORRELATION_INSTRUMENTS", "").split(",") if i.strip()]
+        self.instruments = instruments or configured or sorted(instrument_registry.signal_timeframes())
+        self.window = int(os.getenv("CORRELATION_WINDOW", "500"))
+        self.min_overlap = int(os.getenv("CORRELATION_MIN_OVERLAP", "100"))
+        self.threshold = float(os.getenv("CORRELATION_SIGNAL_THRESHOLD", "0.8"))
+        self.signal_window = float(os.getenv("CORRELATION_SIGNAL_WINDOW", str(4 * HOUR)))
+        self.delay = float(os.getenv("CORRELATION_DELAY_SECONDS", "120"))
+
+        self._keys = {instrument: store_key(instrument, "1h") for instrument in self.instruments}
+        self._end: Optional[int] = None
+        self._seen: Optional[tuple] = None
+        self._returns = np.zeros((len(self.instruments), self.window))
+        self._valid = np.zeros((len(self.instruments), self.window), dtype=bool)
+        # Newest bar written per row; series are refreshed at different moments
+        self._row_end: List[Optional[int]] = [None] * len(self.instruments)
+        self._matrix: Optional[np.ndarray] = None
+        self._generated_at = 0.0
+        self._signals: List[Tuple[float, str, str]] = []
+        self._flight = SingleFlight("correlation")
+        self._task = None
+
+    # --- Grid maintenance -------------------------------------------------------------------
+
+    def _fill(self, row: int, since: int, start: int, bars: int) -> None:
+        """Write the returns of the bars from `since` on into the grid (grid column 0 = `start`)"""
+        df = candle_store.read(*self._keys[self.instruments[row]], limit=bars)
+        if df is None or df.empty:
+            return
+        ts = df.index.asi8 // 10**9
+        close = df["Close"].to_numpy(dtype=float)
+        # Returns against the previous stored bar (also across a weekend or session gap); the
+        # oldest bar read only serves as the previous close
+        previous = np.concatenate(([np.nan], close[:-1]))
+        new = ts >= since
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = np.log(close[new] / previous[new])
+        columns = (ts[new] - start) // HOUR
+        keep = (columns >= 0) & (columns < self.window) & np.isfinite(returns)
+        self._returns[row, columns[keep]] = returns[keep]
+        self._valid[row, columns[keep]] = True
+        self._row_end[row] = int(ts[-1])
+
+    def refresh_sync(self) -> bool:
+        """
+        Bring the grid up to the newest stored H1 candle of every instrument.
+
+        Returns:
+            True when the matrix changed
+        """
+        last = tuple(candle_store.last_timestamp(*key) for key in self._keys.values())
+        end = max((ts for ts in last if ts is not None), default=None)
+        if end is None or last == self._seen:
+            return False
+
+        start_time = time.perf_counter()
+        start = end - (self.window - 1) * HOUR
+        if self._end is None or end - self._end >= self.window * HOUR:
+            # Full build: window + 1 bars per instrument (the extra one for the first return)
+            self._returns[:] = 0.0
+            self._valid[:] = False
+            self._row_end = [None] * len(self.instruments)
+            for row in range(len(self.instruments)):
+                self._fill(row, start, start, self.window + 1)
+        else:
+            # Incremental: shift the grid by the new hours
+            shift = (end - self._end) // HOUR
+            if shift > 0:
+                self._returns = np.roll(self._returns, -shift, axis=1)
+                self._valid = np.roll(self._valid, -shift, axis=1)
+                self._returns[:, -shift:] = 0.0
+                self._valid[:, -shift:] = False
+            # Per instrument, re-read from its own newest bar: that bar may still have been forming,
+            # and a series refreshed later than the others has not had its new bars yet
+            for row, row_last in enumerate(last):
+                if row_last is None:
+                    continue
+                since = max(self._row_end[row] if self._row_end[row] is not None else start, start)
+                if row_last < since:
+                    continue
+                # One bar more for the previous close
+                self._fill(row, since, start, min((row_last - since) // HOUR + 2, self.window + 1))
+        self._end = end
+        self._seen = last
+
+        self._matrix = pairwise_correlation(self._returns, self._valid, self.min_overlap)
+        self._generated_at = time.time()
+        chart_metrics.record("correlation.refresh_time", time.perf_counter() - start_time)
+        return True
+
+    async def refresh(self) -> bool:
+        """refresh_sync on the market data executor; concurrent callers share one refresh"""
+        return await self._flight.do("refresh", lambda: market_data_executor.run(self.refresh_sync))
+
+    # --- Background job at candle close -----------------------------------------------------
+
+    def start(self) -> None:
+        """Refresh after every H1 close (idempotent)"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.ensure_future(self._run())
+        logger.info(f"Correlation job started for {len(self.instruments)} instruments")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing correlations: {str(e)}")
+            now = time.time()
+            # After the TA snapshot job has brought the candle store up to date
+            await asyncio.sleep(max((now // HOUR + 1) * HOUR + self.delay - now, 1.0))
+
+    # --- Read API ---------------------------------------------------------------------------
+
+    async def get_matrix(self) -> Tuple[List[str], Optional[np.ndarray]]:
+        """(instruments, n x n correlation matrix); refreshed first when a candle closed since"""
+        await self.refresh()
+        return list(self.instruments), self._matrix
+
+    async def correlated_with(self, instrument: str, threshold: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Instruments whose |correlation| with `instrument` is at least `threshold`, strongest first"""
+        names, matrix = await self.get_matrix()
+        entry = instrument_registry.get(instrument)
+        symbol = entry.symbol if entry is not None else instrument.upper()
+        if matrix is None or symbol not in names:
+            return []
+        threshold = self.threshold if threshold is None else threshold
+        row = matrix[names.index(symbol)]
+        pairs = [(names[j], float(row[j])) for j in range(len(names))
+                 if names[j] != symbol and np.isfinite(row[j]) and abs(row[j]) >= threshold]
+        return sorted(pairs, key=lambda pair: -abs(pair[1]))
+
+    async def flag_signal(self, signal: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Compare a new signal with the recent ones and record it. A recent signal is a duplicate
+        when its instrument is strongly correlated and the exposure is the same: same direction
+        for a positive correlation, opposite direction for a negative one.
+
+        Sets signal['correlated_signals'] (and 'correlation_warning' when there are any).
+        """
+        duplicates = []
+        try:
+            direction = signal_direction(signal)
+            entry = instrument_registry.get(str(signal.get("instrument", "")))
+            if not direction or entry is None:
+                return duplicates
+            now = time.time()
+            self._signals = [s for s in self._signals if now - s[0] <= self.signal_window]
+            correlated = dict(await self.correlated_with(entry.symbol))
+            for ts, instrument, previous_direction in self._signals:
+                corr = correlated.get(instrument)
+                if corr is None:
+                    continue
+                if (corr > 0) == (previous_direction == direction):
+                    duplicates.append({"instrument": instrument, "direction": previous_direction,
+                                       "correlation": round(corr, 2), "age_minutes": int((now - ts) // 60)})
+            self._signals.append((now, entry.symbol, direction))
+        except Exception as e:
+            logger.error(f"Error checking signal correlations: {str(e)}")
+
+        signal["correlated_signals"] = duplicates
+        if duplicates:
+            chart_metrics.increment("correlation.duplicate_signals")
+            others = ", ".join(f"{d['instrument']} {d['direction']} (r={d['correlation']:+.2f})" for d in duplicates)
+            signal["correlation_warning"] = f"Similar exposure to recent signal(s): {others}"
+        return duplicates
+
+    async def render_heatmap(self, renderer) -> Optional[bytes]:
+        """PNG heatmap of the current matrix via the chart renderer's worker processes"""
+        names, matrix = await self.get_matrix()
+        if matrix is None:
+            return None
+        hours = int(self._valid.any(axis=0).sum())
+        return await renderer.render_heatmap(f"H1 return correlation · last {hours} hours", names, matrix)
+
+    def format_pairs(self, instrument: str, pairs: List[Tuple[str, float]]) -> str:
+        """Telegram (HTML) list of the instruments that move with `instrument`"""
+        if not pairs:
+            return f"No instruments with |r| ≥ {self.threshold:.2f} against {instrument}."
+        lines = [f"<b>🔗 Correlated with {instrument} (H1 returns)</b>", ""]
+        lines.extend(f"{'🟢' if corr > 0 else '🔴'} {name}: {corr:+.2f}" for name, corr in pairs)
+        return "\n".join(lines)
+
+
+# Shared matrix; started by ChartService.initialize, used by /correlation and the signal endpoints
+correlation_matrix = CorrelationMatrix()
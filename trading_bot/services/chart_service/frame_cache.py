@@ -0,0 +1,80 @@
+import logging
+from typing import Any, Hashable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+from cachetools import TTLCache
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Flat size for None markers, info dicts and the cache's own bookkeeping per entry
+_ENTRY_OVERHEAD = 512
+
+
+def frame_nbytes(value: Any) -> int:
+    """Bytes a cached value takes: DataFrames by their arrays and index, tuples by their parts"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum()) + _ENTRY_OVERHEAD
+    if isinstance(value, tuple):
+        return sum(frame_nbytes(part) for part in value)
+    return _ENTRY_OVERHEAD
+
+
+def compact_frame(df: pd.DataFrame, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Cache form of a candle frame: only `columns` (matched on the first level for yfinance
+    MultiIndex columns), float32 values in one block, and that block read-only so every hit can
+    share it. Frames with non-numeric columns are kept as they are (just trimmed).
+    """
+    if columns is not None:
+        wanted = set(columns)
+        labels = df.columns.get_level_values(0) if isinstance(df.columns, pd.MultiIndex) else df.columns
+        df = df.loc[:, [label in wanted for label in labels]]
+    if df.empty or not all(np.issubdtype(dtype, np.number) for dtype in df.dtypes):
+        return df.copy()
+    values = df.to_numpy(dtype=np.float32)
+    values.flags.writeable = False
+    return pd.DataFrame(values, index=df.index.copy(), columns=df.columns.copy(), copy=False)
+
+
+def frame_view(df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """A new frame object over the cached arrays: adding columns does not touch the cache, writing into it raises"""
+    return df.copy(deep=False) if df is not None else None
+
+
+class FrameCache(TTLCache):
+    """
+    TTL cache bounded by bytes instead of entries. Values larger than the whole budget are not
+    cached. The current size, entry count and evictions are exported as cache.<name>.* metrics.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl: float):
+        """
+        Args:
+            name: Metrics name, e.g. 'yahoo_download'
+            max_bytes: Memory budget for all entries together
+            ttl: Seconds an entry stays valid
+        """
+        super().__init__(maxsize=max_bytes, ttl=ttl, getsizeof=frame_nbytes)
+        self.name = name
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        try:
+            super().__setitem__(key, value)
+        except ValueError:
+            # cachetools refuses values above maxsize
+            chart_metrics.increment(f"cache.{self.name}.too_large")
+            logger.warning(f"[{self.name} cache] Entry {key} is larger than the {self.maxsize} byte budget, not cached")
+            return
+        self._publish()
+
+    def popitem(self):
+        item = super().popitem()
+        chart_metrics.increment(f"cache.{self.name}.evictions")
+        return item
+
+    def _publish(self) -> None:
+        chart_metrics.set_gauge(f"cache.{self.name}.bytes", self.currsize)
+        chart_metrics.set_gauge(f"cache.{self.name}.entries", len(self))
@@ -0,0 +1,279 @@
+import os
+import logging
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Optional, Tuple, Dict, Any
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram sendPhoto limits
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+TELEGRAM_PHOTO_MAX_DIMENSION_SUM = 10000
+TELEGRAM_PHOTO_MAX_RATIO = 20
+
+SUPPORTED_FORMATS = ("png", "jpeg", "webp")
+
+# The size budget is not chased below this many pixels on the short side, nor beyond this many
+# re-encodes (a tiny or misconfigured budget would otherwise shrink the image forever)
+MIN_IMAGE_SIDE = 200
+MAX_ENCODE_ATTEMPTS = 12
+
+
+def _trim_uniform_border(img):
+    """Crop away the uniform border around the chart area"""
+    from PIL import Image, ImageChops
+
+    rgb = img.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    bbox = ImageChops.difference(rgb, background).getbbox()
+    if bbox and bbox != (0, 0) + img.size:
+        return img.crop(bbox)
+    return img
+
+
+def _fit_telegram_limits(img):
+    """Scale down images whose dimensions exceed what Telegram accepts for photos"""
+    from PIL import Image
+
+    width, height = img.size
+    scale = 1.0
+    if width + height > TELEGRAM_PHOTO_MAX_DIMENSION_SUM:
+        scale = TELEGRAM_PHOTO_MAX_DIMENSION_SUM / float(width + height)
+    if scale < 1.0:
+        img = img.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+
+    width, height = img.size
+    if max(width, height) / float(max(1, min(width, height))) > TELEGRAM_PHOTO_MAX_RATIO:
+        # Too elongated for a photo: crop the long side to the maximum ratio
+        if width > height:
+            img = img.crop((0, 0, height * TELEGRAM_PHOTO_MAX_RATIO, height))
+        else:
+            img = img.crop((0, 0, width, width * TELEGRAM_PHOTO_MAX_RATIO))
+    return img
+
+
+def _encode(img, image_format: str, quality: int) -> bytes:
+    from PIL import Image
+
+    buf = BytesIO()
+    if image_format == "png":
+        # Charts use few colours; a 256 colour palette keeps them sharp at a fraction of the size
+        quantize = getattr(Image, "Quantize", Image)
+        img.convert("RGB").quantize(colors=256, method=quantize.FASTOCTREE).save(buf, format="PNG", optimize=True)
+    elif image_format == "jpeg":
+        img.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        img.convert("RGB").save(buf, format="WEBP", quality=quality, method=4)
+    return buf.getvalue()
+
+
+def _process_image(img, crop_box: Optional[Tuple[int, int, int, int]], max_width: Optional[int],
+                   image_format: str, quality: int, max_bytes: int,
+                   original: Optional[bytes] = None) -> Tuple[bytes, Dict[str, Any]]:
+    from PIL import Image
+
+    original_size = img.size
+    original_format = (img.format or "").lower()
+    img = img.crop(crop_box) if crop_box else _trim_uniform_border(img)
+
+    if max_width and img.width > max_width:
+        ratio = max_width / float(img.width)
+        img = img.resize((max_width, max(1, int(img.height * ratio))), Image.LANCZOS)
+
+    img = _fit_telegram_limits(img)
+    # The original bytes are only a candidate when the pixels were not cropped or resized
+    unchanged = img.size == original_size
+
+    encoded = _encode(img, image_format, quality)
+    best = (encoded, img.size, quality)
+    # Lower the quality first (lossy formats), then the resolution, until the budget is met
+    attempts = 1
+    while len(encoded) > max_bytes and attempts < MAX_ENCODE_ATTEMPTS:
+        if image_format != "png" and quality > 40:
+            quality -= 10
+        elif min(img.size) * 0.8 >= MIN_IMAGE_SIDE:
+            img = img.resize((max(1, int(img.width * 0.8)), max(1, int(img.height * 0.8))), Image.LANCZOS)
+        else:
+            break
+        encoded = _encode(img, image_format, quality)
+        attempts += 1
+        if len(encoded) < len(best[0]):
+            best = (encoded, img.size, quality)
+
+    encoded, final_size, quality = best
+    if (original is not None and unchanged and original_format in SUPPORTED_FORMATS
+            and len(original) <= min(len(encoded), max_bytes)):
+        # No re-encode beats the input, which already fits the budget
+        return original, {
+            "original_size": original_size,
+            "final_size": original_size,
+            "format": original_format,
+            "quality": None,
+        }
+    if len(encoded) > max_bytes:
+        logger.warning(f"Chart image is {len(encoded)} bytes after {attempts} encodes, above the {max_bytes} byte budget")
+
+    info = {
+        "original_size": original_size,
+        "final_size": final_size,
+        "format": image_format,
+        "quality": quality,
+    }
+    return encoded, info
+
+
+def process_chart_image(data: bytes, crop_box: Optional[Tuple[int, int, int, int]] = None,
+                        max_width: Optional[int] = None, image_format: str = "png",
+                        quality: int = 85, max_bytes: int = TELEGRAM_PHOTO_MAX_BYTES) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Crop, downscale and re-encode a chart screenshot. Runs inside a worker process.
+
+    Args:
+        data: Raw image bytes (PNG screenshot)
+        crop_box: Optional (left, top, right, bottom) chart area; the uniform border is trimmed otherwise
+        max_width: Optional maximum width in pixels
+        image_format: 'png' (quantized), 'jpeg' or 'webp'
+        quality: Starting quality for lossy formats
+        max_bytes: Size budget; quality and then resolution are lowered until it fits
+
+    Returns:
+        Tuple of (encoded bytes, info dict); `data` itself when no re-encode is smaller and it fits
+    """
+    from PIL import Image
+
+    img = Image.open(BytesIO(data))
+    img.load()
+    return _process_image(img, crop_box, max_width, image_format, quality, max_bytes, data)
+
+
+def derive_chart_variants(data: bytes, crop_boxes: Dict[str, Optional[Tuple[int, int, int, int]]],
+                          max_width: Optional[int] = None, image_format: str = "png",
+                          quality: int = 85, max_bytes: int = TELEGRAM_PHOTO_MAX_BYTES) -> Dict[str, Tuple[bytes, Dict[str, Any]]]:
+    """
+    Cut several variants (e.g. normal and fullscreen) out of one canonical capture. Runs inside a worker process.
+
+    The image is decoded once; each variant gets its own crop box (None trims the uniform border).
+
+    Returns:
+        Dict of variant name -> (encoded bytes, info dict)
+    """
+    from PIL import Image
+
+    img = Image.open(BytesIO(data))
+    img.load()
+    return {
+        name: _process_image(img, crop_box, max_width, image_format, quality, max_bytes, data)
+        for name, crop_box in crop_boxes.items()
+    }
+
+
+class ImagePipeline:
+    """Post-processes chart screenshots in a process pool before they are uploaded"""
+
+    def __init__(self):
+        """Load the pipeline configuration from the environment"""
+        image_format = os.getenv("CHART_IMAGE_FORMAT", "png").lower()
+        if image_format == "jpg":
+            image_format = "jpeg"
+        if image_format not in SUPPORTED_FORMATS:
+            logger.warning(f"Unsupported CHART_IMAGE_FORMAT '{image_format}', using png")
+            image_format = "png"
+        self.image_format = image_format
+        self.max_width = int(os.getenv("CHART_IMAGE_MAX_WIDTH", "0")) or None
+        self.quality = int(os.getenv("CHART_IMAGE_QUALITY", "85"))
+        self.max_bytes = min(int(os.getenv("CHART_IMAGE_MAX_BYTES", str(TELEGRAM_PHOTO_MAX_BYTES))), TELEGRAM_PHOTO_MAX_BYTES)
+        self.workers = max(1, int(os.getenv("CHART_IMAGE_WORKERS", "1")))
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: the bot process runs threads (Playwright, executors) that must not be forked
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def process(self, data: bytes, crop_box: Optional[Tuple[int, int, int, int]] = None,
+                      max_width: Optional[int] = None, image_format: Optional[str] = None) -> bytes:
+        """
+        Crop, downscale and compress a screenshot off the event loop.
+
+        Returns the original bytes if processing fails.
+        """
+        if not data:
+            return data
+
+        start = time.perf_counter()
+        job = functools.partial(
+            process_chart_image, data,
+            crop_box=crop_box,
+            max_width=max_width or self.max_width,
+            image_format=image_format or self.image_format,
+            quality=self.quality,
+            max_bytes=self.max_bytes,
+        )
+        try:
+            loop = asyncio.get_event_loop()
+            encoded, info = await loop.run_in_executor(self._get_executor(), job)
+        except Exception as e:
+            logger.error(f"Error post-processing chart image: {e}", exc_info=True)
+            chart_metrics.increment("image.errors")
+            return data
+
+        duration = time.perf_counter() - start
+        chart_metrics.record("image.process_time", duration)
+        chart_metrics.record("image.bytes_before", len(data))
+        chart_metrics.record("image.bytes_after", len(encoded))
+        chart_metrics.increment("image.bytes_saved_total", len(data) - len(encoded))
+        logger.info(f"Chart image processed in {duration:.2f}s: {len(data)} -> {len(encoded)} bytes "
+                    f"({info['original_size']} -> {info['final_size']}, {info['format']})")
+        return encoded
+
+    async def derive_variants(self, data: bytes,
+                              crop_boxes: Dict[str, Optional[Tuple[int, int, int, int]]]) -> Optional[Dict[str, bytes]]:
+        """
+        Derive all chart variants from one canonical capture in a single worker job.
+
+        Returns:
+            Dict of variant name -> encoded bytes, or None if processing fails
+        """
+        if not data:
+            return None
+
+        start = time.perf_counter()
+        job = functools.partial(
+            derive_chart_variants, data, crop_boxes,
+            max_width=self.max_width,
+            image_format=self.image_format,
+            quality=self.quality,
+            max_bytes=self.max_bytes,
+        )
+        try:
+            loop = asyncio.get_event_loop()
+            results = await loop.run_in_executor(self._get_executor(), job)
+        except Exception as e:
+            logger.error(f"Error deriving chart variants: {e}", exc_info=True)
+            chart_metrics.increment("image.errors")
+            return None
+
+        duration = time.perf_counter() - start
+        chart_metrics.record("image.derive_time", duration)
+        chart_metrics.record("image.bytes_before", len(data))
+        variants = {}
+        for name, (encoded, info) in results.items():
+            chart_metrics.record("image.bytes_after", len(encoded))
+            variants[name] = encoded
+        logger.info(f"Derived chart variants in {duration:.2f}s: " +
+                    ", ".join(f"{name}={results[name][1]['final_size']}/{len(v)} bytes" for name, v in variants.items()))
+        return variants
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
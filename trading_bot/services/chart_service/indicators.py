@@ -0,0 +1,257 @@
+import logging
+import threading
+from collections import deque
+from typing import Optional, Dict, Any, Hashable, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Canonical indicator columns (the names the Yahoo provider always used)
+EMA_SPANS = (20, 50, 200)
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+INDICATOR_COLUMNS = ("EMA_20", "EMA_50", "EMA_200", "RSI_14", "MACD_12_26_9", "MACDs_12_26_9", "MACDh_12_26_9")
+
+# EMAs are computed in blocks; decay**-BLOCK stays far from overflow for every span used here
+_EMA_BLOCK = 128
+
+
+def ema_numpy(values: np.ndarray, span: int, initial: Optional[float] = None) -> np.ndarray:
+    """
+    Exponential moving average identical to pandas `ewm(span=span, adjust=False).mean()`.
+
+    The recursion y[t] = a*x[t] + (1-a)*y[t-1] is solved per block in closed form with cumulative
+    sums, so there is no Python loop per value. `values` is one series or a 2-D array with one
+    series per row (computed along the last axis). `initial` continues from a previous EMA value.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.empty_like(values)
+    if values.shape[-1] == 0:
+        return out
+    alpha = 2.0 / (span + 1.0)
+    decay = 1.0 - alpha
+    prev = values[..., 0] if initial is None else np.asarray(initial, dtype=float)
+
+    for start in range(0, values.shape[-1], _EMA_BLOCK):
+        block = values[..., start:start + _EMA_BLOCK]
+        length = block.shape[-1]
+        powers = decay ** np.arange(length)
+        # y[j] = decay^(j+1) * prev + alpha * decay^j * sum_k<=j x[k] * decay^-k
+        out[..., start:start + length] = (decay * powers * prev[..., None]
+                                          + alpha * powers * np.cumsum(block / powers, axis=-1))
+        prev = out[..., start + length - 1]
+    return out
+
+
+def rsi_numpy(close: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """
+    RSI with simple moving averages of gains and losses, identical to the pandas rolling version the
+    providers used (the first delta counts as 0, so the first value appears at index period-1).
+    Like ema_numpy it accepts one series per row of a 2-D array.
+    """
+    close = np.asarray(close, dtype=float)
+    out = np.full(close.shape, np.nan)
+    if close.shape[-1] < period:
+        return out
+    delta = np.diff(close, axis=-1, prepend=close[..., :1])
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    windows = np.lib.stride_tricks.sliding_window_view
+    avg_gain = windows(gains, period, axis=-1).mean(axis=-1)
+    avg_loss = windows(losses, period, axis=-1).mean(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[..., period - 1:] = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return out
+
+
+class _SeriesState:
+    """Indicator state after the last closed bar of one series"""
+
+    __slots__ = ("ts", "close", "emas", "macd_signal", "gains", "losses", "frame")
+
+    def __init__(self):
+        self.ts = None
+        self.close = None
+        self.emas: Dict[int, float] = {}
+        self.macd_signal = None
+        self.gains = deque(maxlen=RSI_PERIOD)
+        self.losses = deque(maxlen=RSI_PERIOD)
+        # Indicator values already computed for the closed bars (index = bar timestamps)
+        self.frame: Optional[pd.DataFrame] = None
+
+    def copy(self) -> "_SeriesState":
+        other = _SeriesState()
+        other.ts, other.close = self.ts, self.close
+        other.emas = dict(self.emas)
+        other.macd_signal = self.macd_signal
+        other.gains, other.losses = deque(self.gains, maxlen=RSI_PERIOD), deque(self.losses, maxlen=RSI_PERIOD)
+        other.frame = self.frame
+        return other
+
+    def step(self, close: float) -> Tuple[float, ...]:
+        """Advance by one bar; O(1). Returns the values in INDICATOR_COLUMNS order."""
+        if self.close is None:
+            # First bar: EMAs start at the price, the first delta counts as 0
+            for span in EMA_SPANS + (MACD_FAST, MACD_SLOW):
+                self.emas[span] = close
+            delta = 0.0
+        else:
+            for span in self.emas:
+                alpha = 2.0 / (span + 1.0)
+                self.emas[span] = alpha * close + (1.0 - alpha) * self.emas[span]
+            delta = close - self.close
+        self.close = close
+
+        macd = self.emas[MACD_FAST] - self.emas[MACD_SLOW]
+        alpha = 2.0 / (MACD_SIGNAL + 1.0)
+        self.macd_signal = macd if self.macd_signal is None else alpha * macd + (1.0 - alpha) * self.macd_signal
+
+        self.gains.append(max(delta, 0.0))
+        self.losses.append(max(-delta, 0.0))
+        rsi = np.nan
+        if len(self.gains) == RSI_PERIOD:
+            avg_gain, avg_loss = sum(self.gains) / RSI_PERIOD, sum(self.losses) / RSI_PERIOD
+            if avg_loss > 0:
+                rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+            elif avg_gain > 0:
+                rsi = 100.0
+
+        return (self.emas[20], self.emas[50], self.emas[200], rsi,
+                macd, self.macd_signal, macd - self.macd_signal)
+
+
+class IndicatorEngine:
+    """
+    EMA 20/50/200, RSI 14 and MACD 12/26/9 for all providers, in one column schema.
+
+    A series seen for the first time is computed with the vectorized NumPy path. After that the
+    engine keeps the state at the last closed bar per series key and only steps through the new
+    bars (O(1) each). The newest bar is treated as still forming: it is computed from the state
+    but not committed, so a later fetch with its final close gives the right values.
+    """
+
+    def __init__(self):
+        """Initialize the per-series state store"""
+        self._states: Dict[Hashable, _SeriesState] = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _close_column(df: pd.DataFrame) -> str:
+        return "Close" if "Close" in df.columns else "close"
+
+    @staticmethod
+    def _vectorized(close: np.ndarray) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray]:
+        columns = {f"EMA_{span}": ema_numpy(close, span) for span in EMA_SPANS}
+        columns["RSI_14"] = rsi_numpy(close)
+        ema_fast, ema_slow = ema_numpy(close, MACD_FAST), ema_numpy(close, MACD_SLOW)
+        macd = ema_fast - ema_slow
+        signal = ema_numpy(macd, MACD_SIGNAL)
+        columns["MACD_12_26_9"] = macd
+        columns["MACDs_12_26_9"] = signal
+        columns["MACDh_12_26_9"] = macd - signal
+        return columns, ema_fast, ema_slow
+
+    def compute_frame(self, close: np.ndarray) -> Dict[str, np.ndarray]:
+        """Vectorized cold-start calculation over a whole close series"""
+        return self._vectorized(np.asarray(close, dtype=float))[0]
+
+    def _cold_start(self, df: pd.DataFrame, close: np.ndarray) -> Tuple[pd.DataFrame, _SeriesState]:
+        columns, ema_fast, ema_slow = self._vectorized(close)
+        frame = pd.DataFrame(columns, index=df.index)
+
+        # Rebuild the state at the last closed bar (second to last row) from the vectorized output
+        state = _SeriesState()
+        committed = len(close) - 1
+        if committed > 0:
+            last = committed - 1
+            state.ts, state.close = df.index[last], float(close[last])
+            for span in EMA_SPANS:
+                state.emas[span] = float(columns[f"EMA_{span}"][last])
+            state.emas[MACD_FAST] = float(ema_fast[last])
+            state.emas[MACD_SLOW] = float(ema_slow[last])
+            state.macd_signal = float(columns["MACDs_12_26_9"][last])
+            # The first delta of a series counts as 0
+            deltas = np.diff(close[:committed], prepend=close[0])[-RSI_PERIOD:]
+            state.gains.extend(np.where(deltas > 0, deltas, 0.0).tolist())
+            state.losses.extend(np.where(deltas < 0, -deltas, 0.0).tolist())
+            state.frame = frame.iloc[:committed]
+        return frame, state
+
+    def compute(self, df: pd.DataFrame, key: Optional[Hashable] = None) -> pd.DataFrame:
+        """
+        Return a copy of `df` (Close or close column, sorted DatetimeIndex) with the canonical
+        indicator columns added.
+
+        Args:
+            df: OHLC(V) candles, oldest first
+            key: Series identity, e.g. ('yahoo', 'EURUSD=X', '1h'); without a key nothing is cached
+        """
+        result = df.copy()
+        if df.empty:
+            for column in INDICATOR_COLUMNS:
+                result[column] = np.nan
+            return result
+
+        close = df[self._close_column(df)].to_numpy(dtype=float)
+        with self.lock:
+            state = self._states.get(key) if key is not None else None
+
+        frame = None
+        if state is not None and state.frame is not None and state.ts in df.index:
+            position = df.index.get_loc(state.ts)
+            # Only usable when the bars up to the state are unchanged and already cached
+            if (isinstance(position, (int, np.integer)) and close[position] == state.close
+                    and df.index[0] >= state.frame.index[0]):
+                new_state = state.copy()
+                rows = []
+                for i in range(position + 1, len(close)):
+                    if i == len(close) - 1:
+                        # Forming bar: computed on a copy, not committed
+                        rows.append(new_state.copy().step(float(close[i])))
+                    else:
+                        rows.append(new_state.step(float(close[i])))
+                        new_state.ts = df.index[i]
+                new_rows = pd.DataFrame(rows, index=df.index[position + 1:], columns=list(INDICATOR_COLUMNS))
+                committed_rows = new_rows.iloc[:-1]
+                if not committed_rows.empty:
+                    new_state.frame = pd.concat([state.frame, committed_rows])
+                frame = pd.concat([new_state.frame, new_rows.iloc[-1:]]) if not new_rows.empty else state.frame
+                frame = frame.reindex(df.index)
+                # Keep the cached history bounded by what callers ask for
+                new_state.frame = new_state.frame.iloc[-max(len(df), 1):]
+                state = new_state
+                chart_metrics.increment("indicators.incremental")
+                chart_metrics.increment("indicators.incremental_bars", len(rows))
+
+        if frame is None:
+            frame, state = self._cold_start(df, close)
+            chart_metrics.increment("indicators.cold_start")
+
+        if key is not None and state.ts is not None:
+            with self.lock:
+                self._states[key] = state
+
+        for column in INDICATOR_COLUMNS:
+            result[column] = frame[column].to_numpy()
+        return result
+
+    def latest(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Latest indicator values of a computed frame as plain floats (NaN when not available yet)"""
+        last = df.iloc[-1]
+        return {column: float(last[column]) if column in df.columns else float("nan") for column in INDICATOR_COLUMNS}
+
+    def reset(self, key: Optional[Hashable] = None) -> None:
+        """Forget the state of one series (or all)"""
+        with self.lock:
+            if key is None:
+                self._states.clear()
+            else:
+                self._states.pop(key, None)
+
+
+# Shared engine used by the market data providers
+indicator_engine = IndicatorEngine()
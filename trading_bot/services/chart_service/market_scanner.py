@@ -0,0 +1,243 @@
+import os
+import logging
+import time
+import warnings
+from collections import OrderedDict
+from typing import Optional, Dict, List, Any
+
+import numpy as np
+from cachetools import TTLCache
+
+from trading_bot.services.chart_service import timeframes
+from trading_bot.services.chart_service.candle_store import candle_store
+from trading_bot.services.chart_service.concurrency import market_data_executor
+from trading_bot.services.chart_service.indicators import ema_numpy, rsi_numpy, MACD_FAST, MACD_SLOW, MACD_SIGNAL
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service.ta_snapshots import ANALYSIS_BARS, stack_frames, store_key
+from trading_bot.services.chart_service.yfinance_provider import INDICATOR_WARMUP_BARS
+from trading_bot.services.instrument_registry import instrument_registry
+
+logger = logging.getLogger(__name__)
+
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+
+# Fewer candles than this and the indicators mean nothing; the instrument is skipped
+MIN_SCAN_BARS = 50
+
+# Timeframes with enough candles in the stored 1h series, which the TA snapshot job keeps up to
+# date. Nothing refreshes the 15m series in the background, and the ~500 stored 1h bars make
+# only ~20 D1 candles.
+SCAN_TIMEFRAMES = ("H1", "H4")
+
+# EMA 200 needs this many candles to mean anything; the trend conditions are False below it
+EMA_TREND_MIN_BARS = 200
+
+# Series whose last candle is this many base bars behind the newest series of their market are
+# not refreshed any more and are left out
+MAX_STALE_BARS = int(os.getenv("SCANNER_MAX_STALE_BARS", "3"))
+
+# name -> (description, condition over the feature arrays of all instruments at once)
+CONDITIONS = OrderedDict([
+    ("rsi_overbought", (f"RSI above {RSI_OVERBOUGHT}", lambda f: f["rsi"] > RSI_OVERBOUGHT)),
+    ("rsi_oversold", (f"RSI below {RSI_OVERSOLD}", lambda f: f["rsi"] < RSI_OVERSOLD)),
+    ("ema_bullish_stack", ("Price > EMA 20 > EMA 50 > EMA 200",
+                           lambda f: (f["price"] > f["ema_20"]) & (f["ema_20"] > f["ema_50"]) & (f["ema_50"] > f["ema_200"]))),
+    ("ema_bearish_stack", ("Price < EMA 20 < EMA 50 < EMA 200",
+                           lambda f: (f["price"] < f["ema_20"]) & (f["ema_20"] < f["ema_50"]) & (f["ema_50"] < f["ema_200"]))),
+    ("macd_bullish_cross", ("MACD crossed above its signal line on the last candle",
+                            lambda f: (f["macd_prev"] <= f["signal_prev"]) & (f["macd"] > f["macd_signal"]))),
+    ("macd_bearish_cross", ("MACD crossed below its signal line on the last candle",
+                            lambda f: (f["macd_prev"] >= f["signal_prev"]) & (f["macd"] < f["macd_signal"]))),
+    ("daily_high_break", ("Close above the high of the previous 24 hours", lambda f: f["price"] > f["daily_high"])),
+    ("daily_low_break", ("Close below the low of the previous 24 hours", lambda f: f["price"] < f["daily_low"])),
+    ("weekly_high_break", ("Close above the high of the previous 7 days", lambda f: f["price"] > f["weekly_high"])),
+    ("weekly_low_break", ("Close below the low of the previous 7 days", lambda f: f["price"] < f["weekly_low"])),
+])
+
+
+def scan_features(close: np.ndarray, high: np.ndarray, low: np.ndarray, ts: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Indicator values of the last candle for every row of the stacked arrays (see stack_frames):
+    price, EMA 20/50/200, RSI, MACD and signal (last and previous candle) and the high/low of the
+    24 hours and 7 days before the last candle.
+    """
+    macd = ema_numpy(close, MACD_FAST) - ema_numpy(close, MACD_SLOW)
+    signal = ema_numpy(macd, MACD_SIGNAL)
+    # Candles per row (the padding has no timestamp)
+    bars = (ts != np.iinfo(np.int64).min).sum(axis=1)
+
+    # The windows end before the last candle, so a close beyond them is a break
+    last_ts = ts[:, -1:]
+    previous_ts, previous_high, previous_low = ts[:, :-1], high[:, :-1], low[:, :-1]
+    daily = previous_ts >= last_ts - 24 * 3600
+    weekly = previous_ts >= last_ts - 7 * 24 * 3600
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN rows
+        daily_high = np.nanmax(np.where(daily, previous_high, np.nan), axis=1)
+        daily_low = np.nanmin(np.where(daily, previous_low, np.nan), axis=1)
+        weekly_high = np.nanmax(np.where(weekly, previous_high, np.nan), axis=1)
+        weekly_low = np.nanmin(np.where(weekly, previous_low, np.nan), axis=1)
+
+    return {
+        "price": close[:, -1],
+        "ema_20": ema_numpy(close, 20)[:, -1],
+        "ema_50": ema_numpy(close, 50)[:, -1],
+        "ema_200": np.where(bars >= EMA_TREND_MIN_BARS, ema_numpy(close, 200)[:, -1], np.nan),
+        "rsi": rsi_numpy(close)[:, -1],
+        "macd": macd[:, -1],
+        "macd_signal": signal[:, -1],
+        "macd_prev": macd[:, -2],
+        "signal_prev": signal[:, -2],
+        "daily_high": daily_high,
+        "daily_low": daily_low,
+        "weekly_high": weekly_high,
+        "weekly_low": weekly_low,
+        "candle_time": ts[:, -1],
+        "bars": bars.astype(float),
+    }
+
+
+def evaluate(features: Dict[str, np.ndarray], conditions: List[str]) -> Dict[str, np.ndarray]:
+    """Boolean mask per condition (NaN comparisons are False, so missing data never matches)"""
+    with np.errstate(invalid="ignore"):
+        return {name: CONDITIONS[name][1](features) for name in conditions}
+
+
+class MarketScanner:
+    """
+    Evaluates scan conditions across every instrument in one vectorized pass over the candle
+    store. Higher timeframes are resampled from the stored base series. Results are cached per
+    timeframe until one of the series gets a new candle (and at most SCANNER_CACHE_TTL seconds,
+    so updates to the forming candle are picked up).
+    """
+
+    def __init__(self, instruments: Optional[List[str]] = None):
+        """
+        Args:
+            instruments: Universe to scan (default SCANNER_INSTRUMENTS, or every registry instrument
+                with its own price feed)
+        """
+        configured = [i.strip().upper() for i in os.getenv("SCANNER_INSTRUMENTS", "").split(",") if i.strip()]
+        self.instruments = instruments or configured or list(instrument_registry.feed_symbols())
+        self._cache: TTLCache = TTLCache(maxsize=32, ttl=float(os.getenv("SCANNER_CACHE_TTL", "300")))
+
+    def _series_keys(self, timeframe: str) -> Dict[str, tuple]:
+        """Store series per instrument; instruments on a series already listed are skipped"""
+        interval = timeframes.base_interval(timeframe)
+        keys = {}
+        for instrument in self.instruments:
+            key = store_key(instrument, interval)
+            if key not in keys.values():
+                keys[instrument] = key
+        return keys
+
+    def _load(self, timeframe: str, keys: Dict[str, tuple]) -> Dict[str, Any]:
+        rows = timeframes.base_limit(timeframe, ANALYSIS_BARS, INDICATOR_WARMUP_BARS,
+                                     cap=candle_store.max_rows) + INDICATOR_WARMUP_BARS
+        resample = timeframes.bars_per_candle(timeframe) > 1
+        base_seconds = timeframes.TIMEFRAMES[timeframes.normalize_timeframe(timeframes.base_interval(timeframe))][0]
+
+        # Newest stored candle per market; closed markets (forex at the weekend) are all equally old
+        last = {instrument: candle_store.last_timestamp(*key) for instrument, key in keys.items()}
+        newest: Dict[str, int] = {}
+        for instrument, ts in last.items():
+            if ts is not None:
+                market = instrument_registry.market(instrument)
+                newest[market] = max(newest.get(market, ts), ts)
+
+        frames = {}
+        for instrument, key in keys.items():
+            market = instrument_registry.market(instrument)
+            if last[instrument] is None or newest[market] - last[instrument] > MAX_STALE_BARS * base_seconds:
+                if last[instrument] is not None:
+                    chart_metrics.increment("scanner.stale_series")
+                continue
+            df = candle_store.read(*key, limit=rows)
+            if df is None:
+                continue
+            if resample:
+                df = timeframes.resample_cached(df, timeframe, market, key)
+            if len(df) >= MIN_SCAN_BARS:
+                frames[instrument] = df
+        return frames
+
+    def scan_sync(self, timeframe: str = "H1", conditions: Optional[List[str]] = None,
+                  market: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Evaluate `conditions` (default: all) for every stored instrument on `timeframe`.
+
+        Returns:
+            Dict with timeframe, scanned (instrument count), matches (condition -> instruments),
+            values (instrument -> last-candle indicator values) and elapsed_ms
+        """
+        timeframe = timeframes.normalize_timeframe(timeframe)
+        if timeframe not in SCAN_TIMEFRAMES:
+            raise ValueError(f"Timeframe {timeframe} cannot be scanned (supported: {', '.join(SCAN_TIMEFRAMES)})")
+        conditions = list(conditions or CONDITIONS)
+        unknown = [name for name in conditions if name not in CONDITIONS]
+        if unknown:
+            raise ValueError(f"Unknown scan condition(s) {', '.join(unknown)} (available: {', '.join(CONDITIONS)})")
+
+        start = time.perf_counter()
+        keys = self._series_keys(timeframe)
+        # The newest stored candle of every series identifies the scan
+        signature = (timeframe, tuple(candle_store.last_timestamp(*key) for key in keys.values()))
+        result = self._cache.get(signature)
+        if result is None:
+            result = self._scan(timeframe, keys)
+            self._cache[signature] = result
+            chart_metrics.record("scanner.scan_time", time.perf_counter() - start)
+        else:
+            chart_metrics.increment("scanner.cache_hits")
+
+        names = result["names"]
+        selected = np.array([market is None or instrument_registry.market(name) == market for name in names], dtype=bool)
+        matches = {
+            name: [names[row] for row in np.flatnonzero(result["masks"][name] & selected)]
+            for name in conditions
+        }
+        # NaN (not enough history) as None, so the result is valid JSON
+        values = {
+            names[row]: {key: None if np.isnan(array[row]) else float(array[row]) for key, array in result["features"].items()}
+            for row in np.flatnonzero(selected)
+        }
+        return {
+            "timeframe": timeframe,
+            "scanned": int(selected.sum()),
+            "matches": matches,
+            "values": values,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def _scan(self, timeframe: str, keys: Dict[str, tuple]) -> Dict[str, Any]:
+        names, close, high, low, ts = stack_frames(self._load(timeframe, keys))
+        if not names:
+            return {"names": [], "features": {}, "masks": {name: np.zeros(0, dtype=bool) for name in CONDITIONS}}
+        features = scan_features(close, high, low, ts)
+        return {"names": names, "features": features, "masks": evaluate(features, list(CONDITIONS))}
+
+    async def scan(self, timeframe: str = "H1", conditions: Optional[List[str]] = None,
+                   market: Optional[str] = None) -> Dict[str, Any]:
+        """scan_sync on the market data executor (the candle files are read from disk)"""
+        return await market_data_executor.run(self.scan_sync, timeframe, conditions, market)
+
+    def format_results(self, result: Dict[str, Any]) -> str:
+        """Telegram (HTML) summary of a scan"""
+        lines = [f"<b>🔎 Market Scan ({result['timeframe']})</b>",
+                 f"{result['scanned']} instruments scanned", ""]
+        for name, instruments in result["matches"].items():
+            description = CONDITIONS[name][0]
+            if not instruments:
+                lines.append(f"<b>{description}:</b> none")
+                continue
+            lines.append(f"<b>{description}:</b>")
+            for instrument in instruments:
+                values = result["values"][instrument]
+                rsi = f" (RSI {values['rsi']:.1f})" if values["rsi"] is not None else ""
+                lines.append(f"• {instrument} {values['price']:.{instrument_registry.precision(instrument)}f}{rsi}")
+        return "\n".join(lines)
+
+
+# Shared scanner used by the /scan command and the API
+market_scanner = MarketScanner()
@@ -0,0 +1,100 @@
+import logging
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class ChartMetrics:
+    """Track timings, sizes and counters for the chart pipeline"""
+
+    def __init__(self, max_history: int = 200):
+        """
+        Initialize chart metrics tracking
+
+        Args:
+            max_history: Maximum number of data points to keep per series
+        """
+        self.series: Dict[str, List[float]] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Any] = {}
+        self.max_history = max_history
+        self.lock = threading.Lock()
+
+    def record(self, name: str, value: float) -> None:
+        """
+        Record a data point (duration in seconds, size in bytes, ...)
+
+        Args:
+            name: Series name, e.g. 'capture.navigate'
+            value: The measured value
+        """
+        with self.lock:
+            values = self.series.setdefault(name, [])
+            # Keep only the most recent entries
+            if len(values) >= self.max_history:
+                values.pop(0)
+            values.append(float(value))
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        """Increment a counter"""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: Any) -> None:
+        """Set a point-in-time value (queue depth, health state, ...)"""
+        with self.lock:
+            self.gauges[name] = value
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time the wrapped block and record the duration under `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get current chart metrics
+
+        Returns:
+            Dict with per-series statistics, counters and gauges
+        """
+        with self.lock:
+            metrics = {
+                'series': {},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges)
+            }
+
+            for name, values in self.series.items():
+                if not values:
+                    continue
+                ordered = sorted(values)
+                metrics['series'][name] = {
+                    'count': len(values),
+                    'last': values[-1],
+                    'avg': statistics.mean(values),
+                    'min': ordered[0],
+                    'max': ordered[-1],
+                    'median': statistics.median(values),
+                    'p90': ordered[int(len(ordered) * 0.9)] if len(ordered) >= 10 else None
+                }
+
+            return metrics
+
+    def reset(self) -> None:
+        """Reset all metrics"""
+        with self.lock:
+            self.series = {}
+            self.counters = {}
+            self.gauges = {}
+
+
+# Shared instance for the whole chart pipeline
+chart_metrics = ChartMetrics()
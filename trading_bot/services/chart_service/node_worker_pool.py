@@ -0,0 +1,236 @@
+import os
+import json
+import logging
+import asyncio
+import itertools
+import tempfile
+import time
+import uuid
+from typing import Optional, Dict, Any, List
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# tradingview_screenshot.js lives in the project root
+DEFAULT_SCRIPT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "tradingview_screenshot.js"))
+
+
+def screenshot_dir() -> str:
+    """Directory for image transfer between processes; tmpfs when available"""
+    return "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+
+
+class NodeWorkerError(Exception):
+    """A Node worker returned an error or died while handling a request"""
+
+
+class NodeScreenshotWorker:
+    """One long-lived `node tradingview_screenshot.js --worker` process speaking line-delimited JSON-RPC"""
+
+    def __init__(self, script_path: str, index: int = 0, start_timeout: float = 120):
+        self.script_path = script_path
+        self.index = index
+        self.start_timeout = start_timeout
+        self.process = None
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ready: Optional[asyncio.Future] = None
+        self._reader_task = None
+        self._stderr_task = None
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    @property
+    def load(self) -> int:
+        return len(self._pending)
+
+    async def start(self) -> None:
+        """Start the Node process and wait until its browser is up"""
+        loop = asyncio.get_event_loop()
+        self._ready = loop.create_future()
+        self.process = await asyncio.create_subprocess_exec(
+            "node", self.script_path, "--worker",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # Images travel via files; only log lines from the page can get long
+            limit=1024 * 1024,
+        )
+        self._reader_task = asyncio.ensure_future(self._read_stdout())
+        self._stderr_task = asyncio.ensure_future(self._read_stderr())
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready), timeout=self.start_timeout)
+        except Exception:
+            await self.stop()
+            raise
+        logger.info(f"Node screenshot worker {self.index} started (pid {self.process.pid})")
+
+    async def _read_stdout(self) -> None:
+        try:
+            while True:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    # Not a protocol message (library output); keep it in the debug log
+                    logger.debug(f"[node worker {self.index}] {line.decode(errors='ignore').rstrip()}")
+                    continue
+
+                if message.get("event") == "ready":
+                    if self._ready and not self._ready.done():
+                        self._ready.set_result(True)
+                    continue
+
+                future = self._pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(NodeWorkerError(message["error"]))
+                else:
+                    future.set_result(message.get("result"))
+        finally:
+            self._fail_pending(NodeWorkerError(f"Node worker {self.index} exited"))
+
+    async def _read_stderr(self) -> None:
+        while True:
+            line = await self.process.stderr.readline()
+            if not line:
+                break
+            logger.debug(f"[node worker {self.index}] {line.decode(errors='ignore').rstrip()}")
+
+    def _fail_pending(self, error: Exception) -> None:
+        if self._ready and not self._ready.done():
+            self._ready.set_exception(error)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def call(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 60) -> Any:
+        """Send one request and wait for its response"""
+        if not self.is_alive:
+            raise NodeWorkerError(f"Node worker {self.index} is not running")
+
+        request_id = next(self._ids)
+        future = asyncio.get_event_loop().create_future()
+        self._pending[request_id] = future
+        payload = json.dumps({"id": request_id, "method": method, "params": params or {}}) + "\n"
+        try:
+            self.process.stdin.write(payload.encode())
+            await self.process.stdin.drain()
+            return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def stop(self) -> None:
+        """Ask the worker to shut down, kill it if it does not"""
+        if self.is_alive:
+            try:
+                self.process.stdin.close()
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except Exception:
+                try:
+                    self.process.kill()
+                except ProcessLookupError:
+                    pass
+        for task in (self._reader_task, self._stderr_task):
+            if task and not task.done():
+                task.cancel()
+        self._fail_pending(NodeWorkerError(f"Node worker {self.index} stopped"))
+
+
+class NodeWorkerPool:
+    """A small pool of persistent Node screenshot workers with automatic restarts"""
+
+    def __init__(self, script_path: Optional[str] = None, size: Optional[int] = None):
+        """Load the pool configuration from the environment"""
+        self.script_path = script_path or os.getenv("TRADINGVIEW_SCREENSHOT_SCRIPT", DEFAULT_SCRIPT_PATH)
+        self.size = size or max(1, int(os.getenv("TRADINGVIEW_NODE_WORKERS", "1")))
+        self.capture_timeout = float(os.getenv("TRADINGVIEW_NODE_CAPTURE_TIMEOUT", "60"))
+        self.restart_backoff = float(os.getenv("TRADINGVIEW_NODE_RESTART_BACKOFF", "5"))
+        self.workers: List[NodeScreenshotWorker] = [NodeScreenshotWorker(self.script_path, i) for i in range(self.size)]
+        self._last_start: Dict[int, float] = {}
+        self._start_locks: Dict[int, asyncio.Lock] = {}
+
+    async def _ensure_started(self, worker: NodeScreenshotWorker) -> None:
+        if worker.is_alive:
+            return
+        lock = self._start_locks.setdefault(worker.index, asyncio.Lock())
+        async with lock:
+            if worker.is_alive:
+                return
+            # Avoid a tight restart loop when the worker crashes on start
+            since_last = time.monotonic() - self._last_start.get(worker.index, 0)
+            if since_last < self.restart_backoff:
+                await asyncio.sleep(self.restart_backoff - since_last)
+            if worker.index in self._last_start:
+                logger.warning(f"Restarting Node screenshot worker {worker.index}")
+                chart_metrics.increment("node_worker.restarts")
+            self._last_start[worker.index] = time.monotonic()
+            await worker.start()
+
+    async def start(self) -> None:
+        """Start all workers (otherwise they start on first use)"""
+        await asyncio.gather(*(self._ensure_started(w) for w in self.workers), return_exceptions=True)
+
+    def _pick_worker(self) -> NodeScreenshotWorker:
+        # Least busy worker, preferring ones that are already running
+        return min(self.workers, key=lambda w: (not w.is_alive, w.load))
+
+    async def capture(self, url: str, session_id: Optional[str] = None, fullscreen: bool = False,
+                      scroll_right: int = 0) -> Optional[bytes]:
+        """
+        Capture a chart URL on a persistent worker.
+
+        Returns:
+            PNG bytes or None if the capture failed
+        """
+        worker = self._pick_worker()
+        output_path = os.path.join(screenshot_dir(), f"tv_{uuid.uuid4().hex}.png")
+        start = time.perf_counter()
+        try:
+            await self._ensure_started(worker)
+            await worker.call("capture", {
+                "url": url,
+                "outputPath": output_path,
+                "sessionId": session_id or "",
+                "fullscreen": fullscreen,
+                "scrollRight": scroll_right,
+            }, timeout=self.capture_timeout)
+            with open(output_path, "rb") as f:
+                data = f.read()
+            chart_metrics.record("node_worker.capture", time.perf_counter() - start)
+            return data
+        except asyncio.TimeoutError:
+            logger.error(f"Node worker {worker.index} capture timed out after {self.capture_timeout}s, restarting it")
+            chart_metrics.increment("node_worker.errors")
+            # A hung worker is replaced on the next call
+            await worker.stop()
+            return None
+        except Exception as e:
+            logger.error(f"Node worker {worker.index} capture failed: {e}")
+            chart_metrics.increment("node_worker.errors")
+            return None
+        finally:
+            try:
+                os.unlink(output_path)
+            except OSError:
+                pass
+
+    async def broadcast(self, method: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """Send a request to all running workers (e.g. a new session id)"""
+        for worker in self.workers:
+            if worker.is_alive:
+                try:
+                    await worker.call(method, params, timeout=10)
+                except Exception as e:
+                    logger.warning(f"Node worker {worker.index} {method} failed: {e}")
+
+    async def close(self) -> None:
+        """Stop all workers"""
+        await asyncio.gather(*(w.stop() for w in self.workers), return_exceptions=True)
@@ -0,0 +1,127 @@
+import os
+import asyncio
+import logging
+import time
+from collections import namedtuple
+from typing import Optional, Dict, List
+
+from cachetools import TTLCache
+
+from trading_bot.services.chart_service.alltick_stream import alltick_stream
+from trading_bot.services.chart_service.binance_provider import BinanceProvider
+from trading_bot.services.chart_service.binance_stream import kline_stream
+from trading_bot.services.chart_service.concurrency import SingleFlight
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service.yfinance_provider import YahooFinanceProvider
+from trading_bot.services.instrument_registry import instrument_registry
+
+logger = logging.getLogger(__name__)
+
+Quote = namedtuple("Quote", ["instrument", "price", "source", "ts"])
+
+
+class QuoteService:
+    """
+    Last prices for any set of instruments through one `get_quotes([...])` call.
+
+    Lookup order per instrument: the short-TTL quote cache, the live streams (Binance klines,
+    AllTick ticks), then batched upstream requests: one Binance /api/v3/ticker/price call for all
+    crypto and one multi-ticker Yahoo download for everything else. Concurrent lookups share the
+    same upstream request.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        """
+        Args:
+            ttl: Seconds a fetched price is reused (QUOTE_CACHE_TTL, default 10)
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv("QUOTE_CACHE_TTL", "10"))
+        self._cache: TTLCache = TTLCache(maxsize=2048, ttl=self.ttl)
+        self._flight = SingleFlight("quotes")
+
+    @staticmethod
+    def _normalize(instrument: str) -> str:
+        return instrument.upper().replace("/", "")
+
+    async def get_price(self, instrument: str) -> Optional[float]:
+        """Last price of one instrument (None when no source has it)"""
+        quote = (await self.get_quotes([instrument])).get(self._normalize(instrument))
+        return quote.price if quote is not None else None
+
+    async def get_quotes(self, instruments: List[str]) -> Dict[str, Optional[Quote]]:
+        """
+        Last prices for many instruments with as few upstream requests as possible.
+
+        Returns:
+            Dict normalized instrument -> Quote, or None when no price is available
+        """
+        result: Dict[str, Optional[Quote]] = {}
+        crypto, others = [], []
+        for instrument in dict.fromkeys(self._normalize(i) for i in instruments):
+            quote = self._cache.get(instrument)
+            if quote is None:
+                quote = self._from_streams(instrument)
+            if quote is not None:
+                result[instrument] = quote
+                chart_metrics.increment("quotes.local")
+                continue
+            (crypto if instrument_registry.market(instrument) == "crypto" else others).append(instrument)
+
+        fetches = []
+        if crypto:
+            fetches.append(self._fetch_crypto(crypto))
+        if others:
+            fetches.append(self._fetch_yahoo(others))
+        for quotes in await asyncio.gather(*fetches):
+            result.update(quotes)
+        chart_metrics.increment("quotes.fetched", len(crypto) + len(others))
+        return result
+
+    def _from_streams(self, instrument: str) -> Optional[Quote]:
+        tick = alltick_stream.get_tick(instrument)
+        if tick is not None:
+            return Quote(instrument, tick.price, "alltick", tick.ts)
+        price = kline_stream.get_price(instrument)
+        if price is not None:
+            return Quote(instrument, price, "binance_stream", time.time())
+        return None
+
+    async def _fetch_crypto(self, instruments: List[str]) -> Dict[str, Optional[Quote]]:
+        # All concurrent crypto lookups share one all-symbols request (weight 4)
+        prices = await self._flight.do("binance", BinanceProvider.get_ticker_prices)
+        now = time.time()
+        quotes = {}
+        for instrument in instruments:
+            price = prices.get(BinanceProvider._format_symbol(instrument))
+            quotes[instrument] = Quote(instrument, price, "binance", now) if price is not None else None
+            if price is not None:
+                self._cache[instrument] = quotes[instrument]
+        return quotes
+
+    async def _fetch_yahoo(self, instruments: List[str]) -> Dict[str, Optional[Quote]]:
+        tickers = {instrument: YahooFinanceProvider._format_symbol(instrument, is_crypto=False, is_commodity=False)
+                   for instrument in instruments}
+        unique = sorted(set(tickers.values()))
+        # Identical concurrent batches share one download
+        frames = await self._flight.do(("yahoo",) + tuple(unique), lambda: self._download_yahoo(unique))
+        now = time.time()
+        quotes = {}
+        for instrument, ticker in tickers.items():
+            frame = frames.get(ticker)
+            close = frame["Close"].dropna() if frame is not None and "Close" in frame.columns else None
+            if close is None or close.empty:
+                quotes[instrument] = None
+                continue
+            quotes[instrument] = Quote(instrument, float(close.iloc[-1]), "yahoo", now)
+            self._cache[instrument] = quotes[instrument]
+        return quotes
+
+    @staticmethod
+    async def _download_yahoo(tickers: List[str]):
+        await YahooFinanceProvider._wait_for_rate_limit()
+        # Today's 1m bars of every ticker in one request; the last close is the quote
+        return await YahooFinanceProvider._download_batch(tickers, "1m", None, None, period="1d", timeout=15)
+
+
+# Shared quote service
+quote_service = QuoteService()
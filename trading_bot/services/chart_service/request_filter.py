@@ -0,0 +1,154 @@
+import os
+import logging
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse
+
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Resource types a chart screenshot never needs (the chart itself is drawn on canvas)
+DEFAULT_BLOCKED_RESOURCE_TYPES = "image,media,font"
+
+# Analytics, ads, social widgets and tracking pixels loaded by TradingView pages
+DEFAULT_BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "adservice.google.com",
+    "facebook.net",
+    "facebook.com",
+    "twitter.com",
+    "ads-twitter.com",
+    "licdn.com",
+    "linkedin.com",
+    "bat.bing.com",
+    "hotjar.com",
+    "amplitude.com",
+    "segment.io",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "yandex.ru",
+    "telemetry.tradingview.com",
+)
+
+# Typical response sizes (bytes) used until a resource type has been observed on loaded responses
+DEFAULT_SIZE_ESTIMATES = {
+    "image": 15000,
+    "font": 30000,
+    "media": 100000,
+    "script": 40000,
+    "stylesheet": 20000,
+    "xhr": 2000,
+    "fetch": 2000,
+}
+
+
+class RequestFilter:
+    """Playwright route filter that aborts non-essential requests and reports the traffic saved per capture"""
+
+    def __init__(self):
+        """Load the filter configuration from the environment"""
+        self.enabled = os.getenv("TRADINGVIEW_REQUEST_FILTER", "true").lower() == "true"
+        self.blocked_resource_types = {
+            t.strip() for t in os.getenv("TRADINGVIEW_BLOCK_RESOURCE_TYPES", DEFAULT_BLOCKED_RESOURCE_TYPES).split(",") if t.strip()
+        }
+        extra_hosts = [h.strip() for h in os.getenv("TRADINGVIEW_BLOCK_HOSTS", "").split(",") if h.strip()]
+        self.blocked_hosts = tuple(DEFAULT_BLOCKED_HOSTS) + tuple(extra_hosts)
+
+        # Active capture reports keyed by page
+        self._reports: Dict[Any, Dict[str, Any]] = {}
+        # Running average response size per resource type, used to estimate bytes saved
+        self._avg_size: Dict[str, float] = {}
+        self._size_samples: Dict[str, int] = {}
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        """Decide if a request is non-essential for a chart screenshot"""
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = urlparse(url).hostname or ""
+        return any(host == blocked or host.endswith("." + blocked) for blocked in self.blocked_hosts)
+
+    async def attach(self, context) -> None:
+        """Install the route filter on a browser context"""
+        if not self.enabled:
+            logger.info("TradingView request filter disabled.")
+            return
+        await context.route("**/*", self.handle_route)
+        logger.info(f"Request filter installed (types: {sorted(self.blocked_resource_types)}, hosts: {len(self.blocked_hosts)}).")
+
+    async def handle_route(self, route) -> None:
+        """Abort or continue a single intercepted request"""
+        request = route.request
+        try:
+            if self.should_block(request.resource_type, request.url):
+                report = self._report_for(request)
+                if report is not None:
+                    report['blocked_requests'] += 1
+                    by_type = report['blocked_by_type']
+                    by_type[request.resource_type] = by_type.get(request.resource_type, 0) + 1
+                await route.abort()
+            else:
+                await route.continue_()
+        except Exception as e:
+            # The page may already be closed; nothing left to route
+            logger.debug(f"Route handling failed for {request.url}: {e}")
+
+    def _report_for(self, request) -> Optional[Dict[str, Any]]:
+        try:
+            return self._reports.get(request.frame.page)
+        except Exception:
+            # Requests from service workers have no frame
+            return None
+
+    def start_capture(self, page) -> None:
+        """Start collecting a traffic report for a page"""
+        self._reports[page] = {
+            'blocked_requests': 0,
+            'blocked_by_type': {},
+            'loaded_requests': 0,
+            'loaded_bytes': 0,
+        }
+        page.on('response', self._on_response)
+
+    def _on_response(self, response) -> None:
+        report = self._report_for(response.request)
+        if report is None:
+            return
+        size = response.headers.get('content-length')
+        report['loaded_requests'] += 1
+        if size and size.isdigit():
+            size = int(size)
+            report['loaded_bytes'] += size
+            resource_type = response.request.resource_type
+            samples = self._size_samples.get(resource_type, 0) + 1
+            previous = self._avg_size.get(resource_type, 0.0)
+            self._avg_size[resource_type] = previous + (size - previous) / samples
+            self._size_samples[resource_type] = samples
+
+    def finish_capture(self, page) -> Optional[Dict[str, Any]]:
+        """
+        Finish the traffic report of a page and record it in the chart metrics.
+
+        The saved bytes are an estimate: blocked requests are never downloaded, so their
+        size is taken from the average size of loaded responses of the same resource type,
+        or from DEFAULT_SIZE_ESTIMATES when that type has not been loaded yet.
+        """
+        report = self._reports.pop(page, None)
+        if report is None:
+            return None
+
+        report['estimated_saved_bytes'] = int(sum(
+            count * self._avg_size.get(resource_type, DEFAULT_SIZE_ESTIMATES.get(resource_type, 5000))
+            for resource_type, count in report['blocked_by_type'].items()
+        ))
+
+        chart_metrics.record("network.blocked_requests", report['blocked_requests'])
+        chart_metrics.record("network.loaded_requests", report['loaded_requests'])
+        chart_metrics.record("network.loaded_bytes", report['loaded_bytes'])
+        chart_metrics.record("network.estimated_saved_bytes", report['estimated_saved_bytes'])
+        chart_metrics.increment("network.blocked_requests_total", report['blocked_requests'])
+        return report
@@ -1,86 +1,242 @@
 import asyncio
 import os
+import time
 import logging
-from datetime import datetime, timedelta
-from trading_bot.services.chart_service.tradingview_session import TradingViewSessionService
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Optional, Callable, Awaitable, List, Tuple
+
+import aiohttp
+
+from trading_bot.services.chart_service.metrics import chart_metrics
 
 logger = logging.getLogger(__name__)
 
+# Called with the new session id; pushes it into a live browser context / worker
+SessionConsumer = Callable[[str], Awaitable[None]]
+
+
 class SessionRefresher:
-    def __init__(self, refresh_interval_hours=12):
-        """Initialize the session refresher"""
-        self.refresh_interval = timedelta(hours=refresh_interval_hours)
-        self.last_refresh = datetime.now()
-        self.username = os.getenv("TRADINGVIEW_USERNAME", "")
-        self.password = os.getenv("TRADINGVIEW_PASSWORD", "")
-        self.session_id = os.getenv("TRADINGVIEW_SESSION_ID", "")
+    """
+    Keeps the TradingView session cookie valid.
+
+    Validity is checked with a plain HTTP request carrying the sessionid cookie instead of a
+    browser login. The expiry of the cookie is tracked so a new session is fetched just before
+    it runs out (or as soon as a probe finds it invalid), and every registered consumer gets
+    the new cookie pushed into its running browser contexts.
+    """
+
+    def __init__(self, session_id: Optional[str] = None):
+        """Load the probe and refresh settings from the environment"""
+        self.session_id = session_id or os.getenv("TRADINGVIEW_SESSION_ID", "")
+
+        # Cheap logged-in check: a page that contains the marker only for an authenticated user
+        self.probe_url = os.getenv("TRADINGVIEW_SESSION_PROBE_URL", "https://www.tradingview.com/")
+        self.probe_marker = os.getenv("TRADINGVIEW_SESSION_PROBE_MARKER", '"is_authenticated":true')
+        self.probe_interval = float(os.getenv("TRADINGVIEW_SESSION_PROBE_INTERVAL_MINUTES", "60")) * 60
+        # Lifetime assumed when TradingView does not send an expiry for the cookie
+        self.assumed_lifetime = float(os.getenv("TRADINGVIEW_SESSION_MAX_AGE_HOURS", "168")) * 3600
+        self.refresh_margin = float(os.getenv("TRADINGVIEW_SESSION_REFRESH_MARGIN_MINUTES", "30")) * 60
+        self.retry_after = float(os.getenv("TRADINGVIEW_SESSION_RETRY_MINUTES", "15")) * 60
+
+        self.expires_at: Optional[float] = None
+        # True when expires_at comes from TradingView, False when it is the assumed lifetime
+        self.expiry_known = False
+        self.last_refresh: Optional[datetime] = None
+        self.is_valid: Optional[bool] = None
         self.is_running = False
-    
+        self._consumers: List[SessionConsumer] = []
+
+    def register_consumer(self, consumer: SessionConsumer) -> None:
+        """Register a callback that receives every new session id"""
+        if consumer not in self._consumers:
+            self._consumers.append(consumer)
+
+    async def probe(self, session_id: Optional[str] = None) -> Tuple[Optional[bool], Optional[float]]:
+        """
+        Check a session id with a single HTTP request.
+
+        Returns:
+            (valid, expires_at): valid is None when the probe itself failed (network error,
+            unexpected status), expires_at is a unix timestamp when the response carried one
+        """
+        session_id = session_id or self.session_id
+        if not session_id:
+            return False, None
+
+        start = time.perf_counter()
+        try:
+            timeout = aiohttp.ClientTimeout(total=15)
+            async with aiohttp.ClientSession(timeout=timeout, cookies={"sessionid": session_id}) as session:
+                async with session.get(self.probe_url, allow_redirects=False,
+                                       headers={"User-Agent": "Mozilla/5.0", "Accept-Language": "en"}) as response:
+                    if response.status in (301, 302, 303, 307, 308):
+                        # Redirected to the sign-in page
+                        if "signin" in response.headers.get("Location", ""):
+                            return False, None
+                        return None, None
+                    if response.status != 200:
+                        logger.warning(f"TradingView session probe returned HTTP {response.status}")
+                        return None, None
+
+                    body = await response.text()
+                    return self.probe_marker in body, self._cookie_expiry(response)
+        except Exception as e:
+            logger.warning(f"TradingView session probe failed: {str(e)}")
+            return None, None
+        finally:
+            chart_metrics.record("session.probe_time", time.perf_counter() - start)
+
+    @staticmethod
+    def _cookie_expiry(response) -> Optional[float]:
+        """Expiry of a sessionid cookie set by the response (Max-Age or Expires)"""
+        morsel = response.cookies.get("sessionid")
+        if morsel is None:
+            return None
+        try:
+            if morsel["max-age"]:
+                return time.time() + int(morsel["max-age"])
+            if morsel["expires"]:
+                return parsedate_to_datetime(morsel["expires"]).timestamp()
+        except (ValueError, TypeError):
+            pass
+        return None
+
+    def _seconds_until_check(self) -> float:
+        """Next probe: the regular interval, or earlier when the session is about to expire"""
+        wait = self.probe_interval
+        if self.expires_at:
+            wait = min(wait, self.expires_at - self.refresh_margin - time.time())
+        return max(wait, 0)
+
+    async def check(self) -> bool:
+        """Probe the current session and refresh it when it is invalid or about to expire"""
+        valid, expires_at = await self.probe()
+        self.is_valid = valid
+        if expires_at:
+            self.expires_at = expires_at
+            self.expiry_known = True
+        elif valid and not self.expiry_known:
+            # No expiry from the server: a working session only expires after it stops working,
+            # so the assumed lifetime moves forward with every valid probe
+            self.expires_at = time.time() + self.assumed_lifetime
+        chart_metrics.set_gauge("session.valid", valid)
+        chart_metrics.set_gauge("session.expires_in", self.expires_at - time.time() if self.expires_at else None)
+
+        about_to_expire = self.expires_at is not None and time.time() >= self.expires_at - self.refresh_margin
+        if valid is False or about_to_expire:
+            logger.info("TradingView session " + ("is no longer valid" if valid is False else "is about to expire") + ", refreshing")
+            return await self.refresh_session()
+        # A failed probe (None) is not a reason to throw away a working session
+        return valid is not False
+
     async def start(self):
-        """Start the session refresher"""
+        """Check the session until stopped, sleeping until the next probe or expiry"""
         self.is_running = True
         while self.is_running:
-            # Controleer of de session ID moet worden vernieuwd
-            if datetime.now() - self.last_refresh >= self.refresh_interval:
-                await self.refresh_session()
-            
-            # Wacht een uur voordat we opnieuw controleren
-            await asyncio.sleep(3600)
-    
-    async def refresh_session(self):
-        """Refresh the session ID"""
+            try:
+                ok = await self.check()
+            except Exception as e:
+                logger.error(f"Error checking TradingView session: {str(e)}")
+                ok = False
+            wait = self._seconds_until_check() if ok else self.retry_after
+            await asyncio.sleep(max(wait, 60))
+
+    async def _new_session_id(self) -> Optional[str]:
+        """Get a fresh session id: an updated .env/environment value first, a logged-in browser session second"""
+        candidate = self._read_env_file().get("TRADINGVIEW_SESSION_ID") or os.getenv("TRADINGVIEW_SESSION_ID", "")
+        if candidate and candidate != self.session_id:
+            valid, _ = await self.probe(candidate)
+            if valid:
+                logger.info("Using updated TRADINGVIEW_SESSION_ID from the environment")
+                return candidate
+
+        # Fall back to a browser session (Playwright) and use it when it turns out to be logged in
+        from trading_bot.services.chart_service.tradingview_session import TradingViewSessionService
+        service = TradingViewSessionService(session_id=candidate or None)
         try:
-            logger.info("Refreshing TradingView session ID")
-            
-            # Maak een nieuwe TradingViewSessionService
-            service = TradingViewSessionService()
-            
-            # Initialiseer de service
             initialized = await service.initialize()
-            
             if initialized and service.is_logged_in and service.session_id:
-                # Update de session ID
-                self.session_id = service.session_id
-                self.last_refresh = datetime.now()
-                
-                # Update de omgevingsvariabele
-                os.environ["TRADINGVIEW_SESSION_ID"] = self.session_id
-                
-                # Update het .env bestand
-                env_file = ".env"
-                
-                if os.path.exists(env_file):
-                    # Lees het bestaande .env bestand
-                    with open(env_file, "r") as f:
-                        lines = f.readlines()
-                    
-                    # Controleer of TRADINGVIEW_SESSION_ID al bestaat
-                    session_id_exists = False
-                    
-                    for i, line in enumerate(lines):
-                        if line.startswith("TRADINGVIEW_SESSION_ID="):
-                            lines[i] = f"TRADINGVIEW_SESSION_ID={self.session_id}\n"
-                            session_id_exists = True
-                            break
-                    
-                    # Voeg TRADINGVIEW_SESSION_ID toe als het niet bestaat
-                    if not session_id_exists:
-                        lines.append(f"TRADINGVIEW_SESSION_ID={self.session_id}\n")
-                    
-                    # Schrijf terug naar het .env bestand
-                    with open(env_file, "w") as f:
-                        f.writelines(lines)
-                
-                logger.info(f"Session ID refreshed: {self.session_id[:10]}...")
-            else:
-                logger.error("Failed to refresh session ID")
-            
-            # Ruim de service op
+                return service.session_id
+        finally:
             await service.cleanup()
-            
+        logger.error("TradingView session expired and no logged-in session could be established; "
+                     "set a new TRADINGVIEW_SESSION_ID")
+        return None
+
+    async def refresh_session(self) -> bool:
+        """Refresh the session ID and push it to all consumers"""
+        try:
+            logger.info("Refreshing TradingView session ID")
+            chart_metrics.increment("session.refreshes")
+
+            session_id = await self._new_session_id()
+            if not session_id:
+                logger.error("Failed to refresh session ID")
+                chart_metrics.increment("session.refresh_errors")
+                return False
+
+            self.session_id = session_id
+            self.last_refresh = datetime.now()
+            self.is_valid = True
+            valid, expires_at = await self.probe(session_id)
+            self.expires_at = expires_at or time.time() + self.assumed_lifetime
+            self.expiry_known = expires_at is not None
+
+            # Update de omgevingsvariabele en het .env bestand (voor een herstart)
+            os.environ["TRADINGVIEW_SESSION_ID"] = self.session_id
+            self._write_env_file()
+
+            # Nieuwe cookie direct in de draaiende browser contexts zetten
+            for consumer in self._consumers:
+                try:
+                    await consumer(self.session_id)
+                except Exception as e:
+                    logger.error(f"Error pushing new session to {getattr(consumer, '__qualname__', consumer)}: {str(e)}")
+
+            logger.info(f"Session ID refreshed: {self.session_id[:10]}...")
+            return True
+
         except Exception as e:
             logger.error(f"Error refreshing session ID: {str(e)}")
-    
+            chart_metrics.increment("session.refresh_errors")
+            return False
+
+    @staticmethod
+    def _read_env_file(env_file: str = ".env") -> dict:
+        values = {}
+        if os.path.exists(env_file):
+            with open(env_file, "r") as f:
+                for line in f:
+                    if "=" in line and not line.lstrip().startswith("#"):
+                        key, value = line.rstrip("\n").split("=", 1)
+                        values[key.strip()] = value.strip()
+        return values
+
+    def _write_env_file(self, env_file: str = ".env") -> None:
+        if not os.path.exists(env_file):
+            return
+
+        # Lees het bestaande .env bestand
+        with open(env_file, "r") as f:
+            lines = f.readlines()
+
+        # Controleer of TRADINGVIEW_SESSION_ID al bestaat
+        session_id_exists = False
+        for i, line in enumerate(lines):
+            if line.startswith("TRADINGVIEW_SESSION_ID="):
+                lines[i] = f"TRADINGVIEW_SESSION_ID={self.session_id}\n"
+                session_id_exists = True
+                break
+
+        # Voeg TRADINGVIEW_SESSION_ID toe als het niet bestaat
+        if not session_id_exists:
+            lines.append(f"TRADINGVIEW_SESSION_ID={self.session_id}\n")
+
+        # Schrijf terug naar het .env bestand
+        with open(env_file, "w") as f:
+            f.writelines(lines)
+
     async def stop(self):
         """Stop the session refresher"""
-        self.is_running = False 
+        self.is_running = False
@@ -0,0 +1,360 @@
+import os
+import json
+import asyncio
+import logging
+import time
+import warnings
+from typing import Optional, Dict, List, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trading_bot.services.chart_service.binance_provider import BinanceProvider
+from trading_bot.services.chart_service.candle_store import candle_store
+from trading_bot.services.chart_service.indicators import ema_numpy, rsi_numpy, MACD_FAST, MACD_SLOW, MACD_SIGNAL
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service.yfinance_provider import YahooFinanceProvider, INDICATOR_WARMUP_BARS
+from trading_bot.services.instrument_registry import instrument_registry
+
+logger = logging.getLogger(__name__)
+
+# Bars the analysis is based on (as the on-demand path: 300 plus the indicator warm-up)
+ANALYSIS_BARS = 300
+SNAPSHOT_BARS = ANALYSIS_BARS + INDICATOR_WARMUP_BARS
+
+
+def _column(df: pd.DataFrame, name: str) -> np.ndarray:
+    # Yahoo frames use Open/High/..., Binance frames open/high/...
+    return df[name if name in df.columns else name.lower()].to_numpy(dtype=float)
+
+
+def store_key(instrument: str, interval: str = "1h") -> Tuple[str, str, str]:
+    """Candle store series (source, symbol, interval) an instrument's candles are kept under"""
+    if instrument_registry.market(instrument) == 'crypto':
+        return ("binance", BinanceProvider._format_symbol(instrument), interval)
+    return ("yahoo", YahooFinanceProvider._format_symbol(instrument, is_crypto=False, is_commodity=False), interval)
+
+
+def stack_frames(frames: Dict[str, pd.DataFrame]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Stack candle frames into 2-D arrays, one row per instrument: (names, close, high, low, ts).
+
+    Shorter series are padded at the front with their first close, which leaves the EMAs
+    unchanged (they start at the first close); high/low are NaN and ts is int64 min there, so the
+    padding stays out of the high/low windows.
+    """
+    names = [name for name, df in frames.items() if df is not None and not df.empty]
+    width = max((len(frames[name]) for name in names), default=0)
+    close = np.empty((len(names), width))
+    high = np.full((len(names), width), np.nan)
+    low = np.full((len(names), width), np.nan)
+    ts = np.full((len(names), width), np.iinfo(np.int64).min, dtype=np.int64)
+
+    for row, name in enumerate(names):
+        df = frames[name]
+        pad = width - len(df)
+        closes = _column(df, "Close")
+        close[row, :pad] = closes[0]
+        close[row, pad:] = closes
+        high[row, pad:] = _column(df, "High")
+        low[row, pad:] = _column(df, "Low")
+        ts[row, pad:] = pd.DatetimeIndex(df.index).asi8 // 10**9
+    return names, close, high, low, ts
+
+
+def compute_snapshots(frames: Dict[str, pd.DataFrame]) -> Dict[str, Dict[str, Any]]:
+    """
+    Latest price, EMA 20/50/200, RSI 14, MACD and daily/weekly high-low for many instruments in
+    one vectorized pass over the stacked series (see stack_frames).
+
+    Args:
+        frames: instrument -> H1 candles (oldest first, DatetimeIndex in UTC)
+    """
+    names, close, high, low, ts = stack_frames(frames)
+    if not names:
+        return {}
+
+    ema_fast, ema_slow = ema_numpy(close, MACD_FAST), ema_numpy(close, MACD_SLOW)
+    macd = ema_fast - ema_slow
+    signal = ema_numpy(macd, MACD_SIGNAL)
+    ema_20 = ema_numpy(close, 20)[:, -1]
+    ema_50 = ema_numpy(close, 50)[:, -1]
+    ema_200 = ema_numpy(close, 200)[:, -1]
+    rsi = rsi_numpy(close)[:, -1]
+
+    # High/low of the last 24 hours and 7 days before the last bar, for all rows at once
+    last_ts = ts[:, -1:]
+    daily = ts >= last_ts - 24 * 3600
+    weekly = ts >= last_ts - 7 * 24 * 3600
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN rows
+        daily_high = np.nanmax(np.where(daily, high, np.nan), axis=1)
+        daily_low = np.nanmin(np.where(daily, low, np.nan), axis=1)
+        weekly_high = np.nanmax(np.where(weekly, high, np.nan), axis=1)
+        weekly_low = np.nanmin(np.where(weekly, low, np.nan), axis=1)
+
+    now = time.time()
+    return {
+        name: {
+            "price": float(close[row, -1]),
+            "ema_20": float(ema_20[row]),
+            "ema_50": float(ema_50[row]),
+            "ema_200": float(ema_200[row]),
+            "rsi": float(rsi[row]),
+            "macd": float(macd[row, -1]),
+            "macd_signal": float(signal[row, -1]),
+            "daily_high": float(daily_high[row]),
+            "daily_low": float(daily_low[row]),
+            "weekly_high": float(weekly_high[row]),
+            "weekly_low": float(weekly_low[row]),
+            "candle_time": int(ts[row, -1]),
+            "generated_at": now,
+        }
+        for row, name in enumerate(names)
+    }
+
+
+def format_analysis(instrument: str, snapshot: Dict[str, Any], precision: int, market_type: str,
+                    timeframe: str = "H1") -> str:
+    """The Telegram (HTML) technical analysis text for one snapshot"""
+    current_price = snapshot["price"]
+    ema_20, ema_50, ema_200 = snapshot["ema_20"], snapshot["ema_50"], snapshot["ema_200"]
+    rsi = snapshot["rsi"]
+    macd_line, macd_signal = snapshot["macd"], snapshot["macd_signal"]
+    daily_high, daily_low = snapshot["daily_high"], snapshot["daily_low"]
+    weekly_high, weekly_low = snapshot["weekly_high"], snapshot["weekly_low"]
+
+    display_name = instrument # Default
+    # Simple formatting (e.g., EURUSD -> EUR/USD)
+    if len(instrument) == 6 and market_type != 'crypto':
+        display_name = f"{instrument[:3]}/{instrument[3:]}"
+
+    # Build the analysis string
+    analysis_lines = []
+    analysis_lines.append(f"<b>📊 Technical Analysis: {display_name} ({timeframe})</b>")
+    analysis_lines.append("") # Newline
+
+    analysis_lines.append(f"Price: {current_price:.{precision}f}")
+    analysis_lines.append("")
+
+    analysis_lines.append("🔑 <b>Key Levels (Approx. based on H1 data):</b>")
+    if daily_low is not None and not pd.isna(daily_low):
+        analysis_lines.append(f"Daily Low:   {daily_low:.{precision}f}")
+    else: analysis_lines.append("Daily Low:   N/A")
+    if daily_high is not None and not pd.isna(daily_high):
+        analysis_lines.append(f"Daily High:  {daily_high:.{precision}f}")
+    else: analysis_lines.append("Daily High:  N/A")
+    if weekly_low is not None and not pd.isna(weekly_low):
+        analysis_lines.append(f"Weekly Low:  {weekly_low:.{precision}f}")
+    else: analysis_lines.append("Weekly Low:  N/A")
+    if weekly_high is not None and not pd.isna(weekly_high):
+        analysis_lines.append(f"Weekly High: {weekly_high:.{precision}f}")
+    else: analysis_lines.append("Weekly High: N/A")
+    analysis_lines.append("")
+
+    analysis_lines.append("📈 <b>Technical Indicators:</b>")
+    if rsi is not None and not pd.isna(rsi):
+        rsi_status = "Overbought" if rsi > 70 else "Oversold" if rsi < 30 else "Neutral"
+        analysis_lines.append(f"RSI(14): {rsi:.2f} ({rsi_status})")
+    else: analysis_lines.append("RSI(14): N/A")
+
+    if macd_line is not None and macd_signal is not None and not pd.isna(macd_line) and not pd.isna(macd_signal):
+        macd_cross = "Bullish" if macd_line > macd_signal else "Bearish"
+        analysis_lines.append(f"MACD(12,26,9): {macd_line:.{precision+1}f} / Signal: {macd_signal:.{precision+1}f} ({macd_cross})") # Use more precision for MACD
+    else: analysis_lines.append("MACD(12,26,9): N/A")
+
+    analysis_lines.append("")
+    analysis_lines.append("📉 <b>Moving Averages:</b>")
+    if ema_20 is not None and not pd.isna(ema_20):
+        analysis_lines.append(f"EMA(20): {ema_20:.{precision}f} {'(Above Price)' if current_price > ema_20 else '(Below Price)' if current_price < ema_20 else ''}\n")
+    else: analysis_lines.append("EMA(20): N/A\n")
+    if ema_50 is not None and not pd.isna(ema_50):
+        analysis_lines.append(f"EMA(50): {ema_50:.{precision}f} {'(Above Price)' if current_price > ema_50 else '(Below Price)' if current_price < ema_50 else ''}\n")
+    else: analysis_lines.append("EMA(50): N/A\n")
+    if ema_200 is not None and not pd.isna(ema_200):
+        analysis_lines.append(f"EMA(200): {ema_200:.{precision}f} {'(Above Price)' if current_price > ema_200 else '(Below Price)' if current_price < ema_200 else ''}\n")
+    else: analysis_lines.append("EMA(200): N/A\n")
+
+    # Simple Trend Suggestion based on EMAs
+    trend_suggestion = "Neutral"
+    if ema_20 is not None and ema_50 is not None and ema_200 is not None:
+        if current_price > ema_20 > ema_50 > ema_200:
+            trend_suggestion = "Strong Bullish"
+        elif current_price > ema_50 > ema_200:
+            trend_suggestion = "Bullish"
+        elif current_price < ema_20 < ema_50 < ema_200:
+            trend_suggestion = "Strong Bearish"
+        elif current_price < ema_50 < ema_200:
+            trend_suggestion = "Bearish"
+        else:
+            trend_suggestion = "Mixed/Sideways"
+    analysis_lines.append("")
+    analysis_lines.append(f"📊 <b>Trend Suggestion:</b> {trend_suggestion}")
+
+    analysis_lines.append("")
+    analysis_lines.append("⚠️ <i>Disclaimer: Calculated analysis. Not financial advice.</i>")
+
+    return "\n".join(analysis_lines)
+
+
+class SnapshotCache:
+    """
+    TA snapshots per instrument: in-process, and in Redis when REDIS_URL is set so every bot
+    process shares the job's results.
+    """
+
+    def __init__(self, ttl: int):
+        """
+        Args:
+            ttl: Seconds a snapshot stays valid (a bit more than one H1 candle)
+        """
+        self.ttl = ttl
+        self.redis_url = os.getenv("REDIS_URL")
+        self._local: Dict[str, Dict[str, Any]] = {}
+        self._redis = None
+        self._redis_down_until = 0.0
+
+    def _client(self):
+        if not self.redis_url or time.time() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+                self._redis = aioredis.from_url(self.redis_url, decode_responses=True)
+            except ImportError:
+                logger.warning("redis is not installed, TA snapshots are only cached in-process")
+                self.redis_url = None
+        return self._redis
+
+    def _redis_failed(self, e: Exception) -> None:
+        logger.warning(f"Redis unavailable for TA snapshots: {str(e)}. Using the local cache for 60s")
+        self._redis_down_until = time.time() + 60
+
+    @staticmethod
+    def _key(instrument: str) -> str:
+        return f"ta_snapshot:{instrument}"
+
+    async def set_many(self, snapshots: Dict[str, Dict[str, Any]]) -> None:
+        self._local.update(snapshots)
+        client = self._client()
+        if client is None or not snapshots:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for instrument, snapshot in snapshots.items():
+                    pipe.set(self._key(instrument), json.dumps(snapshot), ex=self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            self._redis_failed(e)
+
+    async def get(self, instrument: str) -> Optional[Dict[str, Any]]:
+        snapshot = self._local.get(instrument)
+        if snapshot is None:
+            client = self._client()
+            if client is not None:
+                try:
+                    raw = await client.get(self._key(instrument))
+                    if raw:
+                        snapshot = json.loads(raw)
+                        self._local[instrument] = snapshot
+                except Exception as e:
+                    self._redis_failed(e)
+        if snapshot is None or time.time() - snapshot.get("generated_at", 0) > self.ttl:
+            return None
+        return snapshot
+
+
+class TASnapshotJob:
+    """
+    Computes the technical analysis of every served instrument shortly after each H1 candle
+    closes, so ChartService.get_technical_analysis only needs a cache lookup.
+    """
+
+    def __init__(self):
+        """Load the job configuration from the environment"""
+        # Wait after the candle close so the providers have the closed bar
+        self.delay = float(os.getenv("TA_SNAPSHOT_DELAY_SECONDS", "90"))
+        self._instruments = [i.strip().upper() for i in os.getenv("TA_SNAPSHOT_INSTRUMENTS", "").split(",") if i.strip()]
+        self._chart_service = None
+        self._task = None
+
+    def start(self, chart_service) -> None:
+        """Start the job (idempotent); `chart_service` fetches the data"""
+        if self._task is not None and not self._task.done():
+            return
+        self._chart_service = chart_service
+        if not self._instruments:
+            self._instruments = list(instrument_registry.symbols())
+        self._task = asyncio.ensure_future(self._run())
+        logger.info(f"TA snapshot job started for {len(self._instruments)} instruments")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def _seconds_until_next_run(self) -> float:
+        now = time.time()
+        next_close = (now // 3600 + 1) * 3600
+        if now < next_close - 3600 + self.delay:
+            # Still within the delay after the previous close
+            next_close -= 3600
+        return max(next_close + self.delay - now, 1.0)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error generating TA snapshots: {str(e)}")
+                chart_metrics.increment("ta_snapshots.errors")
+            await asyncio.sleep(self._seconds_until_next_run())
+
+    async def run_once(self) -> Dict[str, Dict[str, Any]]:
+        """Refresh the candles, compute all snapshots and publish them"""
+        service = self._chart_service
+        start = time.perf_counter()
+
+        store_keys = {}
+        yahoo_instruments, crypto_instruments = [], []
+        yahoo_interval = YahooFinanceProvider._map_timeframe_to_yfinance("H1")
+        for instrument in self._instruments:
+            if instrument_registry.market(instrument) == 'crypto':
+                key = store_key(instrument, "1h")
+                if key not in store_keys.values():
+                    crypto_instruments.append(instrument)
+            else:
+                key = store_key(instrument, yahoo_interval)
+                # Instruments on the same feed (USOIL, XTIUSD) share one download
+                if key not in store_keys.values():
+                    yahoo_instruments.append(instrument)
+            store_keys[instrument] = key
+
+        # Bring the candle store up to date: one batched Yahoo download, Binance from REST. The Yahoo
+        # caches are bypassed, a result from just before the close does not have the new bar yet
+        await service.prefetch_market_data(yahoo_instruments, limit=ANALYSIS_BARS, force=True)
+        for instrument in crypto_instruments:
+            await BinanceProvider.get_candles(instrument, "1h", limit=ANALYSIS_BARS, use_stream=False)
+
+        frames = {instrument: candle_store.read(*key, limit=SNAPSHOT_BARS) for instrument, key in store_keys.items()}
+        snapshots = compute_snapshots(frames)
+        for instrument, snapshot in snapshots.items():
+            market_type = 'crypto' if instrument_registry.market(instrument) == 'crypto' else 'other'
+            snapshot["analysis"] = format_analysis(instrument, snapshot, instrument_registry.precision(instrument), market_type)
+        await ta_snapshot_cache.set_many(snapshots)
+
+        elapsed = time.perf_counter() - start
+        chart_metrics.record("ta_snapshots.generation_time", elapsed)
+        chart_metrics.set_gauge("ta_snapshots.instruments", len(snapshots))
+        logger.info(f"Generated TA snapshots for {len(snapshots)}/{len(self._instruments)} instruments in {elapsed:.2f}s")
+        return snapshots
+
+
+ta_snapshot_cache = SnapshotCache(ttl=int(os.getenv("TA_SNAPSHOT_TTL", "3900")))
+ta_snapshot_job = TASnapshotJob()
@@ -0,0 +1,131 @@
+import os
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from trading_bot.services.chart_service.frame_cache import FrameCache, compact_frame, frame_view
+from trading_bot.services.chart_service.metrics import chart_metrics
+
+logger = logging.getLogger(__name__)
+
+# Timeframe -> (length in seconds, base interval it is derived from)
+TIMEFRAMES = {
+    "M15": (15 * 60, "15m"),
+    "H1": (3600, "1h"),
+    "H4": (4 * 3600, "1h"),
+    "D1": (24 * 3600, "1h"),
+}
+
+# Aliases used by the providers and callers
+_ALIASES = {"15M": "M15", "1H": "H1", "4H": "H4", "1D": "D1"}
+
+# Where a market's trading day starts (seconds after 00:00 UTC). The forex day (and the CFD
+# commodities that trade on it) rolls over at 17:00 New York = 22:00 UTC, so H4 and D1 candles
+# start at 22:00; crypto and index candles follow the UTC day.
+SESSION_OFFSETS = {
+    "forex": 22 * 3600,
+    "commodity": 22 * 3600,
+    "crypto": 0,
+    "index": 0,
+}
+
+# Resampled frames, keyed by series, timeframe and the state of the base series
+_resample_cache = FrameCache("resample", int(os.getenv("RESAMPLE_CACHE_MB", "32")) * 1024 * 1024,
+                             ttl=int(os.getenv("RESAMPLE_CACHE_TTL", "3600")))
+
+
+def normalize_timeframe(timeframe: str) -> str:
+    """'h4', '4h' -> 'H4'; unknown timeframes raise ValueError"""
+    value = timeframe.strip().upper()
+    value = _ALIASES.get(value, value)
+    if value not in TIMEFRAMES:
+        raise ValueError(f"Unsupported timeframe '{timeframe}' (supported: {', '.join(TIMEFRAMES)})")
+    return value
+
+
+def base_interval(timeframe: str) -> str:
+    """Interval of the stored series a timeframe is derived from"""
+    return TIMEFRAMES[normalize_timeframe(timeframe)][1]
+
+
+def bars_per_candle(timeframe: str) -> int:
+    """Base bars that make up one candle of `timeframe`"""
+    seconds, base = TIMEFRAMES[normalize_timeframe(timeframe)]
+    return seconds // TIMEFRAMES[normalize_timeframe(base)][0]
+
+
+def base_limit(timeframe: str, limit: int, warmup: int = 0, cap: Optional[int] = None) -> int:
+    """
+    Base bars to request so that `limit` candles of `timeframe` plus `warmup` candles of
+    indicator history can be built; the caller adds `warmup` base bars itself.
+    """
+    factor = bars_per_candle(timeframe)
+    rows = limit * factor + warmup * (factor - 1)
+    return min(rows, cap - warmup) if cap else rows
+
+
+def resample_candles(df: pd.DataFrame, timeframe: str, market: str = "forex") -> pd.DataFrame:
+    """
+    Aggregate base candles (oldest first, DatetimeIndex) into `timeframe` candles aligned to the
+    market's session start. Open/High/Low/Close/Volume in either case are supported; other
+    columns are dropped. Buckets are computed on integer timestamps and reduced with NumPy
+    (reduceat), without a pandas resample per call.
+    """
+    seconds, _ = TIMEFRAMES[normalize_timeframe(timeframe)]
+    if df.empty:
+        return df.iloc[:0]
+    index = pd.DatetimeIndex(df.index)
+    # 22:00 UTC session start: D1 buckets start at 22:00, H4 at 02:00/06:00/.../22:00
+    offset = SESSION_OFFSETS.get(market, 0) % seconds
+    ts = index.asi8 // 10**9
+    buckets = (ts - offset) // seconds
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(ts)])) - 1
+
+    def column(name: str) -> Optional[str]:
+        for candidate in (name, name.lower()):
+            if candidate in df.columns:
+                return candidate
+        return None
+
+    data = {}
+    for name, reduce in (("Open", None), ("High", np.maximum), ("Low", np.minimum), ("Close", None), ("Volume", np.add)):
+        col = column(name)
+        if col is None:
+            continue
+        values = df[col].to_numpy(dtype=float)
+        if name == "Open":
+            data[col] = values[starts]
+        elif name == "Close":
+            data[col] = values[ends]
+        elif name == "Volume":
+            data[col] = reduce.reduceat(np.nan_to_num(values), starts)
+        else:
+            data[col] = reduce.reduceat(values, starts)
+
+    labels = pd.to_datetime(buckets[starts] * seconds + offset, unit="s", utc=index.tz is not None)
+    if index.tz is not None:
+        labels = labels.tz_convert(index.tz)
+    return pd.DataFrame(data, index=labels.rename(index.name))
+
+
+def resample_cached(df: pd.DataFrame, timeframe: str, market: str, series_key: Tuple) -> pd.DataFrame:
+    """
+    resample_candles with a cache: as long as the base series has the same span and last close,
+    the aggregated frame is shared (as a read-only view) instead of recomputed.
+    """
+    if df.empty:
+        return resample_candles(df, timeframe, market)
+    close = df["Close" if "Close" in df.columns else "close"]
+    cache_key = (series_key, normalize_timeframe(timeframe), market, len(df),
+                 df.index[0].value, df.index[-1].value, float(close.iloc[-1]))
+    cached = _resample_cache.get(cache_key)
+    if cached is not None:
+        chart_metrics.increment("resample.cache_hits")
+        return frame_view(cached)
+    with chart_metrics.timer("resample.time"):
+        result = compact_frame(resample_candles(df, timeframe, market))
+    _resample_cache[cache_key] = result
+    return frame_view(result)
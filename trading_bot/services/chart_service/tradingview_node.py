@@ -2,13 +2,140 @@ import os
 import logging
 import asyncio
 import json # Needed for localStorage init script
-from typing import Optional, Dict
+import time
+from typing import Optional, Dict, Tuple
 from io import BytesIO
 from trading_bot.services.chart_service.tradingview import TradingViewService
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service.request_filter import RequestFilter
+from trading_bot.services.chart_service.browser_supervisor import BrowserSupervisor, playwright_driver_pid, DEGRADED, RECYCLING, DOWN
+from trading_bot.services.instrument_registry import instrument_registry
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
 
 logger = logging.getLogger(__name__)
 
+# Chart container selectors (layout dependent)
+CHART_CONTAINER_SELECTOR = ".chart-gui-wrapper, .chart-container, .layout__area--center"
+
+# Series data is streamed over this websocket; 'series_completed' marks a fully loaded series
+CHART_DATA_WS_HOST = "data.tradingview.com"
+SERIES_COMPLETED_MARKER = "series_completed"
+
+# XHR/fetch requests that carry chart data (layout, symbol info, studies)
+CHART_DATA_URL_PATTERNS = (
+    "charts-storage",
+    "symbol_info",
+    "/history",
+    "pine-facade",
+    "data.tradingview.com",
+)
+
+# Resolves true once a series canvas has content and the chart layout has not
+# moved for two consecutive animation frames. Evaluated with polling='raf'.
+CHART_PAINTED_JS = """
+() => {
+    const root = document.querySelector('%s');
+    if (!root) return false;
+
+    const rect = root.getBoundingClientRect();
+    const canvases = Array.from(root.querySelectorAll('canvas')).filter(c => c.width > 0 && c.height > 0);
+    const key = [rect.x, rect.y, rect.width, rect.height, canvases.length].join(',');
+    const state = window.__sigmapipsLayout || { key: null, stableFrames: 0 };
+    state.stableFrames = state.key === key ? state.stableFrames + 1 : 0;
+    state.key = key;
+    window.__sigmapipsLayout = state;
+    if (state.stableFrames < 2) return false;
+
+    // Sample each canvas on a small probe; any non-uniform pixel means it has been painted
+    const probe = document.createElement('canvas');
+    probe.width = 64;
+    probe.height = 32;
+    const ctx = probe.getContext('2d', { willReadFrequently: true });
+    for (const canvas of canvases) {
+        try {
+            ctx.clearRect(0, 0, probe.width, probe.height);
+            ctx.drawImage(canvas, 0, 0, probe.width, probe.height);
+            const data = ctx.getImageData(0, 0, probe.width, probe.height).data;
+            for (let i = 4; i < data.length; i += 4) {
+                if (data[i] !== data[0] || data[i + 1] !== data[1] || data[i + 2] !== data[2] || data[i + 3] !== data[3]) {
+                    return true;
+                }
+            }
+        } catch (e) {}
+    }
+    return false;
+}
+""" % CHART_CONTAINER_SELECTOR
+
+# Chart areas cut out of a canonical capture: the chart pane (normal) and the whole
+# centre area with price/time scales but without toolbars (fullscreen)
+NORMAL_CHART_SELECTOR = ".chart-gui-wrapper, .chart-container--has-single-pane .chart-markup-table, .layout__area--center .tv-widget-chart"
+FULLSCREEN_CHART_SELECTOR = ".layout__area--center"
+
+# Resets the layout stability counter, e.g. after toggling fullscreen
+RESET_LAYOUT_STATE_JS = "() => { window.__sigmapipsLayout = undefined; }"
+
+
+class ChartReadinessTracker:
+    """Follows chart-data network activity of a page to decide when the series is loaded"""
+
+    def __init__(self, page):
+        self.series_completed = asyncio.Event()
+        self.data_idle = asyncio.Event()
+        self.data_idle.set()
+        self._pending = set()
+
+        page.on('websocket', self._on_websocket)
+        page.on('request', self._on_request)
+        page.on('requestfinished', self._on_request_done)
+        page.on('requestfailed', self._on_request_done)
+
+    @staticmethod
+    def _is_chart_data_request(request) -> bool:
+        if request.resource_type not in ('xhr', 'fetch'):
+            return False
+        return any(pattern in request.url for pattern in CHART_DATA_URL_PATTERNS)
+
+    def _on_websocket(self, websocket):
+        if CHART_DATA_WS_HOST in websocket.url:
+            websocket.on('framereceived', self._on_frame)
+
+    def _on_frame(self, payload):
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8', errors='ignore')
+        if SERIES_COMPLETED_MARKER in payload:
+            self.series_completed.set()
+
+    def _on_request(self, request):
+        if self._is_chart_data_request(request):
+            self._pending.add(request)
+            self.data_idle.clear()
+
+    def _on_request_done(self, request):
+        if request in self._pending:
+            self._pending.discard(request)
+            if not self._pending:
+                self.data_idle.set()
+
+    async def wait_for_data(self, timeout: float) -> bool:
+        """
+        Wait until the series reports completion and no chart-data requests are in flight.
+
+        Returns:
+            bool: True if both signals were observed within the timeout
+        """
+        # One deadline for both waits, so the worst case is `timeout` and not twice that
+        deadline = time.monotonic() + timeout
+        try:
+            await asyncio.wait_for(self.series_completed.wait(), timeout=timeout)
+            await asyncio.wait_for(self.data_idle.wait(), timeout=max(deadline - time.monotonic(), 0))
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Chart data not confirmed within {timeout}s "
+                           f"(series_completed={self.series_completed.is_set()}, pending_requests={len(self._pending)})")
+            return False
+
+
 # CSS selector to hide common popups and dialogs on TradingView
 HIDE_DIALOGS_CSS = """
     [role="dialog"], 
@@ -83,6 +210,25 @@ class TradingViewNodeService(TradingViewService):
         self.browser = None
         self.context = None
 
+        # Upper bounds for the readiness signals (seconds); captures continue when they expire
+        self.data_ready_timeout = float(os.getenv("TRADINGVIEW_DATA_READY_TIMEOUT", "10"))
+        self.paint_ready_timeout = float(os.getenv("TRADINGVIEW_PAINT_READY_TIMEOUT", "5"))
+        # Stage durations of the most recent capture
+        self.last_capture_timings = {}
+        # Aborts analytics/ads/fonts etc. on the browser context and reports what was saved
+        self.request_filter = RequestFilter()
+        self.last_capture_traffic = {}
+
+        # Memory/capture based recycling and crash recovery of the browser
+        self.supervisor = BrowserSupervisor()
+        self.warmup_url = os.getenv("BROWSER_WARMUP_URL", "https://www.tradingview.com/chart/")
+        self._lifecycle_lock = None  # asyncio.Lock, created on the running loop
+        self._context_users = {}  # context -> captures in flight
+        self._recycle_task = None
+
+        # Device scale factor of the browser contexts; >1 gives a high-resolution canonical capture
+        self.canonical_scale = float(os.getenv("TRADINGVIEW_CANONICAL_SCALE", "1"))
+
         # Mapping van timeframes naar TradingView interval waarden remains the same
         self.interval_map = {
             "1m": "1", "3m": "3", "5m": "5", "15m": "15", "30m": "30",
@@ -90,68 +236,8 @@ class TradingViewNodeService(TradingViewService):
             "1d": "D", "1w": "W", "1M": "M"
         }
 
-        # Chart links voor verschillende symbolen remains the same
-        self.chart_links = {
-             # Commodities
-            "XAUUSD": "https://www.tradingview.com/chart/bylCuCgc/",
-            "XTIUSD": "https://www.tradingview.com/chart/jxU29rbq/",
-            
-            # Currencies
-            "EURUSD": "https://www.tradingview.com/chart/xknpxpcr/",
-            "EURGBP": "https://www.tradingview.com/chart/xt6LdUUi/",
-            "EURCHF": "https://www.tradingview.com/chart/4Jr8hVba/",
-            "EURJPY": "https://www.tradingview.com/chart/ume7H7lm/",
-            "EURCAD": "https://www.tradingview.com/chart/gbtrKFPk/",
-            "EURAUD": "https://www.tradingview.com/chart/WweOZl7z/",
-            "EURNZD": "https://www.tradingview.com/chart/bcrCHPsz/",
-            "GBPUSD": "https://www.tradingview.com/chart/jKph5b1W/",
-            "GBPCHF": "https://www.tradingview.com/chart/1qMsl4FS/",
-            "GBPJPY": "https://www.tradingview.com/chart/Zcmh5M2k/",
-            "GBPCAD": "https://www.tradingview.com/chart/CvwpPBpF/",
-            "GBPAUD": "https://www.tradingview.com/chart/neo3Fc3j/",
-            "GBPNZD": "https://www.tradingview.com/chart/egeCqr65/",
-            "CHFJPY": "https://www.tradingview.com/chart/g7qBPaqM/",
-            "USDJPY": "https://www.tradingview.com/chart/mcWuRDQv/",
-            "USDCHF": "https://www.tradingview.com/chart/e7xDgRyM/",
-            "USDCAD": "https://www.tradingview.com/chart/jjTOeBNM/",
-            "CADJPY": "https://www.tradingview.com/chart/KNsPbDME/",
-            "CADCHF": "https://www.tradingview.com/chart/XnHRKk5I/",
-            "AUDUSD": "https://www.tradingview.com/chart/h7CHetVW/",
-            "AUDCHF": "https://www.tradingview.com/chart/oooBW6HP/",
-            "AUDJPY": "https://www.tradingview.com/chart/sYiGgj7B/",
-            "AUDNZD": "https://www.tradingview.com/chart/AByyHLB4/",
-            "AUDCAD": "https://www.tradingview.com/chart/L4992qKp/",
-            "NDZUSD": "https://www.tradingview.com/chart/yab05IFU/",
-            "NZDCHF": "https://www.tradingview.com/chart/7epTugqA/",
-            "NZDJPY": "https://www.tradingview.com/chart/fdtQ7rx7/",
-            "NZDCAD": "https://www.tradingview.com/chart/mRVtXs19/",
-            
-            # Cryptocurrencies
-            "BTCUSD": "https://www.tradingview.com/chart/NWT8AI4a/",
-            "ETHUSD": "https://www.tradingview.com/chart/rVh10RLj/",
-            "XRPUSD": "https://www.tradingview.com/chart/tQu9Ca4E/",
-            "SOLUSD": "https://www.tradingview.com/chart/oTTmSjzQ/",
-            "BNBUSD": "https://www.tradingview.com/chart/wNBWNh23/",
-            "ADAUSD": "https://www.tradingview.com/chart/WcBNFrdb/",
-            "LTCUSD": "https://www.tradingview.com/chart/AoDblBMt/",
-            "DOGUSD": "https://www.tradingview.com/chart/F6SPb52v/",
-            "DOTUSD": "https://www.tradingview.com/chart/nT9dwAx2/",
-            "LNKUSD": "https://www.tradingview.com/chart/FzOrtgYw/",
-            "XLMUSD": "https://www.tradingview.com/chart/SnvxOhDh/",
-            "AVXUSD": "https://www.tradingview.com/chart/LfTlCrdQ/",
-            
-            # Indices
-            "AU200": "https://www.tradingview.com/chart/U5CKagMM/",
-            "EU50": "https://www.tradingview.com/chart/tt5QejVd/",
-            "FR40": "https://www.tradingview.com/chart/RoPe3S1Q/",
-            "HK50": "https://www.tradingview.com/chart/Rllftdyl/",
-            "JP225": "https://www.tradingview.com/chart/i562Fk6X/",
-            "UK100": "https://www.tradingview.com/chart/0I4gguQa/",
-            "US100": "https://www.tradingview.com/chart/5d36Cany/",
-            "US500": "https://www.tradingview.com/chart/VsfYHrwP/",
-            "US30": "https://www.tradingview.com/chart/heV5Zitn/",
-            "DE40": "https://www.tradingview.com/chart/OWzg0XNw/",
-        }
+        # Chart links per symbool uit de instrument registry
+        self.chart_links = instrument_registry.chart_links
         logger.info("TradingView Python Playwright service initialized structure.")
 
     async def initialize(self):
@@ -161,41 +247,71 @@ class TradingViewNodeService(TradingViewService):
         try:
             logger.info("Initializing Playwright for Python...")
             self.playwright = await async_playwright().start()
+            self.supervisor.attach(playwright_driver_pid(self.playwright))
             
-            # Check if Chromium browser is available, attempt install if not (might need user intervention)
-            try:
-                self.browser = await self.playwright.chromium.launch(headless=True)
-                logger.info("Chromium browser launched successfully.")
-            except PlaywrightError as e:
-                logger.error(f"Failed to launch Chromium: {e}. Attempting to install...")
-                # Try running the install command - this might fail depending on permissions
-                try:
-                    import sys
-                    process = await asyncio.create_subprocess_exec(
-                        sys.executable, '-m', 'playwright', 'install', 'chromium',
-                        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
-                    stdout, stderr = await process.communicate()
-                    if process.returncode == 0:
-                        logger.info("Playwright Chromium installed successfully.")
-                        self.browser = await self.playwright.chromium.launch(headless=True)
-                    else:
-                        logger.error(f"Failed to automatically install Chromium. Stdout: {stdout.decode()}, Stderr: {stderr.decode()}")
-                        raise RuntimeError("Chromium installation failed.") from e
-                except Exception as install_e:
-                     logger.error(f"Could not install Chromium automatically: {install_e}. Please run 'python -m playwright install chromium' manually.")
-                     return False
+            self.browser = await self._launch_browser()
+            if not self.browser:
+                self.supervisor.browser_lost("launch failed")
+                return False
 
             # Create a persistent context to reuse cookies/localStorage
             await self._create_browser_context()
 
             self.is_initialized = True
+            self.supervisor.browser_started()
             logger.info("Playwright service initialized successfully.")
             return True
         except Exception as e:
             logger.error(f"Error initializing Playwright service: {e}", exc_info=True)
+            self.supervisor.browser_lost(str(e))
             await self.cleanup() # Attempt cleanup on failure
             return False
 
+    async def _launch_browser(self):
+        """Launch Chromium (installing it if needed) and watch it for disconnects."""
+        browser = None
+        # Check if Chromium browser is available, attempt install if not (might need user intervention)
+        try:
+            browser = await self.playwright.chromium.launch(headless=True)
+            logger.info("Chromium browser launched successfully.")
+        except PlaywrightError as e:
+            logger.error(f"Failed to launch Chromium: {e}. Attempting to install...")
+            # Try running the install command - this might fail depending on permissions
+            try:
+                import sys
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable, '-m', 'playwright', 'install', 'chromium',
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+                stdout, stderr = await process.communicate()
+                if process.returncode == 0:
+                    logger.info("Playwright Chromium installed successfully.")
+                    browser = await self.playwright.chromium.launch(headless=True)
+                else:
+                    logger.error(f"Failed to automatically install Chromium. Stdout: {stdout.decode()}, Stderr: {stderr.decode()}")
+                    raise RuntimeError("Chromium installation failed.") from e
+            except Exception as install_e:
+                 logger.error(f"Could not install Chromium automatically: {install_e}. Please run 'python -m playwright install chromium' manually.")
+                 return None
+
+        browser.on('disconnected', self._on_browser_disconnected)
+        return browser
+
+    def _on_browser_disconnected(self, browser):
+        # Old browsers disconnect on purpose when they are recycled
+        if browser is not self.browser:
+            return
+        logger.error("Chromium disconnected unexpectedly (crash or killed).")
+        self.context = None
+        self.supervisor.browser_lost("disconnected")
+
+    def _get_lifecycle_lock(self) -> asyncio.Lock:
+        if self._lifecycle_lock is None:
+            self._lifecycle_lock = asyncio.Lock()
+        return self._lifecycle_lock
+
+    def _browser_alive(self) -> bool:
+        return bool(self.browser and self.browser.is_connected() and self.context)
+
     async def _create_browser_context(self):
         """Creates a browser context with necessary settings and cookies."""
         if not self.browser:
@@ -207,49 +323,229 @@ class TradingViewNodeService(TradingViewService):
             if self.context:
                 await self.context.close()
                 
-            self.context = await self.browser.new_context(
-                locale='en-US',
-                timezone_id='Europe/Amsterdam',
-                viewport={'width': 1920, 'height': 1080},
-                bypass_csp=True,
-                # user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
-            )
-            
-            # Add session cookie if provided
-            if self.session_id:
-                logger.info(f"Adding TradingView session cookie (ID: {self.session_id[:5]}...).")
-                await self.context.add_cookies([
-                    {
-                        'name': 'sessionid', 'value': self.session_id,
-                        'domain': '.tradingview.com', 'path': '/',
-                        'httpOnly': True, 'secure': True, 'sameSite': 'Lax'
-                    },
-                     {
-                        'name': 'language', 'value': 'en',
-                         'domain': '.tradingview.com', 'path': '/'
-                    }
-                ])
-                
-            # Add initial script to set localStorage and block popups
-            await self.context.add_init_script(f"""
-                // Set localStorage items
-                const tvLocalStorage = {json.dumps(TV_LOCAL_STORAGE)};
-                for (const [key, value] of Object.entries(tvLocalStorage)) {{
-                    try {{ localStorage.setItem(key, value); }} catch (e) {{}}
-                }}
-                // Block popups
-                window.open = () => null;
-                window.confirm = () => true;
-                window.alert = () => {{}};
-            """)
+            self.context = await self._new_context(self.browser)
             logger.info("Browser context created with cookies and init script.")
             
         except Exception as e:
             logger.error(f"Error creating browser context: {e}", exc_info=True)
             self.context = None
 
+    async def _new_context(self, browser):
+        """Create a configured browser context (filter, session cookie, init script) on a browser."""
+        context = await browser.new_context(
+            locale='en-US',
+            timezone_id='Europe/Amsterdam',
+            viewport={'width': 1920, 'height': 1080},
+            device_scale_factor=self.canonical_scale,
+            bypass_csp=True,
+            # user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
+        )
+
+        # Block non-essential resources and third-party hosts
+        await self.request_filter.attach(context)
+        
+        # Add session cookie if provided
+        if self.session_id:
+            logger.info(f"Adding TradingView session cookie (ID: {self.session_id[:5]}...).")
+            await context.add_cookies([
+                {
+                    'name': 'sessionid', 'value': self.session_id,
+                    'domain': '.tradingview.com', 'path': '/',
+                    'httpOnly': True, 'secure': True, 'sameSite': 'Lax'
+                },
+                 {
+                    'name': 'language', 'value': 'en',
+                     'domain': '.tradingview.com', 'path': '/'
+                }
+            ])
+            
+        # Add initial script to set localStorage and block popups
+        await context.add_init_script(f"""
+            // Set localStorage items
+            const tvLocalStorage = {json.dumps(TV_LOCAL_STORAGE)};
+            for (const [key, value] of Object.entries(tvLocalStorage)) {{
+                try {{ localStorage.setItem(key, value); }} catch (e) {{}}
+            }}
+            // Block popups
+            window.open = () => null;
+            window.confirm = () => true;
+            window.alert = () => {{}};
+        """)
+        return context
+
+    async def _warm_context(self, context) -> None:
+        """Load a TradingView page once so the replacement context has its cache and session ready."""
+        if not self.warmup_url:
+            return
+        page = None
+        try:
+            page = await context.new_page()
+            await page.goto(self.warmup_url, wait_until='domcontentloaded', timeout=30000)
+        except Exception as e:
+            logger.warning(f"Warm-up of new browser context failed: {e}")
+        finally:
+            if page:
+                await page.close()
+
+    async def _retire(self, context, browser=None) -> None:
+        """Close a replaced context (and browser) once its in-flight captures have finished."""
+        deadline = time.monotonic() + 60
+        while self._context_users.get(context, 0) > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        self._context_users.pop(context, None)
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug(f"Error closing retired context: {e}")
+        if browser:
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.debug(f"Error closing retired browser: {e}")
+
+    async def restart_browser(self) -> bool:
+        """Replace a crashed or disconnected browser with a new one."""
+        async with self._get_lifecycle_lock():
+            if self._browser_alive():
+                return True
+            logger.warning("Restarting Chromium after crash/disconnect...")
+            self.supervisor.set_state(RECYCLING, "restart")
+            chart_metrics.increment("browser.tradingview.restarts")
+            old_browser = self.browser
+            self.browser = None
+            self.context = None
+            if old_browser:
+                try:
+                    await old_browser.close()
+                except Exception:
+                    pass
+            try:
+                if not self.playwright:
+                    self.playwright = await async_playwright().start()
+                    self.supervisor.attach(playwright_driver_pid(self.playwright))
+                browser = await self._launch_browser()
+                if not browser:
+                    self.supervisor.browser_lost("relaunch failed")
+                    return False
+                self.browser = browser
+                self.context = await self._new_context(browser)
+                self.is_initialized = True
+                self.supervisor.browser_started()
+                logger.info("Chromium restarted.")
+                return True
+            except Exception as e:
+                logger.error(f"Error restarting Chromium: {e}", exc_info=True)
+                self.supervisor.browser_lost(str(e))
+                return False
+
+    async def _maybe_recycle(self) -> None:
+        """Replace the context or the whole browser when the supervisor thresholds are reached."""
+        await self.supervisor.refresh_memory()
+        kind = self.supervisor.recycle_reason()
+        if not kind or not self._browser_alive():
+            return
+        async with self._get_lifecycle_lock():
+            kind = self.supervisor.recycle_reason()
+            if not kind or not self._browser_alive():
+                return
+            logger.info(f"Recycling browser {kind} (health: {self.supervisor.get_health()})")
+            self.supervisor.set_state(RECYCLING, kind)
+            start = time.perf_counter()
+            new_browser = None
+            try:
+                if kind == "browser":
+                    new_browser = await self._launch_browser()
+                    if not new_browser:
+                        raise RuntimeError("could not launch replacement browser")
+                new_context = await self._new_context(new_browser or self.browser)
+                # Warm the replacement before it takes traffic
+                await self._warm_context(new_context)
+            except Exception as e:
+                logger.error(f"Error preparing replacement browser {kind}: {e}", exc_info=True)
+                if new_browser:
+                    await new_browser.close()
+                self.supervisor.set_state(DEGRADED if self._browser_alive() else DOWN, str(e))
+                return
+
+            old_context, old_browser = self.context, (self.browser if new_browser else None)
+            if new_browser:
+                self.browser = new_browser
+            self.context = new_context
+            self.supervisor.recycled(kind, time.perf_counter() - start)
+            asyncio.ensure_future(self._retire(old_context, old_browser))
+
+    def get_health(self) -> Dict:
+        """Browser health for monitoring."""
+        return self.supervisor.get_health()
+
+    async def update_session(self, session_id: str) -> None:
+        """Swap the session cookie in the live context; new contexts pick it up from self.session_id."""
+        async with self._get_lifecycle_lock():
+            self.session_id = session_id
+            if not self.context:
+                return
+            try:
+                await self.context.add_cookies([{
+                    'name': 'sessionid', 'value': session_id,
+                    'domain': '.tradingview.com', 'path': '/',
+                    'httpOnly': True, 'secure': True, 'sameSite': 'Lax'
+                }])
+                logger.info(f"Updated TradingView session cookie in live context (ID: {session_id[:5]}...).")
+            except Exception as e:
+                logger.error(f"Error updating session cookie, recreating context: {e}")
+                await self._create_browser_context()
+
+    async def _supervised_capture(self, capture):
+        """Run a capture; restarts a crashed browser and retries once, then lets the supervisor recycle."""
+        if self.is_initialized and not self._browser_alive():
+            await self.restart_browser()
+
+        result = await capture()
+        if result is None and self.is_initialized and not self._browser_alive():
+            # The browser died during the capture: restart transparently and try again
+            if await self.restart_browser():
+                result = await capture()
+
+        self.supervisor.record_capture(result is not None)
+        if self._recycle_task is None or self._recycle_task.done():
+            self._recycle_task = asyncio.ensure_future(self._maybe_recycle())
+        return result
 
     async def take_screenshot(self, symbol, timeframe=None, fullscreen=False):
+        """Take a screenshot of a chart (normal or fullscreen layout)."""
+        return await self._supervised_capture(lambda: self._take_screenshot_once(symbol, timeframe, fullscreen))
+
+    async def capture_canonical(self, symbol, timeframe=None) -> Optional[Tuple[bytes, Dict[str, Optional[Tuple[int, int, int, int]]]]]:
+        """
+        Capture one viewport image from which both the normal and the fullscreen chart are cut.
+
+        Returns:
+            Tuple of (PNG bytes, {'normal': box, 'fullscreen': box}) with pixel crop boxes
+            (None when an area was not found), or None if the capture failed
+        """
+        return await self._supervised_capture(lambda: self._take_screenshot_once(symbol, timeframe, canonical=True))
+
+    async def _variant_boxes(self, page) -> Dict[str, Optional[Tuple[int, int, int, int]]]:
+        """Pixel crop boxes of the chart areas in a viewport screenshot."""
+        boxes = {}
+        for name, selector in (("normal", NORMAL_CHART_SELECTOR), ("fullscreen", FULLSCREEN_CHART_SELECTOR)):
+            box = None
+            try:
+                rect = await page.locator(selector).first.bounding_box(timeout=2000)
+                if rect and rect['width'] > 0 and rect['height'] > 0:
+                    scale = self.canonical_scale
+                    box = (
+                        max(0, int(rect['x'] * scale)),
+                        max(0, int(rect['y'] * scale)),
+                        int((rect['x'] + rect['width']) * scale),
+                        int((rect['y'] + rect['height']) * scale),
+                    )
+            except Exception as e:
+                logger.debug(f"No bounding box for {name} chart area: {e}")
+            boxes[name] = box
+        return boxes
+
+    async def _take_screenshot_once(self, symbol, timeframe=None, fullscreen=False, canonical=False):
         """Take a screenshot of a chart using Playwright for Python."""
         if not self.is_initialized or not self.context:
              logger.error("Playwright service not initialized or context not available.")
@@ -267,7 +563,7 @@ class TradingViewNodeService(TradingViewService):
 
         # Build chart URL (same logic as before)
         normalized_symbol = symbol.replace("/", "").upper()
-        chart_url = self.chart_links.get(normalized_symbol)
+        chart_url = instrument_registry.chart_url(normalized_symbol)
         if not chart_url:
             logger.warning(f"No specific chart layout URL found for {symbol}, using default chart page.")
             chart_url = f"https://www.tradingview.com/chart/?symbol={normalized_symbol}"
@@ -284,8 +580,23 @@ class TradingViewNodeService(TradingViewService):
             return None
 
         page = None
+        timings = {}
+        stage_start = time.perf_counter()
+        context = self.context
+        self._context_users[context] = self._context_users.get(context, 0) + 1
+
+        def end_stage(stage):
+            # Record how long a capture stage took and start timing the next one
+            nonlocal stage_start
+            now = time.perf_counter()
+            timings[stage] = now - stage_start
+            chart_metrics.record(f"capture.{stage}", timings[stage])
+            stage_start = now
+
         try:
-            page = await self.context.new_page()
+            page = await context.new_page()
+            self.request_filter.start_capture(page)
+            tracker = ChartReadinessTracker(page)
             logger.info(f"Navigating to URL: {chart_url}")
 
             # Auto dismiss dialogs (though init script and CSS should handle most)
@@ -295,6 +606,16 @@ class TradingViewNodeService(TradingViewService):
             await page.add_style_tag(content=HIDE_DIALOGS_CSS)
 
             await page.goto(chart_url, wait_until='domcontentloaded', timeout=30000) # 30s timeout
+            end_stage("navigate")
+
+            # Wait for the series data to arrive instead of sleeping a fixed amount
+            try:
+                await page.wait_for_selector(CHART_CONTAINER_SELECTOR, timeout=self.data_ready_timeout * 1000)
+            except PlaywrightTimeoutError:
+                logger.warning("Chart container selector not found within timeout, proceeding anyway.")
+            await tracker.wait_for_data(self.data_ready_timeout)
+            await self._wait_for_chart_painted(page)
+            end_stage("data_ready")
 
             # Apply localStorage settings again and try to close popups via JS
             await page.evaluate(f"""
@@ -314,9 +635,6 @@ class TradingViewNodeService(TradingViewService):
             # Add CSS again for robustness
             await page.add_style_tag(content=HIDE_DIALOGS_CSS)
 
-            # Wait briefly for the page to settle and scripts to run
-            await page.wait_for_timeout(1000) # Reduced from 2000ms
-
             # Attempt to close common close buttons directly
             close_selectors = [
                 'button.close-B02UUUN3',
@@ -332,23 +650,12 @@ class TradingViewNodeService(TradingViewService):
                          if await button.is_visible():
                               await button.click(timeout=500, force=True) # Short timeout, force click
                               logger.info(f"Clicked potential close button: {selector}")
-                              await page.wait_for_timeout(100) # Small delay after click
                 except PlaywrightTimeoutError:
                      pass # Ignore timeout errors when clicking close buttons
                 except Exception as e:
                      logger.warning(f"Minor error clicking close button {selector}: {e}")
 
-
-            # Wait for the main chart container to be present
-            try:
-                chart_container_selector = ".chart-gui-wrapper, .chart-container, .layout__area--center" # Common selectors
-                await page.wait_for_selector(chart_container_selector, timeout=10000) # 10s timeout
-                logger.info("Chart container found.")
-            except PlaywrightTimeoutError:
-                logger.warning("Chart container selector not found within timeout, proceeding anyway.")
-
-
-            if fullscreen:
+            if fullscreen and not canonical:
                 logger.info("Applying minimal CSS and simulating Shift+F for fullscreen...")
                 # Hide only the most basic UI elements
                 await page.add_style_tag(content="""
@@ -357,14 +664,10 @@ class TradingViewNodeService(TradingViewService):
                      { display: none !important; visibility: hidden !important; opacity: 0 !important; }
                     body { overflow: hidden !important; } /* Prevent scrollbars */
                 """)
-                await page.wait_for_timeout(300) # Reduced from 500ms
                 
                 # Simulate Shift+F
                 logger.info("Simulating Shift+F keyboard shortcut.")
                 await page.keyboard.press('Shift+F')
-                
-                # Wait specifically for the fullscreen transition
-                await page.wait_for_timeout(1000) # Reduced from 1500ms
 
             # Additional aggressive cleanup just before screenshot
             await page.evaluate("""
@@ -376,10 +679,19 @@ class TradingViewNodeService(TradingViewService):
                     });
                 }
             """)
-            await page.wait_for_timeout(300) # Reduced from 500ms
+
+            # Wait for the chart to re-layout and repaint after the cleanup (and the fullscreen toggle)
+            await page.evaluate(RESET_LAYOUT_STATE_JS)
+            await self._wait_for_chart_painted(page)
+            end_stage("cleanup")
 
             logger.info("Taking screenshot with Playwright...")
-            if fullscreen:
+            variant_boxes = None
+            if canonical:
+                 # Viewport image plus the areas the normal and fullscreen variants are cut from
+                 screenshot_bytes = await page.screenshot(type='png')
+                 variant_boxes = await self._variant_boxes(page)
+            elif fullscreen:
                  screenshot_bytes = await page.screenshot(type='png', full_page=True) # Use full_page for fullscreen
             else:
                  # Find the main chart element for non-fullscreen screenshots
@@ -390,22 +702,51 @@ class TradingViewNodeService(TradingViewService):
                  except Exception as e:
                       logger.warning(f"Could not find specific chart element, taking viewport screenshot instead: {e}")
                       screenshot_bytes = await page.screenshot(type='png') # Fallback to viewport screenshot
-
-            logger.info(f"Screenshot taken successfully ({len(screenshot_bytes)} bytes).")
+            end_stage("capture")
+
+            total = sum(timings.values())
+            chart_metrics.record("capture.total", total)
+            self.last_capture_timings = dict(timings, total=total)
+            logger.info(f"Screenshot taken successfully ({len(screenshot_bytes)} bytes). "
+                        f"Stage timings: " + ", ".join(f"{k}={v:.2f}s" for k, v in self.last_capture_timings.items()))
+            if canonical:
+                return screenshot_bytes, variant_boxes
             return screenshot_bytes
 
         except PlaywrightTimeoutError as e:
              logger.error(f"Playwright timeout error during screenshot: {e}")
+             chart_metrics.increment("capture.errors")
              return None
         except PlaywrightError as e:
              logger.error(f"Playwright general error during screenshot: {e}")
+             chart_metrics.increment("capture.errors")
              return None
         except Exception as e:
             logger.error(f"Unexpected error taking screenshot: {e}", exc_info=True)
+            chart_metrics.increment("capture.errors")
             return None
         finally:
             if page:
-                await page.close()
+                traffic = self.request_filter.finish_capture(page)
+                if traffic:
+                    self.last_capture_traffic = traffic
+                    logger.info(f"Capture traffic: {traffic['loaded_requests']} requests / {traffic['loaded_bytes']} bytes loaded, "
+                                f"{traffic['blocked_requests']} requests blocked (~{traffic['estimated_saved_bytes']} bytes saved)")
+                try:
+                    await page.close()
+                except PlaywrightError:
+                    pass  # Browser already gone
+            self._context_users[context] = self._context_users.get(context, 1) - 1
+
+    async def _wait_for_chart_painted(self, page) -> bool:
+        """Wait until a series canvas has content and the layout is stable for two animation frames."""
+        try:
+            await page.wait_for_function(CHART_PAINTED_JS, polling='raf', timeout=self.paint_ready_timeout * 1000)
+            return True
+        except PlaywrightTimeoutError:
+            logger.warning(f"Chart canvas not painted/stable within {self.paint_ready_timeout}s, proceeding anyway.")
+            return False
+
 
     async def get_analysis(self, symbol: str, timeframe: str) -> Optional[str]:
         """Get technical analysis summary text from TradingView using Playwright."""
@@ -426,7 +767,7 @@ class TradingViewNodeService(TradingViewService):
         normalized_symbol = symbol.replace("/", "").upper()
         # Try to find the corresponding chart URL, otherwise fallback to general symbol page
         # This helps load the correct layout if available
-        chart_url = self.chart_links.get(normalized_symbol, f"https://www.tradingview.com/symbols/{normalized_symbol}/")
+        chart_url = instrument_registry.chart_url(normalized_symbol) or f"https://www.tradingview.com/symbols/{normalized_symbol}/"
 
         page = None
         try:
@@ -503,8 +844,9 @@ class TradingViewNodeService(TradingViewService):
                  logger.error(f"Error closing Playwright context: {e}")
         if self.browser:
             try:
-                await self.browser.close()
-                self.browser = None
+                # Clear the reference first so the disconnect is not reported as a crash
+                browser, self.browser = self.browser, None
+                await browser.close()
                 logger.info("Playwright browser closed.")
             except Exception as e:
                  logger.error(f"Error closing Playwright browser: {e}")
@@ -516,6 +858,7 @@ class TradingViewNodeService(TradingViewService):
             except Exception as e:
                  logger.error(f"Error stopping Playwright: {e}")
         self.is_initialized = False
+        self.supervisor.set_state(DOWN, "cleanup")
         logger.info("Playwright service cleanup complete.")
 
     # Remove batch_capture_charts as it wasn't fully implemented and complicates refactoring
@@ -11,6 +11,7 @@ import base64
 from io import BytesIO
 from datetime import datetime
 from trading_bot.services.chart_service.tradingview import TradingViewService
+from trading_bot.services.chart_service.node_worker_pool import NodeWorkerPool
 
 class TradingViewPuppeteerService(TradingViewService):
     """Stub class for backward compatibility"""
@@ -34,6 +35,14 @@ class TradingViewPuppeteerService(TradingViewService):
             "ETHUSD": "https://www.tradingview.com/chart/?symbol=ETHUSD"
         }
         
+        self.interval_map = {
+            "1m": "1", "5m": "5", "15m": "15", "30m": "30",
+            "1h": "60", "4h": "240", "1d": "D", "1w": "W"
+        }
+        
+        # Persistente Node workers (browser blijft open tussen screenshots)
+        self.worker_pool = NodeWorkerPool()
+        
         logger.info(f"TradingView Puppeteer service initialized")
     
     async def initialize(self):
@@ -146,7 +155,8 @@ class TradingViewPuppeteerService(TradingViewService):
             
             # Parse de cookies uit de stdout
             output = stdout.decode()
-            logger.info(f"Puppeteer output: {output}")
+            # The output holds the cookie jar (session cookie included): log its size only
+            logger.info(f"Puppeteer output received ({len(output)} characters)")
             
             # Zoek naar de JSON cookies in de output
             import re
@@ -181,7 +191,7 @@ class TradingViewPuppeteerService(TradingViewService):
         return await self.initialize()
     
     async def take_screenshot(self, chart_url, timeframe=None, adjustment=5):
-        """Take a screenshot of a chart using Puppeteer"""
+        """Take a screenshot of a chart on a persistent Node worker"""
         try:
             if not self.is_initialized:
                 logger.warning("TradingView Puppeteer service not initialized")
@@ -192,166 +202,20 @@ class TradingViewPuppeteerService(TradingViewService):
                 symbol = chart_url
                 chart_url = self.chart_links.get(symbol, f"{self.chart_url}/?symbol={symbol}")
             
-            logger.info(f"Taking screenshot of chart at URL: {chart_url}")
-            
-            # Gebruik Node.js om Puppeteer aan te roepen
-            import subprocess
-            import tempfile
-            
-            # Maak een tijdelijk JavaScript bestand
-            with tempfile.NamedTemporaryFile(suffix='.js', delete=False, mode='w') as f:
-                js_code = f"""
-                const puppeteer = require('puppeteer');
-
-                (async () => {{
-                    try {{
-                        console.log('Starting Puppeteer for screenshot');
-                        const browser = await puppeteer.launch({{
-                            headless: true,
-                            args: [
-                                "--no-sandbox",
-                                "--disable-dev-shm-usage",
-                                "--disable-gpu",
-                                "--window-size=1920,1080",
-                            ],
-                        }});
-                        
-                        console.log('Browser launched');
-                        const page = (await browser.pages())[0];
-                        
-                        // Stel viewport in
-                        await page.setViewport({{ width: 1920, height: 1080 }});
-                        
-                        // Voeg session cookie toe
-                        await page.setCookie({{
-                            name: 'sessionid',
-                            value: '{self.session_id}',
-                            domain: '.tradingview.com',
-                            path: '/'
-                        }});
-                        
-                        // Ga naar de chart
-                        await page.goto('{chart_url}', {{ waitUntil: 'networkidle2', timeout: 60000 }});
-                        console.log('Navigated to chart URL');
-                        
-                        // Wacht tot de chart is geladen
-                        await page.waitForSelector('.chart-container', {{ timeout: 60000 }});
-                        console.log('Chart container found');
-                        
-                        // Wacht extra tijd voor volledige rendering
-                        await new Promise(resolve => setTimeout(resolve, 10000));
-                        
-                        // Stel timeframe in als opgegeven
-                        if ('{timeframe}') {{
-                            try {{
-                                // Klik op de timeframe knop
-                                await page.click('.chart-toolbar-timeframes button');
-                                
-                                // Wacht op het dropdown menu
-                                await new Promise(resolve => setTimeout(resolve, 1000));
-                                
-                                // Zoek en klik op de juiste timeframe optie
-                                const timeframeOptions = await page.$$('.menu-item');
-                                for (const option of timeframeOptions) {{
-                                    const text = await page.evaluate(el => el.textContent, option);
-                                    if (text.toLowerCase().includes('{timeframe}'.toLowerCase())) {{
-                                        await option.click();
-                                        break;
-                                    }}
-                                }}
-                                
-                                // Wacht tot de chart is bijgewerkt
-                                await new Promise(resolve => setTimeout(resolve, 3000));
-                            }} catch (error) {{
-                                console.error('Error setting timeframe:', error.message);
-                            }}
-                        }}
-                        
-                        // Pas de positie aan (scroll naar rechts)
-                        try {{
-                            // Druk op Escape om eventuele dialogen te sluiten
-                            await page.keyboard.press('Escape');
-                            
-                            // Druk op pijltje rechts meerdere keren
-                            for (let i = 0; i < {adjustment}; i++) {{
-                                await page.keyboard.press('ArrowRight');
-                                await new Promise(resolve => setTimeout(resolve, 10));
-                            }}
-                            
-                            await new Promise(resolve => setTimeout(resolve, 3000));
-                        }} catch (error) {{
-                            console.error('Error performing keyboard actions:', error.message);
-                        }}
-                        
-                        // Verberg UI elementen voor een schone screenshot
-                        await page.evaluate(() => {{
-                            const elementsToHide = [
-                                '.chart-toolbar',
-                                '.tv-side-toolbar',
-                                '.header-chart-panel',
-                                '.drawing-toolbar',
-                                '.chart-controls-bar',
-                                '.layout__area--left',
-                                '.layout__area--top',
-                                '.layout__area--right'
-                            ];
-                            
-                            elementsToHide.forEach(selector => {{
-                                const elements = document.querySelectorAll(selector);
-                                elements.forEach(el => {{
-                                    if (el) el.style.display = 'none';
-                                }});
-                            }});
-                        }});
-                        
-                        await new Promise(resolve => setTimeout(resolve, 1000));
-                        
-                        // Neem screenshot
-                        const screenshot = await page.screenshot({{ fullPage: false }});
-                        console.log(screenshot.toString('base64'));
-                        
-                        // Sluit de browser
-                        await browser.close();
-                        process.exit(0);
-                    }} catch (error) {{
-                        console.error('Error taking screenshot:', error.message);
-                        process.exit(1);
-                    }}
-                }})();
-                """
-                f.write(js_code)
-                js_file = f.name
-            
-            # Voer het JavaScript bestand uit
-            process = await asyncio.create_subprocess_exec(
-                'node', js_file,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await process.communicate()
+            # Timeframe via de URL in plaats van door het menu te klikken
+            if timeframe:
+                tv_interval = self.interval_map.get(timeframe, timeframe)
+                separator = '&' if '?' in chart_url else '?'
+                chart_url += f"{separator}interval={tv_interval}"
             
-            # Verwijder het tijdelijke bestand
-            os.unlink(js_file)
-            
-            if process.returncode != 0:
-                logger.error(f"Puppeteer screenshot failed: {stderr.decode()}")
-                return None
-            
-            # Parse de base64 screenshot uit de stdout
-            output = stdout.decode()
-            
-            # Zoek naar de base64 string in de output
-            import re
-            base64_match = re.search(r'([A-Za-z0-9+/=]{100,})', output)
+            logger.info(f"Taking screenshot of chart at URL: {chart_url}")
             
-            if base64_match:
-                base64_str = base64_match.group(0)
-                screenshot = base64.b64decode(base64_str)
+            screenshot = await self.worker_pool.capture(chart_url, session_id=self.session_id, scroll_right=adjustment)
+            if screenshot:
                 logger.info(f"Successfully took screenshot of chart")
                 return screenshot
             
-            logger.warning("Could not find base64 screenshot in output")
+            logger.warning("Node worker returned no screenshot")
             return None
             
         except Exception as e:
@@ -394,7 +258,12 @@ class TradingViewPuppeteerService(TradingViewService):
             logger.error(f"Error in batch capture: {str(e)}")
             return None
     
+    async def update_session(self, session_id):
+        """Use a new session id; the workers drop their contexts for the old one"""
+        self.session_id = session_id
+        await self.worker_pool.broadcast("resetSession", {"sessionId": session_id})
+
     async def cleanup(self):
         """Clean up resources"""
-        # Geen resources om op te ruimen
+        await self.worker_pool.close()
         logger.info("TradingView Puppeteer service cleaned up") 
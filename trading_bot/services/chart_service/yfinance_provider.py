@@ -2,30 +2,48 @@ import logging
 import traceback
 import asyncio
 import os
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, Tuple, List
 import time
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import random
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
 import yfinance as yf
 import numpy as np
-from cachetools import TTLCache
+
+from trading_bot.services.chart_service.candle_store import candle_store
+from trading_bot.services.chart_service.concurrency import SingleFlight, market_data_executor
+from trading_bot.services.chart_service.frame_cache import FrameCache, compact_frame, frame_view
+from trading_bot.services.chart_service.indicators import indicator_engine, INDICATOR_COLUMNS
+from trading_bot.services.chart_service.metrics import chart_metrics
+from trading_bot.services.chart_service import timeframes
+from trading_bot.services.instrument_registry import instrument_registry
 
 logger = logging.getLogger(__name__)
 
-# Configure retry mechanism
-# ... (retry decorator setup remains the same) ...
+# Concurrent misses for the same download / market data request share one fetch
+_download_flight = SingleFlight("yahoo.download")
+_market_data_flight = SingleFlight("yahoo.market_data")
 
 # --- Cache Configuration ---
+# Both caches are bounded by bytes and hold compact float32 frames that hits share read-only
 # Cache for raw downloaded data (symbol, interval) -> DataFrame
 # Cache for 5 minutes (300 seconds)
-data_download_cache = TTLCache(maxsize=100, ttl=300) 
+data_download_cache = FrameCache("yahoo_download", int(os.getenv("YAHOO_DOWNLOAD_CACHE_MB", "64")) * 1024 * 1024, ttl=300)
 # Cache for processed market data (symbol, timeframe, limit) -> DataFrame with indicators
-market_data_cache = TTLCache(maxsize=100, ttl=300) 
+market_data_cache = FrameCache("yahoo_market_data", int(os.getenv("YAHOO_MARKET_DATA_CACHE_MB", "32")) * 1024 * 1024, ttl=300)
+# Columns kept in the caches
+DOWNLOAD_COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+MARKET_DATA_COLUMNS = DOWNLOAD_COLUMNS + INDICATOR_COLUMNS
+# Extra history loaded before the requested candles so EMA 200 has settled
+INDICATOR_WARMUP_BARS = 200
+# Larger gaps are downloaded in full instead of incrementally
+MAX_INCREMENTAL_BARS = int(os.getenv("CANDLE_STORE_MAX_INCREMENTAL_BARS", "1000"))
+# Tickers per yf.download call in get_market_data_batch
+YAHOO_BATCH_SIZE = int(os.getenv("YAHOO_BATCH_SIZE", "20"))
 
 class YahooFinanceProvider:
     """Provider class for Yahoo Finance API integration"""
@@ -115,32 +133,39 @@ class YahooFinanceProvider:
         YahooFinanceProvider._last_api_call = time.time()
 
     @staticmethod
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=2, max=30), # Adjusted retry wait
-        reraise=True
-    )
-    async def _download_data(symbol: str, start_date: datetime, end_date: datetime, interval: str, timeout: int = 30, original_symbol: str = None, period: str = None) -> pd.DataFrame:
-        """Download data using yfinance with retry logic and caching."""
-        # --- Caching Logic ---
-        # Cache key should ideally represent the actual request made
+    def _download_cache_key(symbol: str, interval: str, start_date: Optional[datetime], end_date: Optional[datetime], period: Optional[str]) -> Tuple:
+        """Cache key for a raw download; it should represent the actual request made"""
         if period:
             # Use period and interval for intraday caching
-            cache_key = (symbol, interval, period)
-        elif start_date and end_date:
+            return (symbol, interval, period)
+        if start_date and end_date:
             # Use start/end date and interval for daily+ caching
-            cache_key = (symbol, interval, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
-        else:
-            # Fallback cache key if parameters are weird (should not happen often)
-            logger.warning("Could not determine proper cache key, using fallback.")
-            cache_key = (symbol, interval, datetime.now().strftime('%Y-%m-%d'))
+            return (symbol, interval, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        # Fallback cache key if parameters are weird (should not happen often)
+        logger.warning("Could not determine proper cache key, using fallback.")
+        return (symbol, interval, datetime.now().strftime('%Y-%m-%d'))
+
+    @staticmethod
+    async def _download_data(symbol: str, start_date: datetime, end_date: datetime, interval: str, timeout: int = 30, original_symbol: str = None, period: str = None) -> pd.DataFrame:
+        """Download data using yfinance with retry logic and caching."""
+        # --- Caching Logic ---
+        cache_key = YahooFinanceProvider._download_cache_key(symbol, interval, start_date, end_date, period)
 
         if cache_key in data_download_cache:
             logger.info(f"[Yahoo Cache] HIT for download: Key={cache_key}")
-            return data_download_cache[cache_key].copy() # Return a copy to prevent mutation
+            return frame_view(data_download_cache[cache_key]) # Read-only view, no copy
         logger.info(f"[Yahoo Cache] MISS for download: Key={cache_key}")
         # --- End Caching Logic ---
 
+        # One download per key at a time; concurrent callers wait for it (retries included)
+        df = await _download_flight.do(cache_key, lambda: YahooFinanceProvider._fetch_download(
+            symbol, start_date, end_date, interval, timeout, period, cache_key))
+        return frame_view(df)
+
+    @staticmethod
+    async def _fetch_download(symbol: str, start_date: datetime, end_date: datetime, interval: str, timeout: int,
+                              period: Optional[str], cache_key: Tuple) -> Optional[pd.DataFrame]:
+        """Run yf.download on the market data executor with retries and fill the download cache"""
         logger.info(f"[Yahoo] Attempting direct download method with yf.download for {symbol} (Interval: {interval}, Period: {period}, Start: {start_date.date() if start_date else 'N/A'}, End: {end_date.date() if end_date else 'N/A'})")
         
         # Ensure session exists
@@ -182,30 +207,167 @@ class YahooFinanceProvider:
                      return pd.DataFrame() # Return empty DataFrame on no data
                  raise # Reraise other exceptions for tenacity
 
-        # Run the download in a separate thread to avoid blocking asyncio event loop
-        loop = asyncio.get_event_loop()
+        # Run the download on the dedicated market data pool, retrying errors with backoff
+        df = None
         try:
-             # Use default executor (ThreadPoolExecutor)
-             df = await loop.run_in_executor(None, download) 
+            async for attempt in AsyncRetrying(stop=stop_after_attempt(3),
+                                               wait=wait_exponential(multiplier=1, min=2, max=30),
+                                               reraise=True):
+                with attempt:
+                    df = await market_data_executor.run(download)
         except Exception as e:
              logger.error(f"[Yahoo] Download failed for {symbol} after retries: {e}")
+             chart_metrics.increment("yahoo.download_errors")
              df = None # Ensure df is None on failure
 
         if df is not None and not df.empty:
              logger.info(f"[Yahoo] Direct download successful for {symbol}, got {len(df)} rows")
              # --- Cache Update ---
-             data_download_cache[cache_key] = df.copy() # Store a copy in cache
+             df = compact_frame(df, DOWNLOAD_COLUMNS) # Compact read-only form, shared by all callers
+             data_download_cache[cache_key] = df
              # --- End Cache Update ---
         elif df is not None and df.empty:
              logger.warning(f"[Yahoo] Download returned empty DataFrame for {symbol}")
              # Cache the empty result too, to avoid repeated failed attempts for a short period
-             data_download_cache[cache_key] = df.copy()
+             data_download_cache[cache_key] = df
         else:
              logger.warning(f"[Yahoo] Download returned None for {symbol}")
              # Optionally cache None or handle differently if needed
 
         return df
     
+    @staticmethod
+    async def _download_batch(symbols: List[str], interval: str, start_date: Optional[datetime], end_date: Optional[datetime],
+                              period: Optional[str] = None, timeout: int = 30) -> Dict[str, pd.DataFrame]:
+        """
+        Download several tickers with one yf.download call and split the result per ticker.
+
+        Returns:
+            Dict formatted symbol -> DataFrame (Open/High/Low/Close/Volume columns); tickers
+            without data are left out
+        """
+        session = YahooFinanceProvider._get_session()
+
+        def download():
+            download_kwargs = {
+                'tickers': symbols,
+                'interval': interval,
+                'progress': False,
+                'session': session,
+                'timeout': timeout,
+                'ignore_tz': False,
+                'group_by': 'ticker',
+                'threads': True,
+            }
+            # Use period OR start/end, not both
+            if period:
+                download_kwargs['period'] = period
+            else:
+                download_kwargs['start'] = start_date
+                download_kwargs['end'] = end_date
+            return yf.download(**download_kwargs)
+
+        try:
+            df = await market_data_executor.run(download)
+        except Exception as e:
+            logger.error(f"[Yahoo] Batch download of {len(symbols)} tickers failed: {e}")
+            return {}
+        if df is None or df.empty:
+            return {}
+
+        result = {}
+        if not isinstance(df.columns, pd.MultiIndex):
+            # A single ticker can come back with flat columns
+            frames = {symbols[0]: df} if len(symbols) == 1 else {}
+        else:
+            # group_by='ticker' puts the ticker on the first column level
+            level = 0 if set(df.columns.get_level_values(0)) & set(symbols) else 1
+            frames = {ticker: df.xs(ticker, axis=1, level=level) for ticker in symbols
+                      if ticker in df.columns.get_level_values(level)}
+        for ticker, frame in frames.items():
+            # Tickers without data in this window come back as all-NaN rows
+            frame = frame.dropna(how='all')
+            if not frame.empty:
+                result[ticker] = frame
+        return result
+
+    @staticmethod
+    async def get_market_data_batch(symbols: List[str], limit: int = 100, timeframe: str = "H1",
+                                    force: bool = False) -> Dict[str, Optional[Tuple[pd.DataFrame, Dict]]]:
+        """
+        Fetch market data for many symbols with as few Yahoo requests as possible.
+
+        Symbols that are not cached yet are grouped by interval and download window and fetched
+        together; the split results fill the per-symbol download cache, after which
+        get_market_data runs for every symbol without further requests. With `force` the cached
+        results are dropped and every symbol is downloaded (e.g. right after a candle close,
+        when a result from a few minutes ago does not have the new bar yet).
+
+        Returns:
+            Dict symbol -> (DataFrame with indicators, analysis_info) or None
+        """
+        timeframe = timeframes.normalize_timeframe(timeframe)
+        yf_interval = timeframes.base_interval(timeframe)
+        base_rows = timeframes.base_limit(timeframe, limit, INDICATOR_WARMUP_BARS, cap=candle_store.max_rows)
+
+        # Group what still has to be downloaded by interval and window
+        groups: Dict[Tuple, List[Tuple[str, str, Dict[str, Any]]]] = {}
+        for symbol in dict.fromkeys(symbols):
+            if force:
+                market_data_cache.pop((symbol, timeframe, limit), None)
+            elif (symbol, timeframe, limit) in market_data_cache:
+                continue
+            formatted_symbol = YahooFinanceProvider._format_symbol(symbol, is_crypto=False, is_commodity=False)
+            plan = YahooFinanceProvider._plan_download(symbol, formatted_symbol, yf_interval, base_rows)
+            if plan is None:
+                continue
+            download_key = YahooFinanceProvider._download_cache_key(formatted_symbol, yf_interval, plan['start_date'], plan['end_date'], plan['period'])
+            if force:
+                data_download_cache.pop(download_key, None)
+            elif download_key in data_download_cache:
+                continue
+            window = download_key[2:]  # period, or start/end day
+            groups.setdefault((yf_interval, window), []).append((symbol, formatted_symbol, plan))
+
+        requests_made = 0
+        for (interval, _), members in groups.items():
+            for chunk_start in range(0, len(members), YAHOO_BATCH_SIZE):
+                chunk = members[chunk_start:chunk_start + YAHOO_BATCH_SIZE]
+                plans = [plan for _, _, plan in chunk]
+                # Incremental windows differ per symbol within a day: start at the earliest one
+                starts = [p['start_date'] for p in plans if p['start_date'] is not None]
+                start_date = min(starts) if starts else None
+                tickers = [formatted for _, formatted, _ in chunk]
+
+                await YahooFinanceProvider._wait_for_rate_limit()
+                start = time.perf_counter()
+                frames = await YahooFinanceProvider._download_batch(tickers, interval, start_date, plans[0]['end_date'], plans[0]['period'])
+                requests_made += 1
+                chart_metrics.record("yahoo.batch_download", time.perf_counter() - start)
+                logger.info(f"[Yahoo] Batch download of {len(tickers)} tickers ({interval}) returned data for {len(frames)}")
+
+                for symbol, formatted_symbol, plan in chunk:
+                    frame = frames.get(formatted_symbol)
+                    if frame is None:
+                        if not frames:
+                            # The whole request failed: left to get_market_data, which downloads it on its own
+                            continue
+                        # The request worked but had no bars for this ticker (e.g. market closed)
+                        frame = pd.DataFrame()
+                    download_key = YahooFinanceProvider._download_cache_key(formatted_symbol, interval, plan['start_date'], plan['end_date'], plan['period'])
+                    data_download_cache[download_key] = compact_frame(frame, DOWNLOAD_COLUMNS)
+
+        chart_metrics.increment("yahoo.batch_requests", requests_made)
+
+        results: Dict[str, Optional[Tuple[pd.DataFrame, Dict]]] = {}
+        for symbol in dict.fromkeys(symbols):
+            try:
+                results[symbol] = await YahooFinanceProvider.get_market_data(symbol, limit=limit, timeframe=timeframe)
+            except Exception as e:
+                logger.error(f"[Yahoo] Error getting market data for {symbol} after batch download: {e}")
+                results[symbol] = None
+        return results
+
     @staticmethod
     def _validate_and_clean_data(df: pd.DataFrame, instrument: str = None) -> pd.DataFrame:
         """
@@ -513,61 +675,131 @@ class YahooFinanceProvider:
               return str(days_needed) # Return as string for consistency before ValueError check
 
     @staticmethod
-    async def get_market_data(symbol: str, limit: int = 100) -> Optional[Tuple[pd.DataFrame, Dict]]:
+    def _plan_download(symbol: str, formatted_symbol: str, yf_interval: str, limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Decide what to download for a symbol: an incremental update from the candle store, a period
+        (intraday) or a start/end range (daily and longer).
+
+        Returns:
+            Dict with store_key, needed_rows, incremental, start_date, end_date and period, or None
+            if the interval is invalid
+        """
+        end_date = datetime.now()
+        yf_period = None
+        start_date = None
+
+        # History (incl. indicator warm-up) lives in the local candle store; when it has enough,
+        # only the bars since the last stored one are downloaded
+        store_key = ("yahoo", formatted_symbol, yf_interval)
+        needed_rows = limit + INDICATOR_WARMUP_BARS
+        missing_bars = candle_store.missing_bars(*store_key)
+        incremental = (missing_bars is not None and missing_bars <= MAX_INCREMENTAL_BARS
+                       and candle_store.row_count(*store_key) >= needed_rows)
+
+        if incremental:
+            # Start at the last stored bar: it may still have been forming when it was stored
+            start_date = datetime.fromtimestamp(candle_store.last_timestamp(*store_key), tz=timezone.utc)
+            end_date = datetime.now(timezone.utc)
+            logger.info(f"[Yahoo] Incremental update for {symbol} from {start_date} ({missing_bars} new bars expected)")
+        # Use 'period' for intraday intervals (< 1d) for better reliability
+        elif 'm' in yf_interval or 'h' in yf_interval:
+            # Calculate period string (e.g., '21d' for 300 bars of 1h)
+            yf_period = YahooFinanceProvider._calculate_period_for_interval(yf_interval, needed_rows)
+            logger.info(f"[Yahoo] Using period='{yf_period}' for interval '{yf_interval}'")
+        elif yf_interval: # For daily or longer, use start/end date
+            approx_days_str = YahooFinanceProvider._calculate_period_for_interval(yf_interval, needed_rows) # Use helper to get approx days needed
+            try:
+                 required_days = int(approx_days_str) # Period calculation now returns days as int
+            except ValueError:
+                 logger.warning(f"Could not parse days from {approx_days_str}, defaulting to 365")
+                 required_days = 365
+            start_date = end_date - timedelta(days=required_days)
+            logger.info(f"[Yahoo] Using start='{start_date.date()}', end='{end_date.date()}' for interval '{yf_interval}'")
+        else:
+            return None
+
+        return {
+            'store_key': store_key,
+            'needed_rows': needed_rows,
+            'incremental': incremental,
+            'start_date': start_date,
+            'end_date': end_date,
+            'period': yf_period,
+        }
+
+    @staticmethod
+    async def get_market_data(symbol: str, limit: int = 100, timeframe: str = "H1") -> Optional[Tuple[pd.DataFrame, Dict]]:
         """
-        Fetches market data from Yahoo Finance for a FIXED timeframe (H1), validates it, and calculates indicators.
+        Fetches market data from Yahoo Finance, validates it, and calculates indicators.
         Returns a tuple: (DataFrame with indicators, analysis_info dictionary)
+
+        Every timeframe (M15, H1, H4, D1) comes from the finest stored series (15m or 1h):
+        higher timeframes are resampled locally, aligned to the market's session start, so
+        they cost CPU instead of separate downloads. Concurrent misses for the same symbol,
+        timeframe and limit share one fetch.
         """
-        # <<< FIXED TIMEFRAME >>>
-        fixed_timeframe = "H1" 
-        # <<< END FIXED TIMEFRAME >>>
+        timeframe = timeframes.normalize_timeframe(timeframe)
+        result = await _market_data_flight.do((symbol, timeframe, limit),
+                                              lambda: YahooFinanceProvider._load_market_data(symbol, limit, timeframe))
+        if isinstance(result, tuple) and len(result) == 2 and result[0] is not None:
+            # Every caller gets its own frame object over the shared read-only arrays
+            return frame_view(result[0]), dict(result[1])
+        return result
 
-        cache_key = (symbol, fixed_timeframe, limit) # Use fixed_timeframe in cache key
-        if cache_key in market_data_cache:
-            logger.info(f"[Yahoo Cache] HIT for market data: {symbol} timeframe {fixed_timeframe} limit {limit}")
-            cached_df, cached_info = market_data_cache[cache_key]
-            return cached_df.copy(), cached_info.copy() # Return copies
-        logger.info(f"[Yahoo Cache] MISS for market data: {symbol} timeframe {fixed_timeframe} limit {limit}")
+    @staticmethod
+    def _market_of(formatted_symbol: str) -> str:
+        """Market of a Yahoo symbol, for session-aligned resampling"""
+        entry = instrument_registry.get(formatted_symbol)
+        if entry is not None:
+            return entry.market
+        if formatted_symbol.endswith("=X"):
+            return "forex"
+        if formatted_symbol.endswith("=F"):
+            return "commodity"
+        if formatted_symbol.startswith("^"):
+            return "index"
+        if formatted_symbol.endswith("-USD"):
+            return "crypto"
+        return "forex"
 
-        logger.info(f"[Yahoo] Getting market data for {symbol} on fixed {fixed_timeframe} timeframe") # Log fixed timeframe
+    @staticmethod
+    async def _load_market_data(symbol: str, limit: int = 100, timeframe: str = "H1") -> Optional[Tuple[pd.DataFrame, Dict]]:
+        """Cache lookup, download, validation, resampling and indicators behind get_market_data"""
+        cache_key = (symbol, timeframe, limit)
+        if cache_key in market_data_cache:
+            logger.info(f"[Yahoo Cache] HIT for market data: {symbol} timeframe {timeframe} limit {limit}")
+            cached = market_data_cache[cache_key]
+            if cached is None: # Failed fetch, cached briefly
+                return None, None
+            cached_df, cached_info = cached
+            return frame_view(cached_df), dict(cached_info) # Read-only view, no copy
+        logger.info(f"[Yahoo Cache] MISS for market data: {symbol} timeframe {timeframe} limit {limit}")
+
+        logger.info(f"[Yahoo] Getting market data for {symbol} on {timeframe} timeframe")
         df = None
         analysis_info = {}
 
         try:
-            # 1. Format symbol and map timeframe
+            # 1. Format symbol and map the timeframe to the interval of its base series
             formatted_symbol = YahooFinanceProvider._format_symbol(symbol, is_crypto=False, is_commodity=False) # Assume not crypto/commodity unless detected
-            yf_interval = YahooFinanceProvider._map_timeframe_to_yfinance(fixed_timeframe) # Use fixed_timeframe
-
-            if not yf_interval:
-                 logger.error(f"[Yahoo] Could not map fixed timeframe '{fixed_timeframe}' to yfinance interval.")
-                 return None
+            yf_interval = timeframes.base_interval(timeframe)
+            resampled = timeframes.bars_per_candle(timeframe) > 1
+            # Enough base bars for `limit` candles (and their indicator warm-up) after resampling
+            base_rows = timeframes.base_limit(timeframe, limit, INDICATOR_WARMUP_BARS, cap=candle_store.max_rows)
 
             # 2. Determine date range or period and download data
-            end_date = datetime.now()
-            yf_period = None
-            start_date = None
-
-            # Use 'period' for intraday intervals (< 1d) for better reliability
-            if 'm' in yf_interval or 'h' in yf_interval:
-                # Calculate period string (e.g., '729d' for 1h to stay within limit)
-                yf_period = YahooFinanceProvider._calculate_period_for_interval(yf_interval, limit)
-                logger.info(f"[Yahoo] Using period='{yf_period}' for interval '{yf_interval}'")
-            elif yf_interval: # For daily or longer, use start/end date
-                approx_days_str = YahooFinanceProvider._calculate_period_for_interval(yf_interval, limit) # Use helper to get approx days needed
-                try:
-                     required_days = int(approx_days_str) # Period calculation now returns days as int
-                except ValueError:
-                     logger.warning(f"Could not parse days from {approx_days_str}, defaulting to 365")
-                     required_days = 365
-                start_date = end_date - timedelta(days=required_days)
-                logger.info(f"[Yahoo] Using start='{start_date.date()}', end='{end_date.date()}' for interval '{yf_interval}'")
-            else: # Fallback if interval mapping failed
+            plan = YahooFinanceProvider._plan_download(symbol, formatted_symbol, yf_interval, base_rows)
+            if plan is None: # Fallback if interval mapping failed
                  logger.error(f"[Yahoo] Invalid yfinance interval '{yf_interval}'. Cannot fetch data.")
                  market_data_cache[cache_key] = None # Cache None result
                  return None, None # Return tuple
+            store_key, needed_rows, incremental = plan['store_key'], plan['needed_rows'], plan['incremental']
+            start_date, end_date, yf_period = plan['start_date'], plan['end_date'], plan['period']
 
-            # Wait for rate limit
-            await YahooFinanceProvider._wait_for_rate_limit()
+            # Wait for rate limit (not needed when a batch download already filled the cache)
+            download_key = YahooFinanceProvider._download_cache_key(formatted_symbol, yf_interval, start_date, end_date, yf_period)
+            if download_key not in data_download_cache:
+                await YahooFinanceProvider._wait_for_rate_limit()
             
             try:
                 # Download the data from Yahoo Finance using the cached downloader
@@ -577,64 +809,45 @@ class YahooFinanceProvider:
                     end_date,
                     yf_interval,
                     timeout=30,
-                    original_symbol=symbol
+                    original_symbol=symbol,
+                    period=yf_period
                 )
                 
-                if df is None or df.empty:
+                if (df is None or df.empty) and not incremental:
                     logger.warning(f"[Yahoo] No data returned for {symbol} ({formatted_symbol}) after download attempt.")
                     market_data_cache[cache_key] = None # Cache None result
                     return None, None # Return tuple
                     
-                # Log success and data shape before validation
-                logger.info(f"[Yahoo] Successfully downloaded data for {symbol} with shape {df.shape}")
-                
-                # Validate and clean the data
-                df_validated = YahooFinanceProvider._validate_and_clean_data(df.copy(), symbol) # Validate a copy
+                df_validated = None
+                if df is not None and not df.empty:
+                    # Log success and data shape before validation
+                    logger.info(f"[Yahoo] Successfully downloaded data for {symbol} with shape {df.shape}")
+                    
+                    # Validate and clean the data
+                    df_validated = YahooFinanceProvider._validate_and_clean_data(df.copy(), symbol) # Validate a copy
+
+                # Merge into the candle store (a full download replaces the stored series) and read the window back
+                if df_validated is not None and not df_validated.empty:
+                    candle_store.write(*store_key, df_validated, replace=not incremental)
+                stored = candle_store.read(*store_key, limit=needed_rows)
+                if stored is not None and not stored.empty:
+                    df_validated = stored
+                chart_metrics.increment("candle_store.yahoo." + ("incremental" if incremental else "full"))
 
                 if df_validated is None or df_validated.empty:
                      logger.warning(f"[Yahoo] Data validation failed or resulted in empty DataFrame for {symbol}")
                      market_data_cache[cache_key] = None # Cache None result
                      return None, None # Return tuple
 
-                # For 4h timeframe, resample from 1h
-                if fixed_timeframe == "4h" and yf_interval == "1h": # Ensure we fetched 1h data
-                    logger.info(f"[Yahoo] Resampling 1h data to 4h for {symbol}")
-                    try:
-                        # Ensure index is datetime before resampling
-                        if not isinstance(df_validated.index, pd.DatetimeIndex):
-                             df_validated.index = pd.to_datetime(df_validated.index)
-                             
-                        # Ensure timezone information exists (UTC is common) for resampling
-                        if df_validated.index.tz is None:
-                           df_validated = df_validated.tz_localize('UTC')
-                        else:
-                           df_validated = df_validated.tz_convert('UTC') # Convert to UTC if needed
-
-                        # Define resampling logic
-                        resample_logic = {
-                            'Open': 'first',
-                            'High': 'max',
-                            'Low': 'min',
-                            'Close': 'last',
-                            'Volume': 'sum'
-                        }
-                        # Filter out columns not present in df_validated
-                        resample_logic = {k: v for k, v in resample_logic.items() if k in df_validated.columns}
-
-                        df_resampled = df_validated.resample('4H', label='right', closed='right').agg(resample_logic)
-                        df_resampled.dropna(inplace=True) # Drop rows where any value is NaN (often first row after resample)
-                        
-                        if df_resampled.empty:
-                             logger.warning(f"[Yahoo] Resampling to 4h resulted in empty DataFrame for {symbol}. Using 1h data instead.")
-                             # Stick with df_validated (1h) if resampling fails
-                        else:
-                             df_validated = df_resampled # Use the resampled data
-                             logger.info(f"[Yahoo] Successfully resampled to 4h with shape {df_validated.shape}")
-                             
-                    except Exception as resample_e:
-                        logger.error(f"[Yahoo] Error resampling to 4h: {str(resample_e)}")
-                        # Continue with 1h data (df_validated) if resampling fails
-                
+                # Higher timeframes are aggregated from the base series (cached per base state)
+                indicator_key = store_key
+                if resampled:
+                    market = YahooFinanceProvider._market_of(formatted_symbol)
+                    df_validated = timeframes.resample_cached(df_validated, timeframe, market, store_key)
+                    # Separate indicator state per timeframe
+                    indicator_key = store_key + (timeframe,)
+                    logger.info(f"[Yahoo] Resampled {yf_interval} data to {timeframe} ({market} session) for {symbol}: {len(df_validated)} candles")
+
                 # Ensure we have enough data *before* limiting for indicators
                 if len(df_validated) < limit: # Check if we have enough historical data
                      logger.warning(f"[Yahoo] Insufficient data after cleaning/resampling for {symbol} (got {len(df_validated)}, needed ~{limit}). Indicators might be inaccurate.")
@@ -661,29 +874,10 @@ class YahooFinanceProvider:
                               'volume': float(last_row['Volume']) if 'Volume' in df_with_indicators.columns and pd.notna(last_row['Volume']) else 0
                          }
 
-                         # 4. Calculate Technical Indicators using plain pandas
-                         logger.info(f"[Yahoo] Calculating indicators for {symbol} manually using pandas")
+                         # 4. Calculate Technical Indicators with the shared engine (incremental per series)
+                         logger.info(f"[Yahoo] Calculating indicators for {symbol}")
                          try:
-                             close = df_with_indicators['Close'] # Use validated column name
-
-                             # EMA
-                             df_with_indicators['EMA_20'] = close.ewm(span=20, adjust=False).mean()
-                             df_with_indicators['EMA_50'] = close.ewm(span=50, adjust=False).mean()
-                             df_with_indicators['EMA_200'] = close.ewm(span=200, adjust=False).mean()
-
-                             # RSI
-                             delta = close.diff()
-                             gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-                             loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-                             rs = gain / loss
-                             df_with_indicators['RSI_14'] = 100 - (100 / (1 + rs))
-
-                             # MACD
-                             ema_12 = close.ewm(span=12, adjust=False).mean()
-                             ema_26 = close.ewm(span=26, adjust=False).mean()
-                             df_with_indicators['MACD_12_26_9'] = ema_12 - ema_26
-                             df_with_indicators['MACDs_12_26_9'] = df_with_indicators['MACD_12_26_9'].ewm(span=9, adjust=False).mean()
-                             df_with_indicators['MACDh_12_26_9'] = df_with_indicators['MACD_12_26_9'] - df_with_indicators['MACDs_12_26_9'] # Histogram
+                             df_with_indicators = indicator_engine.compute(df_with_indicators, key=indicator_key)
                              logger.info(f"[Yahoo] Indicators calculated. DataFrame columns: {df_with_indicators.columns.tolist()}")
 
                          except Exception as ta_error:
@@ -700,11 +894,12 @@ class YahooFinanceProvider:
                 
                 # --- Prepare result and cache --- 
                 # Return the limited DataFrame AND the separate indicators dict
-                result_df = df_limited.copy()
+                # Compact float32 form with only the chart/analysis columns; the cache and callers share it read-only
+                result_df = compact_frame(df_limited, MARKET_DATA_COLUMNS)
                 # REMOVED: result_df.indicators = indicators # Avoid UserWarning by not setting attribute (FIXED WARNING)
                 
                 # Cache the final result tuple (DataFrame, indicators_dict)
-                market_data_cache[cache_key] = (result_df.copy(), indicators.copy()) # Cache copies
+                market_data_cache[cache_key] = (result_df, indicators.copy())
                 # Log the shape being returned
                 logger.info(f"[Yahoo] Returning market data for {symbol} with shape {result_df.shape}")
 
@@ -734,8 +929,6 @@ class YahooFinanceProvider:
             # Wait for rate limit
             await YahooFinanceProvider._wait_for_rate_limit()
             
-            loop = asyncio.get_event_loop()
-            
             # Get stock info with yfinance
             def get_info():
                 try:
@@ -746,7 +939,7 @@ class YahooFinanceProvider:
                     logger.error(f"Error getting stock info: {str(e)}")
                     raise e
             
-            info = await loop.run_in_executor(None, get_info)
+            info = await market_data_executor.run(get_info)
             return info
             
         except Exception as e:
@@ -763,46 +956,17 @@ class YahooFinanceProvider:
         Returns:
             int: Number of decimal places to use
         """
-        instrument = instrument.upper().replace("/", "")
-        
-        # JPY pairs use 3 decimal places
-        if instrument.endswith("JPY") or "JPY" in instrument:
-            return 3
-            
-        # Most forex pairs use 5 decimal places
-        if len(instrument) == 6 and all(c.isalpha() for c in instrument):
-            return 5
-            
-        # Crypto typically uses 2 decimal places for major coins, more for smaller ones
-        if any(crypto in instrument for crypto in ["BTC", "ETH", "LTC", "XRP"]):
-            return 2
-            
-        # Gold typically uses 2 decimal places
-        if instrument in ["XAUUSD", "GC=F"]:
-            return 2
-            
-        # Silver typically uses 3 decimal places
-        if instrument in ["XAGUSD", "SI=F"]:
-            return 3
-            
-        # Indices typically use 2 decimal places
-        if any(index in instrument for index in ["US30", "US500", "US100", "UK100", "DE40", "JP225"]):
-            return 2
-            
-        # Default to 4 decimal places as a safe value
-        return 4
+        return instrument_registry.precision(instrument)
     
     @staticmethod
     def _format_symbol(instrument: str, is_crypto: bool, is_commodity: bool) -> str:
         """Format instrument symbol for Yahoo Finance API"""
         instrument = instrument.upper().replace("/", "")
+        entry = instrument_registry.get(instrument)
+        if entry is not None:
+            return entry.yahoo_symbol
+        
         
-        # For forex (EURUSD -> EUR=X)
-        if len(instrument) == 6 and all(c.isalpha() for c in instrument):
-            base = instrument[:3]
-            quote = instrument[3:]
-            return f"{base}{quote}=X"
-            
         # For commodities - using correct futures contract symbols
         if instrument == "XAUUSD":
             return "GC=F"  # Gold futures
@@ -821,6 +985,12 @@ class YahooFinanceProvider:
         elif instrument == "COPPER":
             return "HG=F"  # Copper futures
         
+        # For forex (EURUSD -> EURUSD=X), after the commodities (XAUUSD is six letters too)
+        if len(instrument) == 6 and all(c.isalpha() for c in instrument):
+            base = instrument[:3]
+            quote = instrument[3:]
+            return f"{base}{quote}=X"
+            
         # For indices
         if any(index in instrument for index in ["US30", "US500", "US100", "UK100", "DE40", "JP225"]):
             indices_map = {
@@ -9,6 +9,8 @@ import datetime
 from datetime import timezone
 import traceback
 
+from trading_bot.services.instrument_registry import instrument_registry
+
 logger = logging.getLogger(__name__)
 
 class Database:
@@ -953,38 +955,7 @@ class Database:
 
     def _detect_market(self, instrument: str) -> str:
         """Detect market type from instrument name"""
-        instrument = instrument.upper()
-         
-        # Common forex pairs
-        forex_pairs = ["EUR", "USD", "GBP", "JPY", "AUD", "NZD", "CAD", "CHF"]
-         
-        # Check if it's a forex pair (contains two currency codes)
-        for base in forex_pairs:
-            if instrument.startswith(base):
-                for quote in forex_pairs:
-                    if instrument == base + quote:
-                        return "forex"
-         
-        # Check if it's a crypto pair
-        crypto_pairs = ["BTC", "ETH", "XRP", "LTC", "BCH", "EOS", "BNB", "XLM", "ADA", "TRX"]
-        for crypto in crypto_pairs:
-            if crypto in instrument:
-                return "crypto"
-         
-        # Check if it's an index
-        indices = ["SPX", "NDX", "DJI", "FTSE", "DAX", "CAC", "NIKKEI", "HSI"]
-        for index in indices:
-            if index in instrument:
-                return "indices"
-         
-        # Check if it's a commodity
-        commodities = ["GOLD", "SILVER", "OIL", "GAS", "XAU", "XAG"]
-        for commodity in commodities:
-            if commodity in instrument:
-                return "commodities"
-         
-        # Default to forex if we can't determine
-        return "forex" 
+        return instrument_registry.category(instrument)
 
     async def subscribe_to_instrument(self, user_id: int, instrument: str, timeframe: str = None) -> bool:
         """Subscribe a user to receive signals for a specific instrument
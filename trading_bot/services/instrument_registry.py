@@ -0,0 +1,230 @@
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Plural market names as used by the bot menus and the database (signal_subscriptions.market)
+CATEGORIES = {
+    "forex": "forex",
+    "crypto": "crypto",
+    "commodity": "commodities",
+    "index": "indices",
+}
+
+_TV = "https://www.tradingview.com/chart/"
+
+# symbol: (chart layout id, signal timeframe)
+_FOREX = {
+    "EURUSD": ("xknpxpcr", "H4"), "EURGBP": ("xt6LdUUi", "H1"), "EURCHF": ("4Jr8hVba", "H4"),
+    "EURJPY": ("ume7H7lm", "M30"), "EURCAD": ("gbtrKFPk", "H1"), "EURAUD": ("WweOZl7z", "M30"),
+    "EURNZD": ("bcrCHPsz", None), "GBPUSD": ("jKph5b1W", "M30"), "GBPCHF": ("1qMsl4FS", "H1"),
+    "GBPJPY": ("Zcmh5M2k", None), "GBPCAD": ("CvwpPBpF", "H4"), "GBPAUD": ("neo3Fc3j", "M30"),
+    "GBPNZD": ("egeCqr65", "M15"), "CHFJPY": ("g7qBPaqM", None), "USDJPY": ("mcWuRDQv", "H1"),
+    "USDCHF": ("e7xDgRyM", "H1"), "USDCAD": ("jjTOeBNM", "M30"), "CADJPY": ("KNsPbDME", None),
+    "CADCHF": ("XnHRKk5I", "H4"), "AUDUSD": ("h7CHetVW", None), "AUDCHF": ("oooBW6HP", "H1"),
+    "AUDJPY": ("sYiGgj7B", "H1"), "AUDNZD": ("AByyHLB4", None), "AUDCAD": ("L4992qKp", "H4"),
+    "NZDUSD": ("yab05IFU", "M15"), "NZDCHF": ("7epTugqA", "H4"), "NZDJPY": ("fdtQ7rx7", "H1"),
+    "NZDCAD": ("mRVtXs19", "M30"),
+}
+
+# symbol: (chart layout id, signal timeframe, precision)
+_CRYPTO = {
+    "BTCUSD": ("NWT8AI4a", "M30", 2), "ETHUSD": ("rVh10RLj", "M30", 2), "XRPUSD": ("tQu9Ca4E", "H1", 4),
+    "SOLUSD": ("oTTmSjzQ", "M15", 4), "BNBUSD": ("wNBWNh23", "M30", 4), "ADAUSD": ("WcBNFrdb", None, 4),
+    "LTCUSD": ("AoDblBMt", None, 2), "DOGEUSD": ("F6SPb52v", "M15", 4), "DOTUSD": ("nT9dwAx2", "M30", 4),
+    "LINKUSD": ("FzOrtgYw", "H4", 4), "XLMUSD": ("SnvxOhDh", "M30", 4), "AVAXUSD": ("LfTlCrdQ", None, 4),
+}
+
+# symbol: (base, Yahoo symbol, chart layout id, signal timeframe, precision)
+_COMMODITIES = {
+    "XAUUSD": ("XAU", "GC=F", "bylCuCgc", "M15", 2),
+    "XAGUSD": ("XAG", "SI=F", None, "M15", 3),
+    "XTIUSD": ("XTI", "CL=F", "jxU29rbq", "M30", 2),
+    "USOIL": ("XTI", "CL=F", None, "M30", 2),
+    "XBRUSD": ("XBR", "BZ=F", None, None, 2),
+    "XPDUSD": ("XPD", "PA=F", None, None, 2),
+    "XPTUSD": ("XPT", "PL=F", None, None, 2),
+    "NATGAS": ("NATGAS", "NG=F", None, None, 3),
+    "COPPER": ("COPPER", "HG=F", None, None, 4),
+}
+
+# symbol: (currency, Yahoo symbol, chart layout id, signal timeframe)
+_INDICES = {
+    "US30": ("USD", "^DJI", "heV5Zitn", "M30"),
+    "US500": ("USD", "^GSPC", "VsfYHrwP", "M30"),
+    "US100": ("USD", "^NDX", "5d36Cany", "M30"),
+    "UK100": ("GBP", "^FTSE", "0I4gguQa", "M15"),
+    "DE40": ("EUR", "^GDAXI", "OWzg0XNw", "M30"),
+    "FR40": ("EUR", "^FCHI", "RoPe3S1Q", None),
+    "EU50": ("EUR", "^STOXX50E", "tt5QejVd", None),
+    "JP225": ("JPY", "^N225", "i562Fk6X", None),
+    "AU200": ("AUD", "^AXJO", "U5CKagMM", "H4"),
+    "HK50": ("HKD", "^HSI", "Rllftdyl", "H1"),
+}
+
+# Other spellings that are in use (old chart link keys, broker names, index nicknames)
+_ALIASES = {
+    "NDZUSD": "NZDUSD", "DOGUSD": "DOGEUSD", "LNKUSD": "LINKUSD", "AVXUSD": "AVAXUSD",
+    "GOLD": "XAUUSD", "SILVER": "XAGUSD", "WTIUSD": "XTIUSD", "CLUSD": "XTIUSD",
+    "BCOUSD": "XBRUSD", "BRENT": "XBRUSD", "GER30": "DE40", "GER40": "DE40", "DAX": "DE40",
+    "DJI": "US30", "SPX": "US500", "NDX": "US100", "FTSE": "UK100", "CAC": "FR40",
+    "NIKKEI": "JP225", "HSI": "HK50", "ASX": "AU200",
+}
+
+# Only used for instruments that are not in the registry
+_FIAT = frozenset(["EUR", "USD", "GBP", "JPY", "AUD", "NZD", "CAD", "CHF"])
+_CRYPTO_BASES = frozenset([
+    "BTC", "ETH", "XRP", "LTC", "BCH", "ADA", "DOT", "LINK", "XLM", "DOGE", "UNI", "AAVE", "SNX",
+    "SUSHI", "YFI", "COMP", "MKR", "BAT", "ZRX", "REN", "KNC", "BNB", "SOL", "AVAX", "MATIC", "ALGO",
+    "ATOM", "FTM", "NEAR", "ONE", "HBAR", "VET", "THETA", "FIL", "TRX", "EOS", "NEO", "CAKE", "LUNA",
+    "SHIB", "MANA", "SAND", "AXS", "CRV", "ENJ", "CHZ", "GALA", "ROSE", "APE", "FTT", "GRT", "GMT",
+    "EGLD", "XTZ", "FLOW", "ICP", "XMR", "DASH",
+])
+_CRYPTO_QUOTES = ("USDT", "BUSD", "USDC", "USD", "BTC", "ETH")
+_COMMODITY_PREFIXES = ("XAU", "XAG", "XPT", "XPD", "XTI", "XBR", "OIL", "USOIL")
+_INDEX_NAMES = frozenset(["ES35", "IT40", "IBEX", "MIB", "CH20", "NL25"])
+
+
+@dataclass(frozen=True)
+class Instrument:
+    """Everything the services need to know about one instrument"""
+    symbol: str
+    market: str                       # 'forex', 'crypto', 'commodity' or 'index'
+    precision: int                    # Decimal places for prices
+    base: str                         # Currency legs: EURUSD -> EUR/USD, US500 -> US500/USD
+    quote: str
+    yahoo_symbol: str
+    binance_symbol: Optional[str]     # Only for crypto
+    chart_url: Optional[str]          # TradingView layout
+    default_timeframe: Optional[str]  # Signal timeframe (None: no signals for this instrument)
+
+    @property
+    def category(self) -> str:
+        """Plural market name used by the bot and the database ('commodities', 'indices')"""
+        return CATEGORIES[self.market]
+
+
+def _build() -> List[Instrument]:
+    instruments = []
+    for symbol, (layout, timeframe) in _FOREX.items():
+        instruments.append(Instrument(symbol, "forex", 3 if symbol.endswith("JPY") else 5, symbol[:3], symbol[3:],
+                                      f"{symbol}=X", None, _TV + layout + "/", timeframe))
+    for symbol, (layout, timeframe, precision) in _CRYPTO.items():
+        base = symbol[:-3]
+        instruments.append(Instrument(symbol, "crypto", precision, base, "USD", f"{base}-USD", f"{base}USDT",
+                                      _TV + layout + "/", timeframe))
+    for symbol, (base, yahoo, layout, timeframe, precision) in _COMMODITIES.items():
+        instruments.append(Instrument(symbol, "commodity", precision, base, "USD", yahoo, None,
+                                      _TV + layout + "/" if layout else None, timeframe))
+    for symbol, (currency, yahoo, layout, timeframe) in _INDICES.items():
+        instruments.append(Instrument(symbol, "index", 2, symbol, currency, yahoo, None,
+                                      _TV + layout + "/", timeframe))
+    return instruments
+
+
+def _normalize(instrument: str) -> str:
+    return instrument.strip().upper().replace("/", "")
+
+
+@lru_cache(maxsize=4096)
+def _guess_market(instrument: str) -> str:
+    """Market of an instrument outside the registry, from its shape (suffix and prefix lookups)"""
+    if len(instrument) == 6 and instrument[:3] in _FIAT and instrument[3:] in _FIAT:
+        return "forex"
+    if instrument in _CRYPTO_BASES:
+        return "crypto"
+    for quote in _CRYPTO_QUOTES:
+        if instrument.endswith(quote) and instrument[:-len(quote)] in _CRYPTO_BASES:
+            return "crypto"
+    if instrument.endswith(("USDT", "BUSD", "USDC")):
+        return "crypto"
+    if instrument.startswith(_COMMODITY_PREFIXES):
+        return "commodity"
+    if instrument in _INDEX_NAMES:
+        return "index"
+    # New coins are quoted in USD as well
+    if instrument.endswith("USD") and len(instrument) > 6:
+        return "crypto"
+    return "forex"
+
+
+class InstrumentRegistry:
+    """
+    Immutable instrument table, built once at import. Lookups by symbol, alias or provider symbol
+    (GC=F, BTCUSDT) are dict hits; unknown instruments fall back to a cached guess of the market.
+    """
+
+    def __init__(self, instruments: List[Instrument], aliases: Dict[str, str]):
+        by_symbol = {i.symbol: i for i in instruments}
+        lookup = dict(by_symbol)
+        for instrument in instruments:
+            for provider_symbol in (instrument.yahoo_symbol, instrument.binance_symbol):
+                if provider_symbol:
+                    lookup.setdefault(provider_symbol, instrument)
+        for alias, symbol in aliases.items():
+            lookup.setdefault(alias, by_symbol[symbol])
+        self._instruments: Mapping[str, Instrument] = MappingProxyType(by_symbol)
+        self._lookup: Mapping[str, Instrument] = MappingProxyType(lookup)
+        self.chart_links: Mapping[str, str] = MappingProxyType(
+            {i.symbol: i.chart_url for i in instruments if i.chart_url})
+        self._by_market: Mapping[str, Tuple[str, ...]] = MappingProxyType({
+            market: tuple(i.symbol for i in instruments if i.market == market) for market in CATEGORIES
+        })
+
+    def __iter__(self) -> Iterator[Instrument]:
+        return iter(self._instruments.values())
+
+    def __len__(self) -> int:
+        return len(self._instruments)
+
+    def __contains__(self, instrument: str) -> bool:
+        return _normalize(instrument) in self._lookup
+
+    def get(self, instrument: str) -> Optional[Instrument]:
+        """The registry entry for a symbol, alias or provider symbol, or None"""
+        return self._lookup.get(_normalize(instrument))
+
+    def symbols(self, market: Optional[str] = None) -> Tuple[str, ...]:
+        """All symbols, or those of one market ('forex', 'crypto', 'commodity', 'index')"""
+        if market is None:
+            return tuple(self._instruments)
+        return self._by_market.get(market, ())
+
+    def feed_symbols(self, market: Optional[str] = None) -> Tuple[str, ...]:
+        """Like symbols(), with one symbol per price feed (USOIL and XTIUSD are both CL=F)"""
+        feeds = {}
+        for symbol in self.symbols(market):
+            feeds.setdefault(self._instruments[symbol].yahoo_symbol, symbol)
+        return tuple(feeds.values())
+
+    def market(self, instrument: str) -> str:
+        """'forex', 'crypto', 'commodity' or 'index'"""
+        entry = self.get(instrument)
+        return entry.market if entry is not None else _guess_market(_normalize(instrument))
+
+    def category(self, instrument: str) -> str:
+        """'forex', 'crypto', 'commodities' or 'indices' (bot and database naming)"""
+        return CATEGORIES[self.market(instrument)]
+
+    def precision(self, instrument: str) -> int:
+        entry = self.get(instrument)
+        if entry is not None:
+            return entry.precision
+        normalized = _normalize(instrument)
+        if "JPY" in normalized:
+            return 3
+        return {"forex": 5, "index": 2}.get(self.market(normalized), 4)
+
+    def chart_url(self, instrument: str) -> Optional[str]:
+        entry = self.get(instrument)
+        return entry.chart_url if entry is not None else None
+
+    def signal_timeframes(self) -> Dict[str, str]:
+        """Symbol -> signal timeframe for every instrument that has signals"""
+        return {i.symbol: i.default_timeframe for i in self if i.default_timeframe}
+
+
+instrument_registry = InstrumentRegistry(_build(), _ALIASES)
@@ -17,6 +17,8 @@ import statistics
 import copy
 import traceback
 
+from trading_bot.services.instrument_registry import instrument_registry
+
 logger = logging.getLogger(__name__)
 
 class PerformanceMetrics:
@@ -1680,16 +1682,7 @@ The percentages MUST add up to 100%, and the formatted text MUST include all sec
     
     def _guess_market_from_instrument(self, instrument: str) -> str:
         """Guess market type from instrument symbol"""
-        if instrument.startswith(('XAU', 'XAG', 'OIL', 'USOIL', 'BRENT')):
-            return 'commodities'
-        elif instrument.endswith('USD') and len(instrument) <= 6:
-            return 'forex'
-        elif instrument in ('US30', 'US500', 'US100', 'GER30', 'UK100'):
-            return 'indices'
-        elif instrument in ('BTCUSD', 'ETHUSD', 'XRPUSD'):
-            return 'crypto'
-        else:
-            return 'forex'  # Default to forex
+        return instrument_registry.category(instrument)
     
     def _get_mock_sentiment_data(self, instrument: str) -> Dict[str, Any]:
         """Generate mock sentiment data for an instrument"""
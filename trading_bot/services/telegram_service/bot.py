@@ -64,6 +64,8 @@ class ConfigManager:
         return os.getenv(key, default)
 
 # Relatieve imports gebruiken voor lokale modules
+from ..instrument_registry import instrument_registry
+
 try:
     from ..chart_service.chart import ChartService
 except ImportError:
@@ -74,6 +76,17 @@ except ImportError:
         async def get_technical_analysis(self, instrument, timeframe=None):
             return f"Technical analysis for {instrument} not available"
 
+try:
+    from ..chart_service import timeframes
+    from ..chart_service.market_scanner import market_scanner, CONDITIONS as SCAN_CONDITIONS, SCAN_TIMEFRAMES
+    from ..chart_service.correlation import correlation_matrix
+except ImportError:
+    # Scanner en correlaties niet beschikbaar (numpy/pandas ontbreken)
+    market_scanner = None
+    correlation_matrix = None
+    SCAN_CONDITIONS = {}
+    SCAN_TIMEFRAMES = ()
+
 # Overige imports met fallbacks
 try:
     from ..database.db import Database
@@ -547,60 +560,8 @@ STYLE_TIMEFRAME_MAP = {
     "swing": "4h"
 }
 
-# Mapping of instruments to their allowed timeframes - updated 2023-03-23
-INSTRUMENT_TIMEFRAME_MAP = {
-    # H1 timeframe only
-    "AUDJPY": "H1", 
-    "AUDCHF": "H1",
-    "EURCAD": "H1",
-    "EURGBP": "H1",
-    "GBPCHF": "H1",
-    "HK50": "H1",
-    "NZDJPY": "H1",
-    "USDCHF": "H1",
-    "USDJPY": "H1",  # USDJPY toegevoegd voor signaalabonnementen
-    "XRPUSD": "H1",
-    
-    # H4 timeframe only
-    "AUDCAD": "H4",
-    "AU200": "H4", 
-    "CADCHF": "H4",
-    "EURCHF": "H4",
-    "EURUSD": "H4",
-    "GBPCAD": "H4",
-    "LINKUSD": "H4",
-    "NZDCHF": "H4",
-    
-    # M15 timeframe only
-    "DOGEUSD": "M15",
-    "GBPNZD": "M15",
-    "NZDUSD": "M15",
-    "SOLUSD": "M15",
-    "UK100": "M15",
-    "XAUUSD": "M15",
-    
-    # M30 timeframe only
-    "BNBUSD": "M30",
-    "DOTUSD": "M30",
-    "ETHUSD": "M30",
-    "EURAUD": "M30",
-    "EURJPY": "M30",
-    "GBPAUD": "M30",
-    "GBPUSD": "M30",
-    "NZDCAD": "M30",
-    "US30": "M30",
-    "US500": "M30",
-    "USDCAD": "M30",
-    "XLMUSD": "M30",
-    "XTIUSD": "M30",
-    "DE40": "M30",
-    "BTCUSD": "M30",  # Added for consistency with CRYPTO_KEYBOARD_SIGNALS
-    "US100": "M30",   # Added for consistency with INDICES_KEYBOARD_SIGNALS
-    "XAGUSD": "M15",  # Added for consistency with COMMODITIES_KEYBOARD_SIGNALS
-    "USOIL": "M30"    # Added for consistency with COMMODITIES_KEYBOARD_SIGNALS
-    
-    # Removed as requested: EU50, FR40, LTCUSD
-}
+# Mapping of instruments to their allowed timeframes (signal timeframes from the instrument registry)
+INSTRUMENT_TIMEFRAME_MAP = instrument_registry.signal_timeframes()
 
 # Map common timeframe notations
 TIMEFRAME_DISPLAY_MAP = {
@@ -610,41 +571,9 @@ TIMEFRAME_DISPLAY_MAP = {
     "H4": "4 Hours"
 }
 
-# Voeg deze functie toe aan het begin van bot.py, na de imports
 def _detect_market(instrument: str) -> str:
     """Detecteer market type gebaseerd op instrument"""
-    instrument = instrument.upper()
-    
-    # Commodities eerst checken
-    commodities = [
-        "XAUUSD",  # Gold
-        "XAGUSD",  # Silver
-        "WTIUSD",  # Oil WTI
-        "BCOUSD",  # Oil Brent
-    ]
-    if instrument in commodities:
-        logger.info(f"Detected {instrument} as commodity")
-        return "commodities"
-    
-    # Crypto pairs
-    crypto_base = ["BTC", "ETH", "XRP", "SOL", "BNB", "ADA", "DOT", "LINK"]
-    if any(c in instrument for c in crypto_base):
-        logger.info(f"Detected {instrument} as crypto")
-        return "crypto"
-    
-    # Major indices
-    indices = [
-        "US30", "US500", "US100",  # US indices
-        "UK100", "DE40", "FR40",   # European indices
-        "JP225", "AU200", "HK50"   # Asian indices
-    ]
-    if instrument in indices:
-        logger.info(f"Detected {instrument} as index")
-        return "indices"
-    
-    # Forex pairs als default
-    logger.info(f"Detected {instrument} as forex")
-    return "forex"
+    return instrument_registry.category(instrument)
 
 # Voeg dit toe als decorator functie bovenaan het bestand na de imports
 def require_subscription(func):
@@ -1163,6 +1092,65 @@ To continue using Sigmapips AI and receive trading signals, please reactivate yo
         # For now, showing the main menu as per original file structure
         await self.show_main_menu(update, context)
 
+    async def scan_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE = None) -> None:
+        """Scan all instruments: /scan [condition] [timeframe] [market], e.g. /scan rsi_oversold H4 forex"""
+        if market_scanner is None:
+            await update.message.reply_text("The market scanner is not available right now.")
+            return
+
+        conditions, timeframe, market = None, "H1", None
+        markets = {"forex": "forex", "crypto": "crypto", "commodity": "commodity", "commodities": "commodity",
+                   "index": "index", "indices": "index"}
+        for arg in (context.args if context and context.args else []):
+            value = arg.strip()
+            if value.lower() in SCAN_CONDITIONS:
+                conditions = [value.lower()]
+            elif value.lower() in markets:
+                market = markets[value.lower()]
+            else:
+                try:
+                    timeframe = timeframes.normalize_timeframe(value)
+                except ValueError:
+                    timeframe = None
+                if timeframe not in SCAN_TIMEFRAMES:
+                    await update.message.reply_text(
+                        "Usage: /scan [condition] [timeframe] [market]\n"
+                        f"Conditions: {', '.join(SCAN_CONDITIONS)}\n"
+                        f"Timeframes: {', '.join(SCAN_TIMEFRAMES)}\n"
+                        "Markets: forex, crypto, commodities, indices")
+                    return
+
+        try:
+            result = await market_scanner.scan(timeframe, conditions, market)
+            await update.message.reply_text(market_scanner.format_results(result), parse_mode=ParseMode.HTML)
+        except Exception as e:
+            logger.error(f"Error running market scan: {str(e)}")
+            await update.message.reply_text("The scan failed, please try again later.")
+
+    async def correlation_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE = None) -> None:
+        """Correlation heatmap of the signal instruments, or /correlation EURUSD for one instrument"""
+        if correlation_matrix is None:
+            await update.message.reply_text("Correlations are not available right now.")
+            return
+
+        try:
+            if context and context.args:
+                instrument = context.args[0].upper().replace("/", "")
+                pairs = await correlation_matrix.correlated_with(instrument)
+                await update.message.reply_text(correlation_matrix.format_pairs(instrument, pairs), parse_mode=ParseMode.HTML)
+                return
+
+            if not self._chart_service:
+                self._chart_service = ChartService()
+            image = await correlation_matrix.render_heatmap(self._chart_service.chart_renderer)
+            if not image:
+                await update.message.reply_text("Not enough candle history for correlations yet.")
+                return
+            await update.message.reply_photo(photo=image, caption="H1 return correlations of the signal instruments")
+        except Exception as e:
+            logger.error(f"Error showing correlations: {str(e)}")
+            await update.message.reply_text("Could not compute correlations, please try again later.")
+
     async def menu_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE = None) -> None:
         """Send a message when the command /menu is issued."""
         await self.show_main_menu(update, context)
@@ -3,7 +3,7 @@ let playwright;
 try {
     // Probeer eerst lokaal geïnstalleerde module
     playwright = require('playwright');
-    console.log("Using locally installed playwright module");
+    console.error("Using locally installed playwright module");
 } catch (e) {
     try {
         // Probeer globaal geïnstalleerde module
@@ -12,7 +12,7 @@ try {
             .toString()
             .trim();
         playwright = require(`${globalModulePath}/playwright`);
-        console.log("Using globally installed playwright module");
+        console.error("Using globally installed playwright module");
     } catch (e2) {
         console.error('Geen Playwright module gevonden. Installeer met: npm install playwright');
         process.exit(1);
@@ -28,14 +28,14 @@ async function checkBrowsersInstalled() {
         execSync(checkCommand, { timeout: 10000 });
         return true;
     } catch (error) {
-        console.log("Playwright browsers not installed. Attempting to install...");
+        log("Playwright browsers not installed. Attempting to install...");
         try {
             // Install only chromium for faster installation
             execSync("npx playwright install chromium", {
-                stdio: 'inherit',
+                stdio: workerMode ? ['ignore', process.stderr, process.stderr] : 'inherit',
                 timeout: 300000 // 5 minute timeout
             });
-            console.log("Chromium browser installed successfully");
+            log("Chromium browser installed successfully");
             return true;
         } catch (installError) {
             console.error("Failed to install Playwright browsers:", installError.message);
@@ -45,18 +45,23 @@ async function checkBrowsersInstalled() {
 }
 
 // Haal de argumenten op
-const url = process.argv[2];
-const outputPath = process.argv[3];
-const sessionId = process.argv[4]; // Voeg session ID toe als derde argument
-const fullscreenArg = process.argv[5] || ''; // Get the full string value
-const fullscreen = fullscreenArg === 'fullscreen' || fullscreenArg === 'true' || fullscreenArg === '1'; // Check various forms of true
+// CLI modus:    node tradingview_screenshot.js <url> <outputPath> [sessionId] [fullscreen]
+// Worker modus: node tradingview_screenshot.js --worker  (JSON-RPC over stdin/stdout, één regel per bericht)
+const workerMode = process.argv[2] === '--worker' || process.argv.length <= 2;
 
-if (!url || !outputPath) {
-    console.error('Usage: node screenshot.js <url> <outputPath> [sessionId] [fullscreen]');
-    process.exit(1);
-}
+const { chromium } = playwright;
+
+// In worker modus is stdout gereserveerd voor protocolberichten; logs gaan naar stderr
+const log = (...args) => (workerMode ? console.error(...args) : console.log(...args));
 
-const { chromium } = require('playwright');
+const BROWSER_ARGS = [
+    '--no-sandbox', 
+    '--disable-setuid-sandbox', 
+    '--disable-dev-shm-usage',
+    '--disable-notifications',
+    '--disable-popup-blocking',
+    '--disable-extensions'
+];
 
 // Voorgedefinieerde CSS om dialogen te verbergen - dit buiten de functie plaatsen voor snelheid
 const hideDialogsCSS = `
@@ -120,315 +125,431 @@ const tvLocalStorage = {
     'notification_shown': 'true'
 };
 
-(async () => {
-    try {
-        console.log(`Taking screenshot of ${url} and saving to ${outputPath} (fullscreen: ${fullscreen})`);
+// Maak een context met session cookie en init script (gedeeld door alle captures met dezelfde sessie)
+async function createContext(browser, sessionId) {
+    const context = await browser.newContext({
+        locale: 'en-US', // Stel de locale in op Engels
+        timezoneId: 'Europe/Amsterdam', // Stel de tijdzone in op Amsterdam
+        viewport: { width: 1920, height: 1080 }, // Stel een grotere viewport in
+        bypassCSP: true, // Bypass Content Security Policy
+    });
+    
+    // Voeg cookies toe als er een session ID is
+    if (sessionId) {
+        log(`Using session ID: ${sessionId.substring(0, 5)}...`);
         
-        // Check and install browsers if needed before launching
-        const browsersReady = await checkBrowsersInstalled();
-        if (!browsersReady) {
-            console.error("Could not install browsers. Screenshot may fail.");
+        // Voeg de session cookie direct toe zonder eerst naar TradingView te gaan
+        await context.addCookies([
+            {
+                name: 'sessionid',
+                value: sessionId,
+                domain: '.tradingview.com',
+                path: '/',
+                httpOnly: true,
+                secure: true,
+                sameSite: 'Lax'
+            },
+            {
+                name: 'language',
+                value: 'en',
+                domain: '.tradingview.com',
+                path: '/'
+            },
+            // Extra cookies om popups te blokkeren
+            {
+                name: 'feature_hint_shown',
+                value: 'true',
+                domain: '.tradingview.com',
+                path: '/'
+            },
+            {
+                name: 'screener_new_feature_notification',
+                value: 'shown',
+                domain: '.tradingview.com',
+                path: '/'
+            }
+        ]);
+    }
+    
+    // Stel localStorage waarden in voordat navigatie plaatsvindt
+    await context.addInitScript(({ tvLocalStorage }) => {
+        for (const [key, value] of Object.entries(tvLocalStorage)) {
+            try {
+                localStorage.setItem(key, value);
+            } catch (e) { }
         }
         
-        // Start een browser
-        const browser = await chromium.launch({
-            headless: true,
-            args: [
-                '--no-sandbox', 
-                '--disable-setuid-sandbox', 
-                '--disable-dev-shm-usage',
-                '--disable-notifications',
-                '--disable-popup-blocking',
-                '--disable-extensions'
-            ]
-        });
+        // Blokkeer alle popups
+        window.open = () => null;
         
-        // Open een nieuwe pagina met grotere viewport voor fullscreen
-        const context = await browser.newContext({
-            locale: 'en-US', // Stel de locale in op Engels
-            timezoneId: 'Europe/Amsterdam', // Stel de tijdzone in op Amsterdam
-            viewport: { width: 1920, height: 1080 }, // Stel een grotere viewport in
-            bypassCSP: true, // Bypass Content Security Policy
+        // Overschrijf confirm en alert om ze te negeren
+        window.confirm = () => true;
+        window.alert = () => {};
+    }, { tvLocalStorage });
+    
+    return context;
+}
+
+// Neem één screenshot in een nieuwe pagina van de context; gooit een error als er geen screenshot is
+async function captureChart(context, { url, outputPath, fullscreen = false, scrollRight = 0 }) {
+    log(`Taking screenshot of ${url} and saving to ${outputPath} (fullscreen: ${fullscreen})`);
+    
+    // Open een nieuwe pagina voor de screenshot
+    const page = await context.newPage();
+    
+    // Auto dismiss dialogs
+    page.on('dialog', async dialog => {
+        await dialog.dismiss().catch(() => {});
+    });
+    
+    // Voeg CSS toe om dialogen te verbergen voordat navigatie begint
+    await page.addStyleTag({ content: hideDialogsCSS }).catch(() => {});
+    
+    // Stel een maximale wachttijd in die past bij TradingView
+    page.setDefaultTimeout(30000); // 30 seconden max timeout
+    
+    try {
+        // Ga naar de URL
+        log(`Navigating to ${url}...`);
+        await page.goto(url, {
+            waitUntil: 'domcontentloaded', // Sneller dan 'networkidle'
+            timeout: 30000 // 30 seconden timeout voor navigatie
         });
         
-        // Voeg cookies toe als er een session ID is
-        if (sessionId) {
-            console.log(`Using session ID: ${sessionId.substring(0, 5)}...`);
-            
-            // Voeg de session cookie direct toe zonder eerst naar TradingView te gaan
-            await context.addCookies([
-                {
-                    name: 'sessionid',
-                    value: sessionId,
-                    domain: '.tradingview.com',
-                    path: '/',
-                    httpOnly: true,
-                    secure: true,
-                    sameSite: 'Lax'
-                },
-                {
-                    name: 'language',
-                    value: 'en',
-                    domain: '.tradingview.com',
-                    path: '/'
-                },
-                // Extra cookies om popups te blokkeren
-                {
-                    name: 'feature_hint_shown',
-                    value: 'true',
-                    domain: '.tradingview.com',
-                    path: '/'
-                },
-                {
-                    name: 'screener_new_feature_notification',
-                    value: 'shown',
-                    domain: '.tradingview.com',
-                    path: '/'
-                }
-            ]);
-        }
-        
-        // Stel localStorage waarden in voordat navigatie plaatsvindt
-        await context.addInitScript(({ tvLocalStorage }) => {
+        // Stel localStorage waarden in om meldingen uit te schakelen
+        log('Setting localStorage values to disable notifications...');
+        await page.evaluate(({ tvLocalStorage }) => {
+            // Belangrijkste localStorage waarden instellen
             for (const [key, value] of Object.entries(tvLocalStorage)) {
                 try {
                     localStorage.setItem(key, value);
-                } catch (e) { }
+                } catch (e) {}
             }
             
-            // Blokkeer alle popups
-            window.open = () => null;
-            
-            // Overschrijf confirm en alert om ze te negeren
-            window.confirm = () => true;
-            window.alert = () => {};
+            // Escape toets simuleren om dialogen te sluiten
+            document.dispatchEvent(new KeyboardEvent('keydown', { key: 'Escape', keyCode: 27 }));
         }, { tvLocalStorage });
         
-        // Open een nieuwe pagina voor de screenshot
-        const page = await context.newPage();
+        // Voeg CSS toe om Stock Screener popup te verbergen (opnieuw voor zekerheid)
+        await page.addStyleTag({ content: hideDialogsCSS });
         
-        // Auto dismiss dialogs
-        page.on('dialog', async dialog => {
-            await dialog.dismiss().catch(() => {});
+        // In één stap alle dialogboxen sluiten
+        await page.evaluate(() => {
+            // Simuleer Escape toets om dialogen te sluiten
+            document.dispatchEvent(new KeyboardEvent('keydown', { key: 'Escape', keyCode: 27 }));
+            
+            // Vind en klik alle sluitingsknoppen
+            document.querySelectorAll('button.close-B02UUUN3, button[data-name="close"], .nav-button-znwuaSC1').forEach(btn => {
+                try {
+                    btn.click();
+                } catch (e) {}
+            });
+            
+            // Verwijder alle dialoogelementen
+            document.querySelectorAll('[role="dialog"], .tv-dialog, .js-dialog, .tv-dialog--popup').forEach(dialog => {
+                dialog.style.display = 'none';
+                if (dialog.parentNode) {
+                    try {
+                        dialog.parentNode.removeChild(dialog);
+                    } catch (e) {}
+                }
+            });
         });
         
-        // Voeg CSS toe om dialogen te verbergen voordat navigatie begint
-        await page.addStyleTag({ content: hideDialogsCSS }).catch(() => {});
+        // Korter wachten om de pagina te laten laden (2000ms in plaats van 5000ms)
+        log('Waiting for page to render...');
+        await page.waitForTimeout(2000);
         
-        // Stel een maximale wachttijd in die past bij TradingView
-        page.setDefaultTimeout(30000); // 30 seconden max timeout
+        // Direct aanpak om slechts één keer alle close buttons te klikken met Playwright
+        const closeSelectors = [
+            'button.close-B02UUUN3',
+            'button[data-name="close"]',
+            'button.nav-button-znwuaSC1.size-medium-znwuaSC1.preserve-paddings-znwuaSC1.close-B02UUUN3', 
+            'button:has(svg path[d="m.58 1.42.82-.82 15 15-.82.82z"])',
+            'button:has(svg path[d="m.58 15.58 15-15 .82.82-15 15z"])'
+        ];
         
-        try {
-            // Ga naar de URL
-            console.log(`Navigating to ${url}...`);
-            await page.goto(url, {
-                waitUntil: 'domcontentloaded', // Sneller dan 'networkidle'
-                timeout: 30000 // 30 seconden timeout voor navigatie
-            });
-            
-            // Stel localStorage waarden in om meldingen uit te schakelen
-            console.log('Setting localStorage values to disable notifications...');
-            await page.evaluate(({ tvLocalStorage }) => {
-                // Belangrijkste localStorage waarden instellen
-                for (const [key, value] of Object.entries(tvLocalStorage)) {
+        for (const selector of closeSelectors) {
+            try {
+                const buttons = await page.$$(selector);
+                log(`Found ${buttons.length} buttons with selector ${selector}`);
+                
+                for (const button of buttons) {
                     try {
-                        localStorage.setItem(key, value);
+                        await button.click({ force: true }).catch(() => {});
                     } catch (e) {}
                 }
-                
-                // Escape toets simuleren om dialogen te sluiten
-                document.dispatchEvent(new KeyboardEvent('keydown', { key: 'Escape', keyCode: 27 }));
-            }, { tvLocalStorage });
-            
-            // Voeg CSS toe om Stock Screener popup te verbergen (opnieuw voor zekerheid)
-            await page.addStyleTag({ content: hideDialogsCSS });
-            
-            // In één stap alle dialogboxen sluiten
+            } catch (e) {}
+        }
+        
+        // Controleer of we zijn ingelogd
+        const isLoggedIn = await page.evaluate(() => {
+            return document.body.innerText.includes('Log out') || 
+                   document.body.innerText.includes('Account') ||
+                   document.querySelector('.tv-header__user-menu-button') !== null;
+        });
+        
+        log(`Logged in status: ${isLoggedIn}`);
+        
+        // Als fullscreen is ingeschakeld, verberg UI-elementen
+        if (fullscreen) {
+            log('Removing UI elements for fullscreen...');
             await page.evaluate(() => {
-                // Simuleer Escape toets om dialogen te sluiten
-                document.dispatchEvent(new KeyboardEvent('keydown', { key: 'Escape', keyCode: 27 }));
+                // Verberg de header
+                const header = document.querySelector('.tv-header');
+                if (header) header.style.display = 'none';
                 
-                // Vind en klik alle sluitingsknoppen
-                document.querySelectorAll('button.close-B02UUUN3, button[data-name="close"], .nav-button-znwuaSC1').forEach(btn => {
-                    try {
-                        btn.click();
-                    } catch (e) {}
-                });
+                // Verberg de toolbar
+                const toolbar = document.querySelector('.tv-main-panel__toolbar');
+                if (toolbar) toolbar.style.display = 'none';
                 
-                // Verwijder alle dialoogelementen
-                document.querySelectorAll('[role="dialog"], .tv-dialog, .js-dialog, .tv-dialog--popup').forEach(dialog => {
-                    dialog.style.display = 'none';
-                    if (dialog.parentNode) {
-                        try {
-                            dialog.parentNode.removeChild(dialog);
-                        } catch (e) {}
-                    }
-                });
-            });
-            
-            // Korter wachten om de pagina te laten laden (2000ms in plaats van 5000ms)
-            console.log('Waiting for page to render...');
-            await page.waitForTimeout(2000);
-            
-            // Direct aanpak om slechts één keer alle close buttons te klikken met Playwright
-            const closeSelectors = [
-                'button.close-B02UUUN3',
-                'button[data-name="close"]',
-                'button.nav-button-znwuaSC1.size-medium-znwuaSC1.preserve-paddings-znwuaSC1.close-B02UUUN3', 
-                'button:has(svg path[d="m.58 1.42.82-.82 15 15-.82.82z"])',
-                'button:has(svg path[d="m.58 15.58 15-15 .82.82-15 15z"])'
-            ];
-            
-            for (const selector of closeSelectors) {
-                try {
-                    const buttons = await page.$$(selector);
-                    console.log(`Found ${buttons.length} buttons with selector ${selector}`);
-                    
-                    for (const button of buttons) {
-                        try {
-                            await button.click({ force: true }).catch(() => {});
-                        } catch (e) {}
-                    }
-                } catch (e) {}
-            }
-            
-            // Controleer of we zijn ingelogd
-            const isLoggedIn = await page.evaluate(() => {
-                return document.body.innerText.includes('Log out') || 
-                       document.body.innerText.includes('Account') ||
-                       document.querySelector('.tv-header__user-menu-button') !== null;
-            });
-            
-            console.log(`Logged in status: ${isLoggedIn}`);
-            
-            // Als fullscreen is ingeschakeld, verberg UI-elementen
-            if (fullscreen) {
-                console.log('Removing UI elements for fullscreen...');
-                await page.evaluate(() => {
-                    // Verberg de header
-                    const header = document.querySelector('.tv-header');
-                    if (header) header.style.display = 'none';
-                    
-                    // Verberg de toolbar
-                    const toolbar = document.querySelector('.tv-main-panel__toolbar');
-                    if (toolbar) toolbar.style.display = 'none';
-                    
-                    // Verberg de zijbalk
-                    const sidebar = document.querySelector('.tv-side-toolbar');
-                    if (sidebar) sidebar.style.display = 'none';
-                    
-                    // Verberg andere UI-elementen
-                    const panels = document.querySelectorAll('.layout__area--left, .layout__area--right');
-                    panels.forEach(panel => {
-                        if (panel) panel.style.display = 'none';
-                    });
-                    
-                    // Maximaliseer de chart
-                    const chart = document.querySelector('.chart-container');
-                    if (chart) {
-                        chart.style.width = '100vw';
-                        chart.style.height = '100vh';
-                    }
-                    
-                    // Verberg de footer
-                    const footer = document.querySelector('footer');
-                    if (footer) footer.style.display = 'none';
-                    
-                    // Verberg de statusbalk
-                    const statusBar = document.querySelector('.tv-main-panel__statuses');
-                    if (statusBar) statusBar.style.display = 'none';
+                // Verberg de zijbalk
+                const sidebar = document.querySelector('.tv-side-toolbar');
+                if (sidebar) sidebar.style.display = 'none';
+                
+                // Verberg andere UI-elementen
+                const panels = document.querySelectorAll('.layout__area--left, .layout__area--right');
+                panels.forEach(panel => {
+                    if (panel) panel.style.display = 'none';
                 });
-            }
-            
-            // Eenvoudige en betrouwbare methode voor fullscreen
-            console.log('Applying simple fullscreen method...');
-            
-            // Methode 1: Shift+F toetsencombinatie (meest betrouwbaar)
-            await page.keyboard.down('Shift');
-            await page.keyboard.press('F');
-            await page.keyboard.up('Shift');
-            
-            // Korter wachten voor fullscreen (1000ms in plaats van 2000ms)
-            await page.waitForTimeout(1000);
-            
-            // Methode 2: Maak de chart groter met CSS (werkt altijd)
-            await page.addStyleTag({
-                content: `
-                    /* Verberg header en toolbar */
-                    .tv-header, .tv-main-panel__toolbar, .tv-side-toolbar {
-                        display: none !important;
-                    }
-                    
-                    /* Maximaliseer chart container */
-                    .chart-container, .chart-markup-table, .layout__area--center {
-                        width: 100vw !important;
-                        height: 100vh !important;
-                        position: fixed !important;
-                        top: 0 !important;
-                        left: 0 !important;
-                    }
-                `
+                
+                // Maximaliseer de chart
+                const chart = document.querySelector('.chart-container');
+                if (chart) {
+                    chart.style.width = '100vw';
+                    chart.style.height = '100vh';
+                }
+                
+                // Verberg de footer
+                const footer = document.querySelector('footer');
+                if (footer) footer.style.display = 'none';
+                
+                // Verberg de statusbalk
+                const statusBar = document.querySelector('.tv-main-panel__statuses');
+                if (statusBar) statusBar.style.display = 'none';
             });
-            
-            // Korter wachten voor indicators als we zijn ingelogd (3000ms ipv 5000ms)
-            if (isLoggedIn) {
-                console.log('Waiting for custom indicators to load...');
-                await page.waitForTimeout(3000);
-            }
-            
-            // Wacht op de chart met een kortere timeout (5000ms ipv 15000ms)
-            console.log('Waiting for chart to be fully loaded...');
-            try {
-                // Controleer of de chart container aanwezig is
-                const chartContainer = await page.$('.chart-container');
-                if (chartContainer) {
-                    console.log('Chart container found, continuing');
-                } else {
-                    // Als er geen chart container is, wacht dan iets langer
-                    await page.waitForTimeout(2000);
+        }
+        
+        // Eenvoudige en betrouwbare methode voor fullscreen
+        log('Applying simple fullscreen method...');
+        
+        // Methode 1: Shift+F toetsencombinatie (meest betrouwbaar)
+        await page.keyboard.down('Shift');
+        await page.keyboard.press('F');
+        await page.keyboard.up('Shift');
+        
+        // Korter wachten voor fullscreen (1000ms in plaats van 2000ms)
+        await page.waitForTimeout(1000);
+        
+        // Methode 2: Maak de chart groter met CSS (werkt altijd)
+        await page.addStyleTag({
+            content: `
+                /* Verberg header en toolbar */
+                .tv-header, .tv-main-panel__toolbar, .tv-side-toolbar {
+                    display: none !important;
                 }
-            } catch (e) {
-                console.log('Timeout waiting for chart, continuing anyway:', e);
+                
+                /* Maximaliseer chart container */
+                .chart-container, .chart-markup-table, .layout__area--center {
+                    width: 100vw !important;
+                    height: 100vh !important;
+                    position: fixed !important;
+                    top: 0 !important;
+                    left: 0 !important;
+                }
+            `
+        });
+        
+        // Korter wachten voor indicators als we zijn ingelogd (3000ms ipv 5000ms)
+        if (isLoggedIn) {
+            log('Waiting for custom indicators to load...');
+            await page.waitForTimeout(3000);
+        }
+        
+        // Wacht op de chart met een kortere timeout (5000ms ipv 15000ms)
+        log('Waiting for chart to be fully loaded...');
+        try {
+            // Controleer of de chart container aanwezig is
+            const chartContainer = await page.$('.chart-container');
+            if (chartContainer) {
+                log('Chart container found, continuing');
+            } else {
+                // Als er geen chart container is, wacht dan iets langer
+                await page.waitForTimeout(2000);
             }
+        } catch (e) {
+            log('Timeout waiting for chart, continuing anyway:', e);
+        }
+        
+        // Schuif de chart naar rechts zodat de laatste candle niet tegen de rand staat
+        for (let i = 0; i < scrollRight; i++) {
+            await page.keyboard.press('ArrowRight');
+        }
+        
+        // Laatste dialoog cleanup - simpeler en sneller
+        await page.evaluate(() => {
+            // Escape key indrukken om eventuele dialogen te sluiten
+            document.dispatchEvent(new KeyboardEvent('keydown', { key: 'Escape', keyCode: 27 }));
             
-            // Laatste dialoog cleanup - simpeler en sneller
-            await page.evaluate(() => {
-                // Escape key indrukken om eventuele dialogen te sluiten
-                document.dispatchEvent(new KeyboardEvent('keydown', { key: 'Escape', keyCode: 27 }));
-                
-                // Verwijder alleen zichtbare dialogen
-                document.querySelectorAll('[role="dialog"], .tv-dialog, .js-dialog').forEach(dialog => {
-                    dialog.style.display = 'none';
-                });
+            // Verwijder alleen zichtbare dialogen
+            document.querySelectorAll('[role="dialog"], .tv-dialog, .js-dialog').forEach(dialog => {
+                dialog.style.display = 'none';
             });
-            
-            // Korter wachten voor stabiliteit (500ms ipv 2000ms)
-            await page.waitForTimeout(500);
-            
-            // Neem screenshot
-            console.log('Taking screenshot...');
+        });
+        
+        // Korter wachten voor stabiliteit (500ms ipv 2000ms)
+        await page.waitForTimeout(500);
+        
+        // Neem screenshot
+        log('Taking screenshot...');
+        await page.screenshot({ path: outputPath });
+        log('Screenshot taken successfully');
+    } catch (error) {
+        log('Navigation error:', error);
+        
+        // Probeer toch een screenshot te maken in geval van een error
+        try {
+            log('Attempting to take screenshot despite error...');
             await page.screenshot({ path: outputPath });
-            console.log('Screenshot taken successfully');
-            
-            // Sluit browser
-            await browser.close();
-        } catch (error) {
-            console.error('Navigation error:', error);
-            
-            // Probeer toch een screenshot te maken in geval van een error
-            try {
-                console.log('Attempting to take screenshot despite error...');
-                await page.screenshot({ path: outputPath });
-                console.log('Screenshot taken despite error');
-            } catch (screenshotError) {
-                console.error('Failed to take screenshot after error:', screenshotError);
-            }
-            
-            await browser.close();
-            process.exit(1);
+            log('Screenshot taken despite error');
+        } catch (screenshotError) {
+            log('Failed to take screenshot after error:', screenshotError);
+            throw error;
         }
+    } finally {
+        await page.close().catch(() => {});
+    }
+}
+
+// Eenmalige capture vanaf de command line (oude gedrag)
+async function runCli() {
+    const url = process.argv[2];
+    const outputPath = process.argv[3];
+    const sessionId = process.argv[4]; // Voeg session ID toe als derde argument
+    const fullscreenArg = process.argv[5] || ''; // Get the full string value
+    const fullscreen = fullscreenArg === 'fullscreen' || fullscreenArg === 'true' || fullscreenArg === '1'; // Check various forms of true
+    
+    if (!url || !outputPath) {
+        console.error('Usage: node screenshot.js <url> <outputPath> [sessionId] [fullscreen]');
+        process.exit(1);
+    }
+    
+    let browser;
+    try {
+        // Check and install browsers if needed before launching
+        const browsersReady = await checkBrowsersInstalled();
+        if (!browsersReady) {
+            console.error("Could not install browsers. Screenshot may fail.");
+        }
+        
+        // Start een browser
+        browser = await chromium.launch({ headless: true, args: BROWSER_ARGS });
+        const context = await createContext(browser, sessionId);
+        await captureChart(context, { url, outputPath, fullscreen });
+        await browser.close();
     } catch (error) {
         console.error('Fatal error:', error);
+        if (browser) await browser.close().catch(() => {});
         process.exit(1);
     }
-})();
+}
+
+// Persistente worker: houdt één browser open en verwerkt capture jobs van stdin.
+// Request:  {"id": 1, "method": "capture", "params": {"url", "outputPath", "sessionId", "fullscreen", "scrollRight"}}
+// Response: {"id": 1, "result": {...}} of {"id": 1, "error": "..."}
+async function runWorker() {
+    const readline = require('readline');
+    const fs = require('fs');
+    
+    const send = (message) => process.stdout.write(JSON.stringify(message) + '\n');
+    
+    const browsersReady = await checkBrowsersInstalled();
+    if (!browsersReady) {
+        log("Could not install browsers. Screenshots may fail.");
+    }
+    
+    const browser = await chromium.launch({ headless: true, args: BROWSER_ARGS });
+    // Zonder browser heeft de worker geen nut: stop zodat Python een nieuwe start
+    browser.on('disconnected', () => {
+        log('Browser disconnected, worker exiting');
+        process.exit(2);
+    });
+    
+    // Eén context per session ID, hergebruikt tussen captures
+    const contexts = new Map();
+    const getContext = async (sessionId) => {
+        const key = sessionId || '';
+        if (!contexts.has(key)) {
+            contexts.set(key, createContext(browser, sessionId));
+        }
+        try {
+            return await contexts.get(key);
+        } catch (error) {
+            contexts.delete(key);
+            throw error;
+        }
+    };
+    
+    const handlers = {
+        ping: async () => ({ ok: true, pid: process.pid }),
+        capture: async (params) => {
+            const started = Date.now();
+            const context = await getContext(params.sessionId);
+            await captureChart(context, params);
+            const { size } = fs.statSync(params.outputPath);
+            return { path: params.outputPath, bytes: size, durationMs: Date.now() - started };
+        },
+        resetSession: async (params) => {
+            // Nieuwe session cookie: oude context weggooien
+            const key = params.sessionId || '';
+            for (const [existing, contextPromise] of contexts) {
+                if (existing !== key) {
+                    contexts.delete(existing);
+                    contextPromise.then(context => context.close()).catch(() => {});
+                }
+            }
+            return { ok: true };
+        },
+        shutdown: async () => {
+            setImmediate(async () => {
+                await browser.close().catch(() => {});
+                process.exit(0);
+            });
+            return { ok: true };
+        },
+    };
+    
+    const rl = readline.createInterface({ input: process.stdin });
+    rl.on('line', async (line) => {
+        if (!line.trim()) return;
+        let request;
+        try {
+            request = JSON.parse(line);
+        } catch (e) {
+            log('Invalid request line:', line);
+            return;
+        }
+        const handler = handlers[request.method];
+        if (!handler) {
+            send({ id: request.id, error: `Unknown method: ${request.method}` });
+            return;
+        }
+        try {
+            send({ id: request.id, result: await handler(request.params || {}) });
+        } catch (error) {
+            send({ id: request.id, error: String(error && error.message ? error.message : error) });
+        }
+    });
+    // Python sloot stdin: netjes afsluiten
+    rl.on('close', async () => {
+        await browser.close().catch(() => {});
+        process.exit(0);
+    });
+    
+    send({ event: 'ready', pid: process.pid });
+}
+
+(workerMode ? runWorker() : runCli()).catch(error => {
+    console.error('Fatal error:', error);
+    process.exit(1);
+});